@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import CustomUser, Item, Customer, SaleOrder, SaleOrderItem, Vendor, PurchaseOrder, PurchaseOrderItem, Company, Category, Shipment
+from .models import CustomUser, Item, Customer, SaleOrder, SaleOrderItem, Vendor, PurchaseOrder, PurchaseOrderItem, Company, Category, Shipment, BackgroundJob
 
 class CustomUserAdmin(BaseUserAdmin):
     # The fields to be used in displaying the User model.
@@ -34,4 +34,4 @@ admin.site.register(PurchaseOrderItem)
 admin.site.register(Company)
 admin.site.register(Category)
 admin.site.register(Shipment)
-
+admin.site.register(BackgroundJob)
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .routers import set_request_user
+
+
+def user_cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+def get_cached_user(user_model, user_id):
+    # The user with its company joined in, so request.user.company needs no query either
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = user_model.objects.select_related('company').filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is not None and settings.AUTH_USER_CACHE_SECONDS:
+            cache.set(key, user, settings.AUTH_USER_CACHE_SECONDS)
+    return user
+
+
+def invalidate_cached_user(user_id):
+    key = user_cache_key(user_id)
+    cache.delete(key)
+    # A request running meanwhile can cache the old row again until the change commits, so clear it once more then
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    # Same checks as JWTAuthentication.get_user, but the user comes from a short-lived cache
+    # that is cleared whenever the user or their company is saved
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        # Lets the replica router keep this user's reads on the primary right after their writes
+        set_request_user(user_id)
+        user = get_cached_user(self.user_model, user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,81 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from .models import Customer, Vendor
+from .versions import get_version
+
+# collection -> (model, primary key, fields returned, fields matched)
+AUTOCOMPLETE_SOURCES = {
+    'customers': (Customer, 'customer_id', ['customer_id', 'name', 'email', 'phone_number'], ['name', 'email', 'phone_number']),
+    'vendors': (Vendor, 'vendor_id', ['vendor_id', 'name', 'email', 'phone_number'], ['name', 'email', 'phone_number']),
+}
+
+# Number of (collection, user) indexes kept per process
+MAX_CACHED_INDEXES = 32
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+class PrefixIndex:
+    # Top matches come first: a field starting with the prefix (an exact match sorts first among those),
+    # then fields with a later word starting with it; alphabetical within each group
+    def __init__(self, rows, pk, match_fields):
+        field_starts, word_starts = [], []
+        for row in rows:
+            for field in match_fields:
+                value = (row[field] or '').lower()
+                # Index every word start so "smith" also finds "John Smith"
+                for match in re.finditer(r'\S+', value):
+                    entries = field_starts if match.start() == 0 else word_starts
+                    entries.append((value[match.start():], row[pk]))
+        self.groups = []
+        for entries in (field_starts, word_starts):
+            entries.sort()
+            self.groups.append(([key for key, _ in entries], [row_id for _, row_id in entries]))
+        self.rows = {row[pk]: row for row in rows}
+
+    def search(self, prefix, limit):
+        prefix = prefix.lower()
+        results = []
+        seen = set()
+        for keys, ids in self.groups:
+            for position in range(bisect_left(keys, prefix), len(keys)):
+                if not keys[position].startswith(prefix):
+                    break
+                row_id = ids[position]
+                if row_id not in seen:
+                    seen.add(row_id)
+                    results.append(self.rows[row_id])
+                    if len(results) == limit:
+                        return results
+        return results
+
+
+def get_prefix_index(user_id, collection):
+    # Rebuilt only when the collection's version moved on, i.e. after a write
+    version = get_version(user_id, collection)
+    key = (collection, user_id)
+    with _lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] == version:
+            _indexes.move_to_end(key)
+            return cached[1]
+
+    model, pk, fields, match_fields = AUTOCOMPLETE_SOURCES[collection]
+    rows = list(model.objects.filter(user_id=user_id).values(*fields))
+    index = PrefixIndex(rows, pk, match_fields)
+    with _lock:
+        _indexes[key] = (version, index)
+        _indexes.move_to_end(key)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def autocomplete(user_id, collection, prefix, limit):
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    return get_prefix_index(user_id, collection).search(prefix, limit)
@@ -0,0 +1,167 @@
+import logging
+import re
+import secrets
+import statistics
+import time
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from .jobs import run_pending_jobs
+from .models import Company, CustomUser, Customer, Item, Vendor
+from .seeding import seed_tenant
+from .serializers import (
+    CUSTOMER_LIST_SERIALIZER, ITEM_LIST_SERIALIZER, VENDOR_LIST_SERIALIZER, CustomerSerializer, ItemSerializer,
+    VendorSerializer,
+)
+
+# Items per benchmarked tenant; the other collections scale with it
+BENCHMARK_SIZES = [100, 1000, 10000]
+BENCHMARK_REPEAT = 5
+# Rows per collection when comparing the list serializers
+SERIALIZER_BENCHMARK_SIZE = 50000
+
+SERVER_TIMING = re.compile(r'(\w+);dur=([\d.]+)')
+
+
+def tenant_counts(size):
+    return {
+        'items': size,
+        'customers': max(size // 10, 1),
+        'vendors': max(size // 50, 1),
+        'sale_orders': size,
+        'purchase_orders': max(size // 4, 1),
+    }
+
+
+class EndpointBenchmark:
+    def __init__(self, size, repeat):
+        self.size = size
+        self.repeat = repeat
+        self.user = CustomUser.objects.create_user(
+            email=f'benchmark-{secrets.token_hex(3)}@example.com', password=secrets.token_hex(8), name='Benchmark'
+        )
+        Company.objects.create(user=self.user)
+        seed_tenant(self.user, seed=size, **tenant_counts(size))
+        # Real tokens, so authentication is part of what is measured
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.stocked_items = list(
+            Item.objects.filter(user=self.user).order_by('-quantity').values_list('item_id', 'selling_price')[:3]
+        )
+
+    def measure(self, name, request):
+        timings, queries, server_timings = [], [], []
+        for _ in range(self.repeat):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = request()
+                timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name} returned {response.status_code}: {response.content[:500]!r}")
+            queries.append(len(captured))
+            server_timings.append({key: float(value) for key, value in SERVER_TIMING.findall(response.get('Server-Timing', ''))})
+        timings.sort()
+        return {
+            'endpoint': name,
+            'size': self.size,
+            'median_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+            'min_ms': round(timings[0], 2),
+            'queries': max(queries),
+            'db_ms': round(statistics.median(timing.get('db', 0.0) for timing in server_timings), 2),
+            'view_ms': round(statistics.median(timing.get('view', 0.0) for timing in server_timings), 2),
+            'serialize_ms': round(statistics.median(timing.get('serialize', 0.0) for timing in server_timings), 2),
+        }
+
+    def create_sale_order(self):
+        lines = [{'item_id': item_id, 'quantity': 1, 'rate': str(rate)} for item_id, rate in self.stocked_items]
+        response = self.client.post('/token/saleorders/', {
+            'customer_name': 'Benchmark Customer',
+            'customer_email': 'customer@example.com',
+            'mode_of_delivery': 'DELIVERY',
+            'carrier': 'UPS',
+            'items': lines,
+            'total_amount': str(sum(rate for _, rate in self.stocked_items)),
+        }, format='json')
+        # The invoice is rendered and emailed by the job worker; run it as part of the operation
+        run_pending_jobs()
+        return response
+
+    def create_purchase_order(self):
+        lines = [{'item_id': item_id, 'quantity': 5, 'rate': str(rate)} for item_id, rate in self.stocked_items]
+        return self.client.post('/token/purchaseorders/', {
+            'vendor_name': 'Benchmark Vendor',
+            'items': lines,
+            'total_amount': str(sum(rate * 5 for _, rate in self.stocked_items)),
+        }, format='json')
+
+    def run(self):
+        return [
+            self.measure('items.list', lambda: self.client.get('/token/items/')),
+            self.measure('customers.list', lambda: self.client.get('/customers/')),
+            self.measure('vendors.list', lambda: self.client.get('/token/vendors/')),
+            self.measure('dashboard', lambda: self.client.get('/token/dashboard/')),
+            self.measure('sale_order.create_with_invoice', self.create_sale_order),
+            self.measure('purchase_order.create', self.create_purchase_order),
+        ]
+
+
+def run_benchmarks(sizes=None, repeat=BENCHMARK_REPEAT):
+    # Per-request log lines would drown the results
+    request_logger = logging.getLogger('api')
+    level = request_logger.level
+    request_logger.setLevel(logging.ERROR)
+    try:
+        results = []
+        for size in sizes or BENCHMARK_SIZES:
+            results.extend(EndpointBenchmark(size, repeat).run())
+        return results
+    finally:
+        request_logger.setLevel(level)
+
+
+def best_of(repeat, function):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def run_serializer_benchmarks(size=SERIALIZER_BENCHMARK_SIZE, repeat=BENCHMARK_REPEAT):
+    # Model serializers against the values() fast path on the same rows; both include the query
+    user = CustomUser.objects.create_user(
+        email=f'benchmark-{secrets.token_hex(3)}@example.com', password=secrets.token_hex(8), name='Benchmark'
+    )
+    seed_tenant(user, items=size, customers=size, vendors=size, seed=size)
+    results = []
+    for collection, model, serializer_class, fast in (
+        ('items', Item, ItemSerializer, ITEM_LIST_SERIALIZER),
+        ('customers', Customer, CustomerSerializer, CUSTOMER_LIST_SERIALIZER),
+        ('vendors', Vendor, VendorSerializer, VENDOR_LIST_SERIALIZER),
+    ):
+        queryset = model.objects.filter(user=user)
+        model_ms = best_of(repeat, lambda: serializer_class(queryset.all(), many=True).data)
+        values_ms = best_of(repeat, lambda: fast.serialize(fast.values(queryset)))
+        results.append({
+            'collection': collection,
+            'size': size,
+            'model_serializer_ms': round(model_ms, 2),
+            'values_serializer_ms': round(values_ms, 2),
+            'speedup': round(model_ms / values_ms, 1),
+        })
+    return results
+
+
+def compare_results(results, baseline):
+    # Adds the baseline median and the relative change to each result found in the baseline
+    previous = {(row['endpoint'], row['size']): row for row in baseline}
+    for row in results:
+        before = previous.get((row['endpoint'], row['size']))
+        if before is not None:
+            row['baseline_median_ms'] = before['median_ms']
+            row['baseline_queries'] = before['queries']
+            row['change_pct'] = round((row['median_ms'] - before['median_ms']) / before['median_ms'] * 100, 1) if before['median_ms'] else None
+    return results
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, register
+
+
+def cache_is_process_local():
+    return isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+@register()
+def check_replica_pin_cache(app_configs, **kwargs):
+    # A pin kept in one worker's memory is invisible to the worker serving the user's next read,
+    # which would then read the stale replica
+    if settings.REPLICA_DATABASES and cache_is_process_local():
+        return [Error(
+            'Read replicas are configured, but the default cache is process-local.',
+            hint='Point CACHE_URL at a cache shared by all workers, so read-your-writes pins reach them.',
+            id='api.E001',
+        )]
+    return []
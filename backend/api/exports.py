@@ -0,0 +1,56 @@
+import csv
+import datetime
+import json
+from decimal import Decimal
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Orders fetched per query (with their lines prefetched) while streaming
+EXPORT_CHUNK_SIZE = 1000
+
+SALE_ORDER_EXPORT_FIELDS = [
+    'sale_order_id', 'date', 'customer_id', 'customer_name', 'customer_email', 'customer_address',
+    'customer_city', 'customer_state', 'customer_pincode', 'mode_of_delivery', 'carrier',
+    'payment_received', 'discount', 'total_amount', 'invoice_status',
+]
+PURCHASE_ORDER_EXPORT_FIELDS = [
+    'purchase_order_id', 'date', 'vendor_id', 'vendor_name', 'vendor_address', 'payment_status', 'total_amount',
+]
+LINE_EXPORT_FIELDS = ['item_id', 'quantity', 'rate']
+
+_encoder = DjangoJSONEncoder()
+
+
+class Echo:
+    # File-like object for csv.writer that hands each row back instead of buffering it
+    def write(self, value):
+        return value
+
+
+def _value(value):
+    # Dates and decimals as the NDJSON export writes them, e.g. millisecond datetimes ending in Z
+    return _encoder.default(value) if isinstance(value, (datetime.date, datetime.time, Decimal)) else value
+
+
+def _orders(queryset):
+    return queryset.prefetch_related('items').order_by('pk').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+def stream_csv(queryset, order_fields):
+    # One row per order line, with the order columns repeated
+    writer = csv.writer(Echo())
+    yield writer.writerow(order_fields + [f'line_{field}' for field in LINE_EXPORT_FIELDS])
+    for order in _orders(queryset):
+        order_values = [_value(getattr(order, field)) for field in order_fields]
+        lines = order.items.all()
+        if not lines:
+            yield writer.writerow(order_values + [''] * len(LINE_EXPORT_FIELDS))
+        for line in lines:
+            yield writer.writerow(order_values + [_value(getattr(line, field)) for field in LINE_EXPORT_FIELDS])
+
+
+def stream_ndjson(queryset, order_fields):
+    # One JSON object per order, with its lines nested
+    for order in _orders(queryset):
+        data = {field: getattr(order, field) for field in order_fields}
+        data['items'] = [{field: getattr(line, field) for field in LINE_EXPORT_FIELDS} for line in order.items.all()]
+        yield json.dumps(data, cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,48 @@
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+def filter_date_range(queryset, field, params, start_param='date_from', end_param='date_to'):
+    # Accepts ISO dates or datetimes; a plain end date includes the whole day.
+    # Raises ValueError for values that cannot be parsed.
+    start = params.get(start_param)
+    if start:
+        value, _ = _parse(start, start_param)
+        queryset = queryset.filter(**{f'{field}__gte': value})
+
+    end = params.get(end_param)
+    if end:
+        value, date_only = _parse(end, end_param)
+        if date_only:
+            queryset = queryset.filter(**{f'{field}__lt': value + timedelta(days=1)})
+        else:
+            queryset = queryset.filter(**{f'{field}__lte': value})
+    return queryset
+
+
+def parse_id_param(value, name):
+    # Ids given in the query string; raises ValueError unless the value is a positive integer
+    if not value.isdigit() or not int(value):
+        raise ValueError(f"Invalid {name}: {value}")
+    return int(value)
+
+
+def parse_datetime_param(value, name):
+    parsed, _ = _parse(value, name)
+    return parsed
+
+
+def _parse(value, name):
+    try:
+        day = parse_date(value)
+        if day is not None:
+            return timezone.make_aware(datetime.combine(day, time.min)), True
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"Invalid {name}: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed, False
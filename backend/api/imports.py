@@ -0,0 +1,207 @@
+import csv
+import io
+from itertools import islice
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+from .bulk import update_rows
+from .models import Customer, Item, Vendor
+from .stock import record_movements
+from .summary import adjust_summary, item_stock_delta, record_new_customer, stock_delta
+from .versions import bump_version, record_changes
+
+# Rows validated and written per transaction
+IMPORT_BATCH_SIZE = 1000
+# Row errors returned in the report; the total is always returned
+MAX_REPORTED_ERRORS = 1000
+
+# collection -> (model, column matching existing rows, importable columns)
+IMPORT_SOURCES = {
+    'items': (Item, 'name', [
+        'name', 'brand', 'category', 'description', 'selling_price', 'purchase_price', 'quantity', 'reorder_point',
+    ]),
+    'customers': (Customer, 'email', ['name', 'email', 'phone_number', 'address', 'state', 'city', 'pincode']),
+    'vendors': (Vendor, 'email', ['name', 'email', 'phone_number', 'address']),
+}
+
+
+class CsvImporter:
+    def __init__(self, user, collection):
+        self.user = user
+        self.collection = collection
+        self.model, self.key, self.fields = IMPORT_SOURCES[collection]
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+        # Set when the file can't be read to the end; rows before it are imported, the rest are not
+        self.stopped = None
+        # Key -> first row using it, so a repeated key is rejected wherever it appears in the file
+        self.seen = {}
+        # Foreign keys are given by name, e.g. the category column holds a category name
+        self.lookups = {
+            field.name: dict(field.related_model.objects.filter(user=user).values_list('name', 'pk'))
+            for field in self.model._meta.concrete_fields
+            if field.name in self.fields and isinstance(field, models.ForeignKey)
+        }
+
+    def run(self, text_file):
+        reader = csv.DictReader(text_file)
+        columns = [name.strip() for name in reader.fieldnames or []]
+        reader.fieldnames = columns
+        if self.key not in columns:
+            raise ValueError(f"CSV header must include a '{self.key}' column")
+        self.columns = [name for name in self.fields if name in columns]
+
+        # Only one batch of rows is held in memory at a time. Each batch commits on its own, so a file that turns
+        # out to be malformed partway through is reported as a partial import rather than rejected
+        rows = self.read_rows(reader)
+        while True:
+            batch = list(islice(rows, IMPORT_BATCH_SIZE))
+            if not batch:
+                break
+            self.import_batch(batch)
+        return self.report()
+
+    def read_rows(self, reader):
+        try:
+            for row in reader:
+                yield reader.line_num, row
+        except (csv.Error, UnicodeDecodeError) as exc:
+            # line_num counts the lines read before the one that failed
+            self.stopped = {'row': reader.line_num + 1, 'error': str(exc)}
+
+    def report(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+            'stopped': self.stopped,
+        }
+
+    def add_error(self, line, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': line, 'errors': errors})
+
+    def clean_row(self, row):
+        # Blank cells keep the current value of an existing row, or the model default of a new one
+        values, errors = {}, {}
+        for name in self.columns:
+            raw = (row.get(name) or '').strip()
+            if not raw:
+                continue
+            if name in self.lookups:
+                if raw not in self.lookups[name]:
+                    errors[name] = [f"Unknown {name} '{raw}'."]
+                else:
+                    values[f'{name}_id'] = self.lookups[name][raw]
+                continue
+            field = self.model._meta.get_field(name)
+            try:
+                values[name] = field.clean(raw, None)
+            except ValidationError as exc:
+                errors[name] = exc.messages
+        return values, errors
+
+    def missing_fields(self, values):
+        return {
+            field.name: ['This field is required.']
+            for field in self.model._meta.concrete_fields
+            if field.name in self.fields and field.attname not in values
+            and not field.has_default() and not field.blank and not field.null
+        }
+
+    def import_batch(self, batch):
+        cleaned = []
+        for line, row in batch:
+            values, errors = self.clean_row(row)
+            if self.key not in values and self.key not in errors:
+                errors[self.key] = ['This field is required.']
+            if errors:
+                self.add_error(line, errors)
+            else:
+                cleaned.append((line, values))
+
+        with transaction.atomic():
+            keys = {values[self.key] for _, values in cleaned}
+            matches = self.model.objects.select_for_update().filter(**{f'{self.key}__in': keys})
+            if not self.model._meta.get_field(self.key).unique:
+                matches = matches.filter(user=self.user)
+            existing = {}
+            for obj in matches.order_by('pk'):
+                existing.setdefault(getattr(obj, self.key), obj)
+
+            new_objects, updated_objects, update_fields = [], [], set()
+            for line, values in cleaned:
+                key = values[self.key]
+                if key in self.seen:
+                    self.add_error(line, {self.key: [f'Duplicate of row {self.seen[key]}.']})
+                    continue
+                obj = existing.get(key)
+                if obj is not None and obj.user_id != self.user.id:
+                    # Emails are unique across all accounts
+                    self.add_error(line, {self.key: [f'{self.model._meta.verbose_name.capitalize()} with this {self.key} already exists.']})
+                    continue
+                if obj is None:
+                    errors = self.missing_fields(values)
+                    if errors:
+                        self.add_error(line, errors)
+                        continue
+                    new_objects.append(self.model(user=self.user, **values))
+                else:
+                    for name, value in values.items():
+                        setattr(obj, name, value)
+                    update_fields.update(values)
+                    updated_objects.append(obj)
+                self.seen[key] = line
+
+            self.model.objects.bulk_create(new_objects, batch_size=IMPORT_BATCH_SIZE)
+            if updated_objects:
+                if self.model is Item:
+                    # bulk_update skips auto_now, which save() would have bumped
+                    now = timezone.now()
+                    for obj in updated_objects:
+                        obj.created_at = now
+                    update_fields.add('created_at')
+                update_rows(self.model, updated_objects, sorted(update_fields))
+            self.after_write(new_objects, updated_objects)
+
+        self.created += len(new_objects)
+        self.updated += len(updated_objects)
+
+    def after_write(self, new_objects, updated_objects):
+        # bulk_create/bulk_update send no signals, so do what the save handlers would have done
+        if not new_objects and not updated_objects:
+            return
+        user_id = self.user.id
+        object_ids = [obj.pk for obj in new_objects + updated_objects]
+        if self.model is Item:
+            record_changes(user_id, 'items', object_ids)
+            delta = item_stock_delta(updated_objects)
+            for item in new_objects:
+                for field, value in stock_delta(None, (item.quantity, item.reorder_point)).items():
+                    delta[field] = delta.get(field, 0) + value
+            adjust_summary(user_id, **delta)
+            record_movements(self.user, {item.item_id: item.quantity for item in new_objects}, 'OPENING')
+            record_movements(self.user, {
+                item.item_id: item.quantity - item._loaded_values['quantity'] for item in updated_objects
+            }, 'ADJUSTMENT')
+            for item in updated_objects:
+                item.remember_loaded_values('quantity', 'reorder_point')
+        elif self.model is Customer:
+            record_changes(user_id, 'customers', object_ids)
+            if new_objects:
+                record_new_customer(user_id, new_objects[0].created_at, count=len(new_objects))
+        else:
+            bump_version(user_id, 'vendors')
+
+
+def import_csv(user, collection, binary_file):
+    # Decodes the upload lazily, so large files are parsed as they are read
+    text_file = io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+    try:
+        return CsvImporter(user, collection).run(text_file)
+    finally:
+        text_file.detach()
@@ -0,0 +1,241 @@
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.mail import EmailMessage
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+from reportlab.lib import colors
+from reportlab.platypus import Table, TableStyle
+from reportlab.lib.units import inch
+from reportlab.lib.utils import ImageReader
+from num2words import num2words
+from PIL import Image
+from .authentication import get_cached_user
+from .models import CustomUser, Item, SaleOrder
+from .timing import timed
+
+INVOICE_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('TOPPADDING', (0, 1), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+LOGO_WIDTH = 100
+LOGO_HEIGHT = 60
+# Pixels kept per point of logo size, enough for a sharp print
+LOGO_SCALE = 4
+
+# Invoice templates per company owner, local to each web/worker process; the least recently used go first
+MAX_CACHED_TEMPLATES = 64
+
+_invoice_templates = OrderedDict()
+_lock = threading.Lock()
+
+
+class InvoiceTemplate:
+    def __init__(self, company, user):
+        width, height = letter
+        self.key = invoice_template_key(company, user)
+        self.gst_number = company.gst_number
+
+        # Decode the logo once, scaled down to what the invoice actually prints
+        self.logo = None
+        if company.company_logo:
+            with Image.open(company.company_logo.path) as logo:
+                logo.thumbnail((LOGO_WIDTH * LOGO_SCALE, LOGO_HEIGHT * LOGO_SCALE))
+                self.logo = ImageReader(logo.copy())
+            self.logo.getRGBData()
+
+        # Drawing operations for the static parts, replayed on every invoice
+        ops = []
+        y_position = height - 60
+        ops.append(('setFont', ("Helvetica-Bold", 16)))
+        ops.append(('drawString', (50, y_position, company.company_name)))
+        y_position -= 25
+
+        ops.append(('setFont', ("Helvetica", 10)))
+
+        # Split address into two lines if it's too long
+        address = company.address or ''
+        if len(address) > 40:
+            split_index = address.rfind(' ', 0, 40)
+            ops.append(('drawString', (50, y_position, address[:split_index])))
+            y_position -= 15
+            ops.append(('drawString', (50, y_position, address[split_index+1:])))
+            y_position -= 15
+        else:
+            ops.append(('drawString', (50, y_position, address)))
+            y_position -= 15
+
+        ops.append(('drawString', (50, y_position, f"GSTIN/UIN: {company.gst_number}")))
+        y_position -= 15
+        ops.append(('drawString', (50, y_position, f"State Name: {company.state}, Code: {company.pincode}")))
+        y_position -= 15
+        ops.append(('drawString', (50, y_position, f"Contact: {user.phone_number}")))
+        y_position -= 15
+        ops.append(('drawString', (50, y_position, f"E-Mail: {user.email}")))
+
+        # Company's bank details
+        ops.append(('setFont', ("Helvetica-Bold", 10)))
+        ops.append(('drawString', (50, height - 640, "Company's Bank Details")))
+        ops.append(('setFont', ("Helvetica", 10)))
+        ops.append(('drawString', (50, height - 655, f"Bank Name: {company.bank_name}")))
+        ops.append(('drawString', (50, height - 670, f"A/c No.: {company.bank_account_number}")))
+        ops.append(('drawString', (50, height - 685, f"Branch & IFS Code: {company.ifsc_code}")))
+
+        # Footer
+        ops.append(('setFont', ("Helvetica", 8)))
+        ops.append(('drawString', (inch, 0.75 * inch, "This is a Computer Generated Document. No Signature Required.")))
+        self.ops = ops
+
+    def draw(self, p):
+        width, height = letter
+        if self.logo is not None:
+            p.drawImage(self.logo, width - LOGO_WIDTH - 50, height - 110, width=LOGO_WIDTH, height=LOGO_HEIGHT)
+        for method, args in self.ops:
+            getattr(p, method)(*args)
+
+
+def invoice_template_key(company, user):
+    # Everything the template is built from, so edits made through another process are still picked up
+    return (
+        company.company_name, company.gst_number, company.address, company.state, company.pincode,
+        company.bank_name, company.bank_account_number, company.ifsc_code, company.company_logo.name,
+        user.phone_number, user.email,
+    )
+
+
+def get_invoice_template(company, user):
+    key = invoice_template_key(company, user)
+    with _lock:
+        template = _invoice_templates.get(company.user_id)
+        if template is not None and template.key == key:
+            _invoice_templates.move_to_end(company.user_id)
+            return template
+
+    template = InvoiceTemplate(company, user)
+    with _lock:
+        _invoice_templates[company.user_id] = template
+        _invoice_templates.move_to_end(company.user_id)
+        while len(_invoice_templates) > MAX_CACHED_TEMPLATES:
+            _invoice_templates.popitem(last=False)
+    return template
+
+
+def invalidate_invoice_template(user_id):
+    with _lock:
+        _invoice_templates.pop(user_id, None)
+
+
+def generate_invoice_pdf(sale_order):
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    width, height = letter
+
+    # Set up the PDF; user and company come from the same cache the API authenticates against
+    user = get_cached_user(CustomUser, sale_order.user_id)
+    company = user.company
+
+    # Static company header, logo and bank details come from the cached template
+    template = get_invoice_template(company, user)
+    template.draw(p)
+
+    # Add customer details
+    p.setFont("Helvetica-Bold", 12)
+    p.drawString(50, height - 210, "Dispatch To")
+
+    p.setFont("Helvetica", 10)
+    p.drawString(50, height - 225, f"{sale_order.customer_name}")
+    p.drawString(50, height - 240, f"{sale_order.customer_address}")
+    p.drawString(50, height - 255, f"{sale_order.customer_city}, {sale_order.customer_state} - {sale_order.customer_pincode}")
+    p.drawString(50, height - 270, f"GSTIN/UIN: {template.gst_number}")
+    p.drawString(50, height - 285, f"State Name: {sale_order.customer_state}, Code: 29")
+
+    # Create table for order items
+    data = [["SI No", "Item Name", "Due on", "Quantity", "Rate", "per", "Amount"]]
+    sale_order_items = list(sale_order.items.all())
+    # Resolve all item names in a single query
+    item_names = dict(
+        Item.objects.filter(item_id__in={line.item_id for line in sale_order_items}).values_list('item_id', 'name')
+    )
+    for index, sale_order_item in enumerate(sale_order_items, start=1):
+        data.append([
+            str(index),
+            item_names.get(sale_order_item.item_id, f"Item {sale_order_item.item_id}"),
+            "3 Days",
+            str(sale_order_item.quantity),
+            f"{sale_order_item.rate:.2f}",
+            "Nos",
+            f"{sale_order_item.quantity * sale_order_item.rate:.2f}"
+        ])
+
+    table = Table(data, colWidths=[0.5*inch, 2*inch, 1*inch, 0.8*inch, 0.8*inch, 0.8*inch, 1*inch])
+    table.setStyle(INVOICE_TABLE_STYLE)
+
+    table.wrapOn(p, width - 100, height)
+    table.drawOn(p, 50, height - 500)
+
+    # Add total amount and taxes
+    p.setFont("Helvetica-Bold", 10)
+    p.drawString(410, height - 520, f"Subtotal: INR {sale_order.total_amount}")
+    p.drawString(410, height - 535, f"Central Tax: INR {sale_order.total_amount }")
+    p.drawString(410, height - 550, f"State Tax: INR {sale_order.total_amount }")
+    p.drawString(410, height - 565, f"Total: INR {sale_order.total_amount }")
+
+    # Add amount in words
+    p.setFont("Helvetica", 10)
+    p.drawString(50, height - 580, "Amount Chargeable (in words)")
+    p.drawString(50, height - 595, f"INR {num2words(int(sale_order.total_amount )).title()} Only")
+
+    p.showPage()
+    p.save()
+
+    # Save the PDF to the sale_order model
+    pdf_file = ContentFile(buffer.getvalue())
+    sale_order.invoice_pdf.save(f'invoice_{sale_order.sale_order_id}.pdf', pdf_file, save=False)
+    sale_order.invoice_status = 'GENERATED'
+    sale_order.save(update_fields=['invoice_pdf', 'invoice_status'])
+
+
+def send_invoice_email(sale_order):
+    subject = 'Sale Order Invoice'
+    message = f'Please find attached the invoice for your order (ID: {sale_order.sale_order_id}).'
+    from_email = settings.EMAIL_HOST_USER
+    recipient_list = [sale_order.customer_email]
+    mail = EmailMessage(subject=subject, body=message, from_email=from_email, to=recipient_list)
+    with sale_order.invoice_pdf.open('rb') as pdf_file:
+        mail.attach(f'invoice_{sale_order.sale_order_id}.pdf', pdf_file.read(), 'application/pdf')
+    mail.send()
+
+    sale_order.invoice_status = 'SENT'
+    sale_order.save(update_fields=['invoice_status'])
+
+
+def process_invoice(job):
+    sale_order = SaleOrder.objects.get(sale_order_id=job.payload['sale_order_id'])
+    try:
+        # A retry after a failed email reuses the PDF rendered by the earlier attempt
+        if not sale_order.invoice_pdf:
+            with timed('pdf'):
+                generate_invoice_pdf(sale_order)
+        if sale_order.customer_email:
+            with timed('smtp'):
+                send_invoice_email(sale_order)
+    except Exception:
+        if job.is_last_attempt:
+            sale_order.invoice_status = 'FAILED'
+            sale_order.save(update_fields=['invoice_status'])
+        raise
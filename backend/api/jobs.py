@@ -0,0 +1,86 @@
+import json
+import logging
+import time
+from datetime import timedelta
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import BackgroundJob
+from .timing import collect_timings
+
+logger = logging.getLogger(__name__)
+
+# Job name -> dotted path of a callable taking the BackgroundJob
+JOB_HANDLERS = {
+    'process_invoice': 'api.invoices.process_invoice',
+    'process_thumbnail': 'api.thumbnails.process_thumbnail',
+}
+
+# How long a claimed job stays reserved before another worker may pick it up again
+LEASE_SECONDS = 300
+RETRY_BASE_SECONDS = 30
+
+
+def enqueue_job(name, max_attempts=5, **payload):
+    if name not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job: {name}")
+    return BackgroundJob.objects.create(name=name, payload=payload, max_attempts=max_attempts)
+
+
+def claim_job():
+    now = timezone.now()
+    # Pending jobs that are due, plus running jobs whose worker let the lease expire
+    due = Q(run_after__lte=now) & Q(status__in=['PENDING', 'RUNNING'])
+    candidate_ids = BackgroundJob.objects.filter(due).order_by('run_after').values_list('job_id', flat=True)[:10]
+
+    for job_id in candidate_ids:
+        # Conditional update so only one worker can win each job
+        claimed = BackgroundJob.objects.filter(due, job_id=job_id).update(
+            status='RUNNING',
+            attempts=F('attempts') + 1,
+            run_after=now + timedelta(seconds=LEASE_SECONDS),
+        )
+        if claimed:
+            return BackgroundJob.objects.get(job_id=job_id)
+    return None
+
+
+def run_job(job):
+    start = time.perf_counter()
+    try:
+        with collect_timings() as timings:
+            handler = import_string(JOB_HANDLERS[job.name])
+            handler(job)
+    except Exception as exc:
+        logger.exception("Job %s (%s) failed on attempt %s", job.job_id, job.name, job.attempts)
+        job.last_error = f"{exc.__class__.__name__}: {exc}"
+        if job.is_last_attempt:
+            job.status = 'FAILED'
+        else:
+            # Exponential backoff between retries
+            job.status = 'PENDING'
+            job.run_after = timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+    else:
+        job.status = 'DONE'
+    job.save(update_fields=['status', 'run_after', 'last_error', 'updated_at'])
+    # Same shape as the request log lines, with the job's own spans (e.g. pdf, smtp)
+    logger.info(json.dumps({
+        'job': job.name,
+        'job_id': job.job_id,
+        'status': job.status,
+        'queries': timings.queries,
+        'db_ms': round(timings.db * 1000, 1),
+        **{f'{name}_ms': round(seconds * 1000, 1) for name, seconds in timings.spans.items()},
+        'total_ms': round((time.perf_counter() - start) * 1000, 1),
+    }))
+
+
+def run_pending_jobs(limit=None):
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
@@ -0,0 +1,81 @@
+import json
+import shutil
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+)
+from api.benchmarks import (
+    BENCHMARK_REPEAT, BENCHMARK_SIZES, compare_results, run_benchmarks, run_serializer_benchmarks
+)
+
+
+class Command(BaseCommand):
+    help = 'Time the key endpoints against freshly seeded tenants of several sizes, in a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=BENCHMARK_SIZES, help='Items per tenant')
+        parser.add_argument('--repeat', type=int, default=BENCHMARK_REPEAT, help='Requests per endpoint and size')
+        parser.add_argument('--output', help='Write the results as JSON to this file')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+        parser.add_argument(
+            '--serializers', type=int, metavar='ROWS',
+            help='Instead, compare the model and values() list serializers on this many rows per collection',
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as baseline_file:
+                    baseline = json.load(baseline_file)['results']
+            except (OSError, ValueError, KeyError) as exc:
+                raise CommandError(f"Cannot read baseline: {exc}")
+
+        # Same isolation as the test runner: a test database, locmem email and a scratch media root
+        media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                if options['serializers']:
+                    serializer_results = run_serializer_benchmarks(options['serializers'], options['repeat'])
+                else:
+                    results = run_benchmarks(options['sizes'], options['repeat'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        if options['serializers']:
+            self.stdout.write(f"{'collection':<12} {'rows':>7} {'model ms':>10} {'values ms':>10} {'speedup':>8}")
+            for row in serializer_results:
+                self.stdout.write(
+                    f"{row['collection']:<12} {row['size']:>7} {row['model_serializer_ms']:>10.2f} "
+                    f"{row['values_serializer_ms']:>10.2f} {row['speedup']:>7.1f}x"
+                )
+            if options['output']:
+                with open(options['output'], 'w') as output_file:
+                    json.dump({'serializers': serializer_results}, output_file, indent=2)
+            return
+
+        if baseline is not None:
+            results = compare_results(results, baseline)
+
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                json.dump({'sizes': options['sizes'], 'repeat': options['repeat'], 'results': results}, output_file, indent=2)
+
+        header = f"{'endpoint':<32} {'size':>6} {'median ms':>10} {'p95 ms':>9} {'queries':>8} {'db ms':>8} {'view ms':>8} {'ser ms':>8}"
+        if baseline is not None:
+            header += f" {'baseline':>10} {'change':>8}"
+        self.stdout.write(header)
+        for row in results:
+            line = (
+                f"{row['endpoint']:<32} {row['size']:>6} {row['median_ms']:>10.2f} {row['p95_ms']:>9.2f} "
+                f"{row['queries']:>8} {row['db_ms']:>8.2f} {row['view_ms']:>8.2f} {row['serialize_ms']:>8.2f}"
+            )
+            if 'baseline_median_ms' in row:
+                change = f"{row['change_pct']:+.1f}%" if row['change_pct'] is not None else '-'
+                line += f" {row['baseline_median_ms']:>10.2f} {change:>8}"
+            self.stdout.write(line)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from api.versions import compact_change_log
+
+
+class Command(BaseCommand):
+    help = 'Remove delta sync log entries superseded by a later change of the same row'
+
+    def handle(self, *args, **options):
+        count = compact_change_log()
+        self.stdout.write(self.style.SUCCESS(f"Removed {count} superseded changes"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from api.jobs import enqueue_job
+from api.thumbnails import THUMBNAIL_SOURCES, generate_thumbnail, needs_thumbnail
+
+
+class Command(BaseCommand):
+    help = 'Create missing thumbnails for item images, category images and company logos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='store_true', help='Enqueue jobs for run_jobs instead of rendering here')
+
+    def handle(self, *args, **options):
+        count = 0
+        for model_name, (model, source_field, thumbnail_field) in THUMBNAIL_SOURCES.items():
+            instances = model.objects.exclude(**{source_field: ''}).exclude(**{f'{source_field}__isnull': True})
+            for instance in instances.iterator():
+                if not needs_thumbnail(instance, source_field, thumbnail_field):
+                    continue
+                if options['queue']:
+                    enqueue_job('process_thumbnail', model=model_name, pk=instance.pk)
+                else:
+                    generate_thumbnail(model_name, instance.pk)
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f"{'Queued' if options['queue'] else 'Generated'} {count} thumbnails"))
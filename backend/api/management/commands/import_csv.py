@@ -0,0 +1,30 @@
+import csv
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from api.imports import IMPORT_SOURCES, import_csv
+
+
+class Command(BaseCommand):
+    help = 'Bulk import items, customers or vendors for a user from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('collection', choices=sorted(IMPORT_SOURCES))
+        parser.add_argument('path', help='CSV file with a header row')
+        parser.add_argument('--user', type=int, required=True, help='Id of the user the rows belong to')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(pk=options['user']).first()
+        if user is None:
+            raise CommandError(f"No user with id {options['user']}")
+
+        try:
+            with open(options['path'], 'rb') as csv_file:
+                report = import_csv(user, options['collection'], csv_file)
+        except (OSError, ValueError, csv.Error) as exc:
+            raise CommandError(exc)
+
+        for error in report['errors']:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']}, updated {report['updated']}, {report['error_count']} rows rejected"
+        ))
@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from api.summary import rebuild_summary
+
+
+class Command(BaseCommand):
+    help = 'Recompute dashboard summaries and per-item sales totals from the order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Only rebuild for this user id (repeatable)')
+
+    def handle(self, *args, **options):
+        user_ids = options['user'] or get_user_model().objects.values_list('id', flat=True)
+        count = 0
+        for user_id in user_ids:
+            rebuild_summary(user_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} dashboard summaries"))
@@ -0,0 +1,57 @@
+import logging
+import threading
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from api.jobs import run_pending_jobs
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs (invoice rendering and emailing) from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker threads')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit instead of polling forever')
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        workers = [
+            threading.Thread(target=self.work, args=(stop, options['poll_interval'], options['once']), daemon=True)
+            for _ in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} job workers")
+
+        try:
+            for worker in workers:
+                while worker.is_alive():
+                    worker.join(timeout=1)
+        except KeyboardInterrupt:
+            stop.set()
+            for worker in workers:
+                worker.join()
+
+    def work(self, stop, poll_interval, once):
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                try:
+                    processed = run_pending_jobs(limit=10)
+                except Exception:
+                    # E.g. the database went away or stayed locked; the worker waits and tries again rather than
+                    # dying, which would quietly shrink the pool. Claimed jobs are picked up again once their lease ends
+                    logger.exception("Job worker failed to run pending jobs")
+                    close_old_connections()
+                    stop.wait(poll_interval)
+                    continue
+                if processed:
+                    self.stdout.write(f"Processed {processed} jobs")
+                elif once:
+                    break
+                else:
+                    stop.wait(poll_interval)
+        finally:
+            connection.close()
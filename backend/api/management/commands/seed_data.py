@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from api.seeding import seed_tenant
+
+
+class Command(BaseCommand):
+    help = 'Seed a user with synthetic items, customers, vendors and orders at production-like scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, required=True, help='Id of the user to seed')
+        parser.add_argument('--items', type=int, default=1000)
+        parser.add_argument('--customers', type=int, default=200)
+        parser.add_argument('--vendors', type=int, default=20)
+        parser.add_argument('--sale-orders', type=int, default=2000)
+        parser.add_argument('--purchase-orders', type=int, default=500)
+        parser.add_argument('--seed', type=int, help='Random seed, for repeatable data')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(pk=options['user']).first()
+        if user is None:
+            raise CommandError(f"No user with id {options['user']}")
+
+        counts = seed_tenant(
+            user,
+            items=options['items'],
+            customers=options['customers'],
+            vendors=options['vendors'],
+            sale_orders=options['sale_orders'],
+            purchase_orders=options['purchase_orders'],
+            seed=options['seed'],
+        )
+        self.stdout.write(self.style.SUCCESS('Seeded ' + ', '.join(f'{count} {name}' for name, count in counts.items())))
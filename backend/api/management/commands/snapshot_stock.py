@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.stock import take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Snapshot per-item stock so point-in-time queries only replay newer ledger rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help='Only snapshot items of this user id')
+
+    def handle(self, *args, **options):
+        count = take_snapshots(options['user'])
+        self.stdout.write(self.style.SUCCESS(f"Snapshotted {count} items"))
@@ -0,0 +1,105 @@
+import json
+import logging
+import time
+from django.conf import settings
+from .routers import begin_request, end_request
+from .timing import collect_timings, current_timings
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class DatabaseRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        begin_request(read_only=request.method in SAFE_METHODS)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            end_request()
+            raise
+        if response.streaming:
+            # Streamed exports keep reading after the view returns
+            response.streaming_content = self.stream(response.streaming_content)
+        else:
+            end_request()
+        return response
+
+    def stream(self, content):
+        try:
+            yield from content
+        finally:
+            end_request()
+
+
+def phase_mark(timings):
+    # Clock, database time and serialization time so far, to split a phase into its own share
+    return time.perf_counter(), timings.db, timings.spans.get('serialize', 0.0)
+
+
+def own_time(start, end):
+    # Time between two marks not already counted as database or serialization time
+    return (end[0] - start[0]) - (end[1] - start[1]) - (end[2] - start[2])
+
+
+class PerformanceMiddleware:
+    # Query count, DB time, view time and serialization time of each request, sent back as a
+    # Server-Timing header and logged as one JSON line; requests over budget are logged as warnings.
+    # db, view and serialize do not overlap, so together they never exceed total
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with collect_timings(settings.PERFORMANCE_TIME_SERIALIZERS) as timings:
+            response = self.get_response(request)
+            finished = phase_mark(timings)
+        end = finished[0]
+        # Content streamed after this point (exports) is not included
+        view_start = getattr(request, '_view_started', None)
+        view_end = getattr(request, '_view_finished', finished)
+        if view_start is not None:
+            timings.add('view', own_time(view_start, view_end))
+            # Rendering the response body after the view returned counts as serialization
+            timings.add('serialize', own_time(view_end, finished))
+
+        total_ms = (end - start) * 1000
+        metrics = {
+            'db': (timings.db * 1000, f'{timings.queries} queries'),
+            'serialize': (timings.spans.get('serialize', 0.0) * 1000, None),
+            'view': (timings.spans.get('view', 0.0) * 1000, None),
+            'total': (total_ms, None),
+        }
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration:.1f}' + (f';desc="{desc}"' if desc else '')
+            for name, (duration, desc) in metrics.items()
+        )
+
+        over_budget = []
+        if timings.queries > settings.PERFORMANCE_QUERY_BUDGET:
+            over_budget.append('queries')
+        if total_ms > settings.PERFORMANCE_LATENCY_BUDGET_MS:
+            over_budget.append('latency')
+        match = request.resolver_match
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'queries': timings.queries,
+            **{f'{name}_ms': round(duration, 1) for name, (duration, _) in metrics.items()},
+            'over_budget': over_budget,
+        }
+        logger.log(logging.WARNING if over_budget else logging.INFO, json.dumps(record))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._view_started = phase_mark(current_timings())
+
+    def process_template_response(self, request, response):
+        # Called between the view returning and the response being rendered (DRF responses)
+        request._view_finished = phase_mark(current_timings())
+        return response
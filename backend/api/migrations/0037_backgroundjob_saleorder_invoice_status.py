@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:44
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def mark_existing_invoices_sent(apps, schema_editor):
+    SaleOrder = apps.get_model('api', 'SaleOrder')
+    SaleOrder.objects.exclude(invoice_pdf='').exclude(invoice_pdf__isnull=True).update(invoice_status='SENT')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0036_alter_company_address_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saleorder',
+            name='invoice_status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('GENERATED', 'Generated'), ('SENT', 'Sent'), ('FAILED', 'Failed')], default='PENDING', max_length=10),
+        ),
+        migrations.RunPython(mark_existing_invoices_sent, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('job_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=5)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='api_backgro_status_645d37_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0038_dashboardsummary_item_units_sold'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['user', 'created_at'], name='customer_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['user', 'item_id'], name='item_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['user', 'quantity', 'reorder_point'], name='item_user_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['user', 'name'], name='item_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['user', 'brand'], name='item_user_brand_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['user', '-units_sold'], name='item_user_units_sold_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaseorder',
+            index=models.Index(fields=['user', 'date'], name='purchaseorder_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleorder',
+            index=models.Index(fields=['user', 'date'], name='saleorder_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleorderitem',
+            index=models.Index(fields=['sale_order', 'item_id', 'quantity'], name='saleorderitem_order_item_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['user', 'status'], name='shipment_user_status_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0039_add_user_scoped_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='shipment',
+            name='shipment_user_status_idx',
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['user', 'shipment_id'], name='shipment_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['user', 'status', 'shipment_id'], name='shipment_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['user', 'carrier', 'shipment_id'], name='shipment_user_carrier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['user', 'date'], name='shipment_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    # Start the ledger from current stock so replays match Item.quantity
+    Item = apps.get_model('api', 'Item')
+    StockMovement = apps.get_model('api', 'StockMovement')
+    StockMovement.objects.bulk_create([
+        StockMovement(item_id=item_id, user_id=user_id, quantity_change=quantity, reason='OPENING')
+        for item_id, user_id, quantity in Item.objects.values_list('item_id', 'user_id', 'quantity').iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0040_shipment_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('movement_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('item_id', models.IntegerField()),
+                ('quantity_change', models.IntegerField()),
+                ('reason', models.CharField(choices=[('OPENING', 'Opening Balance'), ('SALE', 'Sale'), ('PURCHASE', 'Purchase'), ('ADJUSTMENT', 'Adjustment')], max_length=10)),
+                ('reference_id', models.IntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item_id', 'movement_id'], name='stockmovement_item_idx'), models.Index(fields=['user', 'created_at'], name='stockmovement_user_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('snapshot_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('item_id', models.IntegerField()),
+                ('quantity', models.IntegerField()),
+                ('last_movement_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item_id', 'created_at'], name='stocksnapshot_item_created_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
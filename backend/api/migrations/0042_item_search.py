@@ -0,0 +1,61 @@
+from django.db import migrations
+
+# The DDL is spelled out here rather than imported from api.search, so this migration keeps doing what it
+# did when it was written however that module changes later
+
+SQLITE_FORWARDS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_item_fts USING fts5("
+    "name, brand, description, content='api_item', content_rowid='item_id')",
+    "CREATE TRIGGER IF NOT EXISTS api_item_fts_insert AFTER INSERT ON api_item BEGIN "
+    "INSERT INTO api_item_fts(rowid, name, brand, description) "
+    "VALUES (new.item_id, new.name, new.brand, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS api_item_fts_delete AFTER DELETE ON api_item BEGIN "
+    "INSERT INTO api_item_fts(api_item_fts, rowid, name, brand, description) "
+    "VALUES ('delete', old.item_id, old.name, old.brand, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS api_item_fts_update AFTER UPDATE OF name, brand, description ON api_item BEGIN "
+    "INSERT INTO api_item_fts(api_item_fts, rowid, name, brand, description) "
+    "VALUES ('delete', old.item_id, old.name, old.brand, old.description); "
+    "INSERT INTO api_item_fts(rowid, name, brand, description) "
+    "VALUES (new.item_id, new.name, new.brand, new.description); END",
+    "INSERT INTO api_item_fts(api_item_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARDS = [
+    "DROP TRIGGER IF EXISTS api_item_fts_insert",
+    "DROP TRIGGER IF EXISTS api_item_fts_delete",
+    "DROP TRIGGER IF EXISTS api_item_fts_update",
+    "DROP TABLE IF EXISTS api_item_fts",
+]
+
+POSTGRES_FORWARDS = [
+    "CREATE INDEX IF NOT EXISTS api_item_search_idx ON api_item "
+    "USING GIN (to_tsvector('simple', name || ' ' || brand || ' ' || description))",
+]
+
+POSTGRES_BACKWARDS = [
+    "DROP INDEX IF EXISTS api_item_search_idx",
+]
+
+
+def run(schema_editor, statements):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def forwards(apps, schema_editor):
+    run(schema_editor, {'sqlite': SQLITE_FORWARDS, 'postgresql': POSTGRES_FORWARDS})
+
+
+def backwards(apps, schema_editor):
+    run(schema_editor, {'sqlite': SQLITE_BACKWARDS, 'postgresql': POSTGRES_BACKWARDS})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0041_stockmovement_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def log_existing_rows(apps, schema_editor):
+    # Lets a client that syncs from cursor 0 receive everything that already exists
+    ChangeLogEntry = apps.get_model('api', 'ChangeLogEntry')
+    for collection, model_name in [
+        ('items', 'Item'),
+        ('customers', 'Customer'),
+        ('sale_orders', 'SaleOrder'),
+        ('purchase_orders', 'PurchaseOrder'),
+    ]:
+        model = apps.get_model('api', model_name)
+        ChangeLogEntry.objects.bulk_create([
+            ChangeLogEntry(user_id=user_id, collection=collection, object_id=pk)
+            for pk, user_id in model.objects.order_by('pk').values_list('pk', 'user_id').iterator()
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0043_collectionversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('change_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('collection', models.CharField(max_length=50)),
+                ('object_id', models.IntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='change_log', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'collection', 'change_id'], name='changelog_user_collection_idx')],
+            },
+        ),
+        migrations.RunPython(log_existing_rows, migrations.RunPython.noop),
+    ]
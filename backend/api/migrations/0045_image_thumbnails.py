@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0044_changelogentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='category_images/thumbs/'),
+        ),
+        migrations.AddField(
+            model_name='company',
+            name='logo_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='company_logos/thumbs/'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='item_images/thumbs/'),
+        ),
+    ]
@@ -10,6 +10,30 @@ from django.utils import timezone
 def generate_tracking_id():
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=11))
 
+
+class TrackLoadedValuesMixin:
+    # Remembers the stored values of tracked_fields, so save handlers can apply the change as a delta
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values) if name in cls.tracked_fields
+        }
+        return instance
+
+    def remember_loaded_values(self, *fields):
+        # Called once a change has been applied, so the next save is compared with what is now stored. Handlers
+        # pass the fields they track, leaving the others for the handlers still to run
+        loaded = getattr(self, '_loaded_values', {})
+        self._loaded_values = {**loaded, **{name: self.stored_value(name) for name in fields or self.tracked_fields}}
+
+    def stored_value(self, name):
+        # In the form from_db gives it, e.g. the file name of a file field
+        value = getattr(self, name)
+        return value.name if isinstance(value, models.fields.files.FieldFile) else value
+
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -49,21 +73,29 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     def __str__(self):
         return self.email
 
-class Category(models.Model):
+class Category(TrackLoadedValuesMixin, models.Model):
+    # Stored image, so thumbnails are only queued for new uploads
+    tracked_fields = ('image',)
+
     id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255, unique=True)
     image = models.ImageField(upload_to='category_images/', null=True, blank=True)
+    thumbnail = models.ImageField(upload_to='category_images/thumbs/', null=True, blank=True, editable=False)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='categories')
 
     def __str__(self):
         return self.name
 
-class Item(models.Model):
+class Item(TrackLoadedValuesMixin, models.Model):
+    # Stored stock, for the dashboard summary deltas, and image, so thumbnails are only queued for new uploads
+    tracked_fields = ('quantity', 'reorder_point', 'image')
+
     created_at = models.DateTimeField(auto_now=True)
     item_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=255)
     brand = models.CharField(max_length=255, default='None')
     image = models.ImageField(upload_to='item_images/', null=True, blank=True)
+    thumbnail = models.ImageField(upload_to='item_images/thumbs/', null=True, blank=True, editable=False)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     description = models.TextField()
     selling_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
@@ -71,6 +103,18 @@ class Item(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='items')
     quantity = models.IntegerField(validators=[MinValueValidator(0)], default=1)
     reorder_point = models.IntegerField(validators=[MinValueValidator(0)], default=0)
+    units_sold = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Keyset pages and all per-user item lookups
+            models.Index(fields=['user', 'item_id'], name='item_user_id_idx'),
+            # Covers the stock bucket counts and the low/out of stock filters
+            models.Index(fields=['user', 'quantity', 'reorder_point'], name='item_user_stock_idx'),
+            models.Index(fields=['user', 'name'], name='item_user_name_idx'),
+            models.Index(fields=['user', 'brand'], name='item_user_brand_idx'),
+            models.Index(fields=['user', '-units_sold'], name='item_user_units_sold_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -90,6 +134,11 @@ class Customer(models.Model):
     pincode = models.CharField(max_length=6)  # New field
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='customers')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='customer_user_created_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -118,6 +167,13 @@ class SaleOrder(models.Model):
         ('OTHER', 'Other'),
     ]
 
+    INVOICE_STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('GENERATED', 'Generated'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
     sale_order_id = models.AutoField(primary_key=True)
     date = models.DateTimeField(auto_now_add=True)
     customer_id = models.IntegerField(default=0)
@@ -134,6 +190,12 @@ class SaleOrder(models.Model):
     customer_pincode = models.CharField(max_length=6, default='None')
     customer_email = models.EmailField(max_length=255, default='', blank=True)
     invoice_pdf = models.FileField(upload_to='invoices/', null=True, blank=True)
+    invoice_status = models.CharField(max_length=10, choices=INVOICE_STATUS_CHOICES, default='PENDING')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='saleorder_user_date_idx'),
+        ]
 
     def __str__(self):
         return f"Sale Order {self.sale_order_id} - {self.customer_name}"
@@ -145,6 +207,12 @@ class SaleOrderItem(models.Model):
     rate = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     user = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='sale_order_items')
 
+    class Meta:
+        indexes = [
+            # Covers per-item sales totals without touching the table rows
+            models.Index(fields=['sale_order', 'item_id', 'quantity'], name='saleorderitem_order_item_idx'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x Item {self.item_id} for Sale Order {self.sale_order.sale_order_id}"
 
@@ -163,6 +231,11 @@ class PurchaseOrder(models.Model):
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(0)])
     user = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='purchase_orders')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date'], name='purchaseorder_user_date_idx'),
+        ]
+
     def __str__(self):
         return f"Purchase Order {self.purchase_order_id} - {self.vendor_name}"
 
@@ -176,7 +249,10 @@ class PurchaseOrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x Item {self.item_id} for Purchase Order {self.purchase_order.purchase_order_id}"
 
-class Shipment(models.Model):
+class Shipment(TrackLoadedValuesMixin, models.Model):
+    # Stored status, for the pending shipments count
+    tracked_fields = ('status',)
+
     STATUS_CHOICES = [
         ('IN_TRANSIT', 'In Transit'),
         ('DELIVERED', 'Delivered'),
@@ -192,10 +268,22 @@ class Shipment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='IN_TRANSIT')
     user = models.ForeignKey('CustomUser', on_delete=models.CASCADE, related_name='shipments')
 
+    class Meta:
+        indexes = [
+            # Newest-first keyset pages, alone or filtered by status, carrier or date
+            models.Index(fields=['user', 'shipment_id'], name='shipment_user_id_idx'),
+            models.Index(fields=['user', 'status', 'shipment_id'], name='shipment_user_status_idx'),
+            models.Index(fields=['user', 'carrier', 'shipment_id'], name='shipment_user_carrier_idx'),
+            models.Index(fields=['user', 'date'], name='shipment_user_date_idx'),
+        ]
+
     def __str__(self):
         return f"Shipment {self.shipment_id} for Order {self.order_id}"
 
-class Company(models.Model):
+class Company(TrackLoadedValuesMixin, models.Model):
+    # Stored logo, so thumbnails are only queued for new uploads
+    tracked_fields = ('company_logo',)
+
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='company')
     company_name = models.CharField(max_length=255,default="My Company")
     gst_number = models.CharField(max_length=15, blank=True, null=True,default="VAT0000")
@@ -207,7 +295,126 @@ class Company(models.Model):
     bank_account_number = models.CharField(max_length=20, blank=True, null=True,default="124567890")
     ifsc_code = models.CharField(max_length=11, blank=True, null=True,default=" ")
     company_logo = models.ImageField(upload_to='company_logos/', null=True, blank=True)  # New field
+    logo_thumbnail = models.ImageField(upload_to='company_logos/thumbs/', null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.company_name
 
+class StockMovement(models.Model):
+    REASON_CHOICES = [
+        ('OPENING', 'Opening Balance'),
+        ('SALE', 'Sale'),
+        ('PURCHASE', 'Purchase'),
+        ('ADJUSTMENT', 'Adjustment'),
+    ]
+
+    movement_id = models.BigAutoField(primary_key=True)
+    item_id = models.IntegerField()
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='stock_movements')
+    quantity_change = models.IntegerField()
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES)
+    reference_id = models.IntegerField(null=True, blank=True)  # Sale or purchase order id
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item_id', 'movement_id'], name='stockmovement_item_idx'),
+            models.Index(fields=['user', 'created_at'], name='stockmovement_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity_change:+} x Item {self.item_id} ({self.reason})"
+
+class StockSnapshot(models.Model):
+    snapshot_id = models.BigAutoField(primary_key=True)
+    item_id = models.IntegerField()
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='stock_snapshots')
+    quantity = models.IntegerField()
+    last_movement_id = models.BigIntegerField()  # Stock after applying every movement up to this id
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item_id', 'created_at'], name='stocksnapshot_item_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Item {self.item_id}: {self.quantity} as of movement {self.last_movement_id}"
+
+class CollectionVersion(models.Model):
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='collection_versions')
+    collection = models.CharField(max_length=50)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'collection'], name='collectionversion_user_collection_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.collection} v{self.version} for {self.user_id}"
+
+class ChangeLogEntry(models.Model):
+    change_id = models.BigAutoField(primary_key=True)  # Monotonic cursor for delta sync
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='change_log')
+    collection = models.CharField(max_length=50)
+    object_id = models.IntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'collection', 'change_id'], name='changelog_user_collection_idx'),
+            # Finds the later changes of a row when compacting the log
+            models.Index(fields=['user', 'collection', 'object_id', 'change_id'], name='changelog_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"Change {self.change_id}: {self.collection} {self.object_id}"
+
+class DashboardSummary(models.Model):
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='dashboard_summary')
+    total_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_orders = models.PositiveIntegerField(default=0)
+    pending_shipments = models.PositiveIntegerField(default=0)
+    new_customers = models.PositiveIntegerField(default=0)
+    new_customers_month = models.DateField(null=True, blank=True)  # First day of the month new_customers counts
+    total_stock = models.IntegerField(default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    low_stock_count = models.PositiveIntegerField(default=0)
+    out_of_stock_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Dashboard summary for {self.user_id}"
+
+class BackgroundJob(models.Model):
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    job_id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    @property
+    def is_last_attempt(self):
+        return self.attempts >= self.max_attempts
+
+    def __str__(self):
+        return f"Job {self.job_id} - {self.name} ({self.status})"
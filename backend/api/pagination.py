@@ -0,0 +1,34 @@
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    # Pagination is opt-in so existing clients that expect a plain list keep working
+    def is_requested(self, request):
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+
+class ItemCursorPagination(KeysetPagination):
+    ordering = 'item_id'
+
+
+class SaleOrderCursorPagination(KeysetPagination):
+    ordering = '-sale_order_id'
+
+
+class PurchaseOrderCursorPagination(KeysetPagination):
+    ordering = '-purchase_order_id'
+
+
+class ShipmentCursorPagination(KeysetPagination):
+    ordering = '-shipment_id'
+
+
+class StockMovementCursorPagination(KeysetPagination):
+    ordering = '-movement_id'
@@ -0,0 +1,66 @@
+import random
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+
+# Routing state of the request being served; None outside requests (workers, management commands)
+_request_state = ContextVar('db_routing_state', default=None)
+
+
+class RoutingState:
+    def __init__(self, read_only):
+        self.read_only = read_only
+        self.user_id = None
+        self.pinned = None
+        self.wrote = False
+        self.replica = random.choice(settings.REPLICA_DATABASES) if settings.REPLICA_DATABASES else None
+
+
+def pin_key(user_id):
+    return f'db-pinned:{user_id}'
+
+
+def begin_request(read_only):
+    _request_state.set(RoutingState(read_only))
+
+
+def end_request():
+    state = _request_state.get()
+    _request_state.set(None)
+    # Keep the user's reads on the primary until the replicas have caught up with this write
+    if state is not None and state.wrote and state.user_id is not None:
+        cache.set(pin_key(state.user_id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def set_request_user(user_id):
+    state = _request_state.get()
+    if state is not None:
+        state.user_id = user_id
+        state.pinned = None
+
+
+class ReplicaRouter:
+    # Reads of safe requests go to one replica per request, unless the user wrote recently
+    def db_for_read(self, model, **hints):
+        state = _request_state.get()
+        if state is None or state.replica is None or not state.read_only or state.wrote:
+            return 'default'
+        if state.user_id is not None:
+            if state.pinned is None:
+                state.pinned = bool(cache.get(pin_key(state.user_id)))
+            if state.pinned:
+                return 'default'
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _request_state.get()
+        if state is not None:
+            state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
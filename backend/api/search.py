@@ -0,0 +1,83 @@
+import re
+from django.db import connection
+from django.db.models import Q
+from .models import Item
+
+# Triggers keeping the api_item_fts index (created by migration 0042) in step with api_item
+SQLITE_TRIGGERS_SQL = {
+    'api_item_fts_insert':
+        "CREATE TRIGGER IF NOT EXISTS api_item_fts_insert AFTER INSERT ON api_item BEGIN "
+        "INSERT INTO api_item_fts(rowid, name, brand, description) "
+        "VALUES (new.item_id, new.name, new.brand, new.description); END",
+    'api_item_fts_delete':
+        "CREATE TRIGGER IF NOT EXISTS api_item_fts_delete AFTER DELETE ON api_item BEGIN "
+        "INSERT INTO api_item_fts(api_item_fts, rowid, name, brand, description) "
+        "VALUES ('delete', old.item_id, old.name, old.brand, old.description); END",
+    'api_item_fts_update':
+        "CREATE TRIGGER IF NOT EXISTS api_item_fts_update AFTER UPDATE OF name, brand, description ON api_item BEGIN "
+        "INSERT INTO api_item_fts(api_item_fts, rowid, name, brand, description) "
+        "VALUES ('delete', old.item_id, old.name, old.brand, old.description); "
+        "INSERT INTO api_item_fts(rowid, name, brand, description) "
+        "VALUES (new.item_id, new.name, new.brand, new.description); END",
+}
+
+POSTGRES_DOCUMENT = "to_tsvector('simple', name || ' ' || brand || ' ' || description)"
+
+
+def ensure_sqlite_triggers(using_connection):
+    # SQLite drops a table's triggers when a migration remakes it (most AlterField/AddField on api_item),
+    # so after every migrate the missing ones are recreated and the index rebuilt from the table
+    with using_connection.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE name = 'api_item_fts' OR tbl_name = 'api_item'")
+        existing = {name for _, name in cursor.fetchall()}
+        if 'api_item_fts' not in existing:
+            return False
+        missing = [sql for name, sql in SQLITE_TRIGGERS_SQL.items() if name not in existing]
+        if not missing:
+            return False
+        for sql in missing:
+            cursor.execute(sql)
+        cursor.execute("INSERT INTO api_item_fts(api_item_fts) VALUES ('rebuild')")
+    return True
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query)
+
+
+def search_item_ids(user, query, limit, offset=0):
+    # Ranked ids of the user's items matching every term as a word prefix
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    if connection.vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        sql = (
+            "SELECT api_item.item_id FROM api_item_fts "
+            "JOIN api_item ON api_item.item_id = api_item_fts.rowid "
+            "WHERE api_item_fts MATCH %s AND api_item.user_id = %s "
+            "ORDER BY bm25(api_item_fts, 10.0, 5.0, 1.0), api_item.item_id "
+            "LIMIT %s OFFSET %s"
+        )
+        params = [match, user.id, limit, offset]
+    elif connection.vendor == 'postgresql':
+        match = ' & '.join(f"{term}:*" for term in terms)
+        sql = (
+            f"SELECT item_id FROM api_item "
+            f"WHERE user_id = %s AND {POSTGRES_DOCUMENT} @@ to_tsquery('simple', %s) "
+            f"ORDER BY ts_rank({POSTGRES_DOCUMENT}, to_tsquery('simple', %s)) DESC, item_id "
+            f"LIMIT %s OFFSET %s"
+        )
+        params = [user.id, match, match, limit, offset]
+    else:
+        # No full-text backend: plain substring match
+        condition = Q()
+        for term in terms:
+            condition &= Q(name__icontains=term) | Q(brand__icontains=term) | Q(description__icontains=term)
+        items = Item.objects.filter(condition, user=user).order_by('item_id')
+        return list(items.values_list('item_id', flat=True)[offset:offset + limit])
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
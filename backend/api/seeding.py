@@ -0,0 +1,232 @@
+import random
+import secrets
+from datetime import timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.utils import timezone
+from .bulk import update_rows
+from .models import (
+    Category, Customer, Item, PurchaseOrder, PurchaseOrderItem, SaleOrder, SaleOrderItem, Shipment, Vendor
+)
+from .stock import record_movements
+from .summary import rebuild_summary
+from .versions import bump_version, record_changes
+
+# Orders created and written per round trip
+SEED_BATCH_SIZE = 1000
+# Days of history the orders and customers are spread over
+SEED_HISTORY_DAYS = 365
+
+# (lines per order, weight): most orders are small, with a long tail of large ones
+LINE_COUNT_WEIGHTS = [(1, 35), (2, 22), (3, 14), (4, 9), (5, 6), (6, 4), (8, 4), (12, 3), (20, 2), (40, 1)]
+
+CATEGORY_NAMES = ['Electronics', 'Hardware', 'Stationery', 'Groceries', 'Apparel', 'Furniture', 'Toys', 'Garden']
+BRANDS = ['Acme', 'Globex', 'Initech', 'Umbrella', 'Stark', 'Wayne', 'Hooli', 'Soylent', 'Tyrell', 'Wonka']
+ADJECTIVES = ['Compact', 'Deluxe', 'Classic', 'Heavy Duty', 'Portable', 'Premium', 'Eco', 'Smart', 'Mini', 'Pro']
+NOUNS = ['Drill', 'Notebook', 'Lamp', 'Chair', 'Kettle', 'Cable', 'Backpack', 'Speaker', 'Hammer', 'Mug', 'Shelf']
+CITIES = [('Bengaluru', 'Karnataka'), ('Mumbai', 'Maharashtra'), ('Chennai', 'Tamil Nadu'), ('Pune', 'Maharashtra'),
+          ('Hyderabad', 'Telangana'), ('Kolkata', 'West Bengal'), ('Jaipur', 'Rajasthan'), ('Delhi', 'Delhi')]
+
+
+def _batches(total):
+    for start in range(0, total, SEED_BATCH_SIZE):
+        yield range(start, min(start + SEED_BATCH_SIZE, total))
+
+
+def _money(value):
+    return Decimal(value).quantize(Decimal('0.01'))
+
+
+class TenantSeeder:
+    def __init__(self, user, seed=None):
+        self.user = user
+        self.rng = random.Random(seed)
+        # Emails and category names are unique across all tenants, so every run gets its own tag
+        self.tag = secrets.token_hex(3)
+        self.now = timezone.now()
+        self.line_counts, self.line_weights = zip(*LINE_COUNT_WEIGHTS)
+
+    def past(self):
+        return self.now - timedelta(seconds=self.rng.randrange(SEED_HISTORY_DAYS * 86400))
+
+    def seed(self, items=0, customers=0, vendors=0, sale_orders=0, purchase_orders=0):
+        with transaction.atomic():
+            item_rows = self.seed_items(items)
+            customer_rows = self.seed_customers(customers)
+            vendor_rows = self.seed_vendors(vendors)
+            sale_order_ids = self.seed_sale_orders(sale_orders, item_rows, customer_rows)
+            purchase_order_ids = self.seed_purchase_orders(purchase_orders, item_rows, vendor_rows)
+
+            # Rows were bulk inserted without signals, so bring the derived data in line afterwards
+            user_id = self.user.id
+            record_changes(user_id, 'items', [item.item_id for item in item_rows])
+            record_movements(self.user, {item.item_id: item.quantity for item in item_rows}, 'OPENING')
+            record_changes(user_id, 'customers', [customer.customer_id for customer in customer_rows])
+            record_changes(user_id, 'sale_orders', sale_order_ids)
+            record_changes(user_id, 'purchase_orders', purchase_order_ids)
+            bump_version(user_id, 'vendors')
+            bump_version(user_id, 'categories')
+            rebuild_summary(user_id)
+
+        return {
+            'items': len(item_rows),
+            'customers': len(customer_rows),
+            'vendors': len(vendor_rows),
+            'sale_orders': len(sale_order_ids),
+            'purchase_orders': len(purchase_order_ids),
+        }
+
+    def seed_items(self, count):
+        if not count:
+            return []
+        categories = Category.objects.bulk_create([
+            Category(name=f'{name} {self.tag}', user=self.user) for name in CATEGORY_NAMES
+        ])
+        rng = self.rng
+        items = []
+        for index in range(count):
+            purchase_price = _money(rng.uniform(5, 2000))
+            reorder_point = rng.randint(5, 50)
+            # A tenth of the catalogue is at or below its reorder point, a few items are sold out
+            roll = rng.random()
+            quantity = 0 if roll < 0.03 else rng.randint(1, reorder_point) if roll < 0.1 else rng.randint(reorder_point + 1, 1000)
+            items.append(Item(
+                name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {index + 1}',
+                brand=rng.choice(BRANDS),
+                category=rng.choice(categories),
+                description=f'Synthetic item {index + 1}',
+                purchase_price=purchase_price,
+                selling_price=_money(purchase_price * Decimal(rng.uniform(1.1, 1.8))),
+                quantity=quantity,
+                reorder_point=reorder_point,
+                user=self.user,
+            ))
+        return Item.objects.bulk_create(items, batch_size=SEED_BATCH_SIZE)
+
+    def seed_customers(self, count):
+        rng = self.rng
+        customers = []
+        for index in range(count):
+            city, state = rng.choice(CITIES)
+            customers.append(Customer(
+                name=f'Customer {index + 1}',
+                email=f'customer-{self.tag}-{index + 1}@example.com',
+                phone_number=f'9{rng.randrange(10 ** 9):09d}',
+                address=f'{rng.randint(1, 999)} Market Road',
+                city=city,
+                state=state,
+                pincode=f'{rng.randint(100000, 999999)}',
+                created_at=self.past(),
+                user=self.user,
+            ))
+        return Customer.objects.bulk_create(customers, batch_size=SEED_BATCH_SIZE)
+
+    def seed_vendors(self, count):
+        vendors = [
+            Vendor(
+                name=f'Vendor {index + 1}',
+                email=f'vendor-{self.tag}-{index + 1}@example.com',
+                phone_number=f'8{self.rng.randrange(10 ** 9):09d}',
+                address=f'{self.rng.randint(1, 999)} Industrial Area',
+                user=self.user,
+            )
+            for index in range(count)
+        ]
+        return Vendor.objects.bulk_create(vendors, batch_size=SEED_BATCH_SIZE)
+
+    def order_lines(self, items):
+        count = min(self.rng.choices(self.line_counts, self.line_weights)[0], len(items))
+        return [(item, self.rng.choices([1, 2, 3, 5, 10, 25], [40, 25, 15, 10, 7, 3])[0]) for item in self.rng.sample(items, count)]
+
+    def seed_sale_orders(self, count, items, customers):
+        if not count or not items:
+            return []
+        rng = self.rng
+        order_ids = []
+        for batch in _batches(count):
+            orders, lines = [], []
+            for _ in batch:
+                customer = rng.choice(customers) if customers else None
+                order_lines = self.order_lines(items)
+                subtotal = sum(item.selling_price * quantity for item, quantity in order_lines)
+                discount = _money(subtotal * Decimal(rng.choice([0, 0, 0, 0.05, 0.1])))
+                orders.append(SaleOrder(
+                    customer_id=customer.customer_id if customer else 0,
+                    customer_name=customer.name if customer else 'Walk-in',
+                    customer_email=customer.email if customer else '',
+                    customer_address=customer.address if customer else 'None',
+                    customer_city=customer.city if customer else 'None',
+                    customer_state=customer.state if customer else 'None',
+                    customer_pincode=customer.pincode if customer else 'None',
+                    mode_of_delivery=rng.choice(['PICKUP', 'DELIVERY']),
+                    carrier=rng.choice(SaleOrder.CARRIER_CHOICES)[0],
+                    payment_received=rng.random() < 0.8,
+                    discount=discount,
+                    total_amount=subtotal - discount,
+                    user=self.user,
+                ))
+                lines.append(order_lines)
+            orders = SaleOrder.objects.bulk_create(orders)
+            # date is auto_now_add, so spread the orders over the history afterwards
+            for order in orders:
+                order.date = self.past()
+            update_rows(SaleOrder, orders, ['date'])
+
+            SaleOrderItem.objects.bulk_create([
+                SaleOrderItem(sale_order=order, item_id=item.item_id, quantity=quantity, rate=item.selling_price, user=self.user)
+                for order, order_lines in zip(orders, lines) for item, quantity in order_lines
+            ], batch_size=SEED_BATCH_SIZE)
+
+            shipments = Shipment.objects.bulk_create([
+                Shipment(
+                    order_id=order.sale_order_id,
+                    customer_name=order.customer_name,
+                    carrier=order.carrier,
+                    status=rng.choices(['IN_TRANSIT', 'DELIVERED', 'RETURNED'], [15, 80, 5])[0],
+                    user=self.user,
+                )
+                for order in orders if order.mode_of_delivery == 'DELIVERY'
+            ])
+            dates = {order.sale_order_id: order.date for order in orders}
+            for shipment in shipments:
+                shipment.date = dates[shipment.order_id]
+            update_rows(Shipment, shipments, ['date'])
+            order_ids.extend(order.sale_order_id for order in orders)
+        return order_ids
+
+    def seed_purchase_orders(self, count, items, vendors):
+        if not count or not items:
+            return []
+        rng = self.rng
+        order_ids = []
+        for batch in _batches(count):
+            orders, lines = [], []
+            for _ in batch:
+                vendor = rng.choice(vendors) if vendors else None
+                order_lines = [(item, quantity * 10) for item, quantity in self.order_lines(items)]
+                orders.append(PurchaseOrder(
+                    vendor_id=vendor.vendor_id if vendor else 0,
+                    vendor_name=vendor.name if vendor else 'None',
+                    vendor_address=vendor.address if vendor else 'None',
+                    payment_status=rng.choices(['PAID', 'UNPAID'], [85, 15])[0],
+                    total_amount=sum(item.purchase_price * quantity for item, quantity in order_lines),
+                    user=self.user,
+                ))
+                lines.append(order_lines)
+            orders = PurchaseOrder.objects.bulk_create(orders)
+            for order in orders:
+                order.date = self.past()
+            update_rows(PurchaseOrder, orders, ['date'])
+
+            PurchaseOrderItem.objects.bulk_create([
+                PurchaseOrderItem(purchase_order=order, item_id=item.item_id, quantity=quantity, rate=item.purchase_price, user=self.user)
+                for order, order_lines in zip(orders, lines) for item, quantity in order_lines
+            ], batch_size=SEED_BATCH_SIZE)
+            order_ids.extend(order.purchase_order_id for order in orders)
+        return order_ids
+
+
+def seed_tenant(user, items=0, customers=0, vendors=0, sale_orders=0, purchase_orders=0, seed=None):
+    return TenantSeeder(user, seed).seed(
+        items=items, customers=customers, vendors=vendors, sale_orders=sale_orders, purchase_orders=purchase_orders,
+    )
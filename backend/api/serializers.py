@@ -1,18 +1,59 @@
+import decimal
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.utils.functional import cached_property
 from django.contrib.auth.models import AbstractBaseUser
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .models import Category, Item,Customer,Vendor,SaleOrder, SaleOrderItem,PurchaseOrder,PurchaseOrderItem, Shipment, Company
+from .timing import current_timings, timed
+from .models import Category, Item,Customer,Vendor,SaleOrder, SaleOrderItem,PurchaseOrder,PurchaseOrderItem, Shipment, Company, StockMovement
 
 User = get_user_model()
 
-class CompanySerializer(serializers.ModelSerializer):
+# Rows per INSERT when creating order lines
+BULK_BATCH_SIZE = 500
+
+class TimedModelSerializer(serializers.ModelSerializer):
+    # With PERFORMANCE_TIME_SERIALIZERS on, time spent turning instances into data shows up as
+    # serialization in Server-Timing; otherwise it is part of the view's time
+    def to_representation(self, instance):
+        timings = current_timings()
+        if timings is None or not timings.time_serializers:
+            return super().to_representation(instance)
+        with timed('serialize'):
+            return super().to_representation(instance)
+
+
+def thumbnail_url(image, thumbnail, request=None):
+    # URL of the resized derivative, falling back to the original until the worker has made it
+    image = thumbnail or image
+    if not image:
+        return None
+    return request.build_absolute_uri(image.url) if request is not None else image.url
+
+
+class ThumbnailUrlField(serializers.ReadOnlyField):
+    def __init__(self, image_field, thumbnail_field, **kwargs):
+        self.image_field = image_field
+        self.thumbnail_field = thumbnail_field
+        super().__init__(source='*', **kwargs)
+
+    def to_representation(self, instance):
+        return thumbnail_url(
+            getattr(instance, self.image_field), getattr(instance, self.thumbnail_field), self.context.get('request')
+        )
+
+
+class CompanySerializer(TimedModelSerializer):
+    logo_thumbnail_url = ThumbnailUrlField('company_logo', 'logo_thumbnail')
+
     class Meta:
         model = Company
-        fields = ['company_name', 'gst_number', 'address', 'city', 'state', 'pincode', 'bank_name', 'bank_account_number', 'ifsc_code', 'company_logo']  # Updated fields
+        fields = ['company_name', 'gst_number', 'address', 'city', 'state', 'pincode', 'bank_name', 'bank_account_number', 'ifsc_code', 'company_logo', 'logo_thumbnail_url']  # Updated fields
      
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(TimedModelSerializer):
     company = CompanySerializer(required=False)
     password = serializers.CharField(write_only=True)
 
@@ -52,16 +93,18 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
 
 
 
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(TimedModelSerializer):
+    thumbnail_url = ThumbnailUrlField('image', 'thumbnail')
+
     class Meta:
         model = Item
-        fields = ['item_id', 'name', 'brand', 'image', 'category', 'description', 'selling_price', 'purchase_price', 'user', 'quantity', 'reorder_point']
+        fields = ['item_id', 'name', 'brand', 'image', 'thumbnail_url', 'category', 'description', 'selling_price', 'purchase_price', 'user', 'quantity', 'reorder_point']
         read_only_fields = ['item_id']
 
 
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(TimedModelSerializer):
     class Meta:
         model = Customer
         fields = ['customer_id', 'name', 'email', 'phone_number', 'address', 'state', 'city', 'pincode', 'user']
@@ -72,7 +115,7 @@ class CustomerSerializer(serializers.ModelSerializer):
 
 
 
-class VendorSerializer(serializers.ModelSerializer):
+class VendorSerializer(TimedModelSerializer):
     class Meta:
         model = Vendor
         fields = ['vendor_id', 'name', 'email', 'phone_number', 'user','address']
@@ -83,56 +126,216 @@ class VendorSerializer(serializers.ModelSerializer):
 
 
 
-class SaleOrderItemSerializer(serializers.ModelSerializer):
+class ValuesSerializer:
+    # Read-only fast path for large lists. Rows come from .values() and go through converters compiled once
+    # from a model serializer's fields, so no model instances are built and no per-field dispatch runs.
+    # The output is the same as the model serializer's.
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+
+    @cached_property
+    def compiled(self):
+        model = self.serializer_class.Meta.model
+        columns, converters = [], []
+        for field in self.serializer_class().fields.values():
+            if field.write_only:
+                continue
+            if isinstance(field, ThumbnailUrlField):
+                columns += [field.image_field, field.thumbnail_field]
+                converters.append((field.field_name, thumbnail_url_converter(model, field.image_field, field.thumbnail_field)))
+                continue
+            if field.source == '*' or '.' in field.source or isinstance(field, serializers.SerializerMethodField):
+                raise ValueError(f"{self.serializer_class.__name__}.{field.field_name} cannot be read from values()")
+            columns.append(field.source)
+            converters.append((field.field_name, compile_converter(model._meta.get_field(field.source), field)))
+        return list(dict.fromkeys(columns)), converters
+
+    def values(self, queryset):
+        return queryset.values(*self.compiled[0])
+
+    def serialize(self, rows, request=None):
+        converters = self.compiled[1]
+        with timed('serialize'):
+            return [
+                {
+                    name: row[column] if convert is None else convert(row, request)
+                    for name, (column, convert) in converters
+                }
+                for row in rows
+            ]
+
+
+def compile_converter(model_field, field):
+    # (column, convert) for one serializer field; convert None means the database value is used as it is
+    column = field.source
+    if isinstance(field, serializers.FileField):
+        use_url = getattr(field, 'use_url', api_settings.UPLOADED_FILES_USE_URL)
+        storage = model_field.storage
+
+        def convert(row, request):
+            name = row[column]
+            if not name:
+                return None
+            if not use_url:
+                return name
+            url = storage.url(name)
+            return request.build_absolute_uri(url) if request is not None else url
+        return column, convert
+
+    if isinstance(field, serializers.DecimalField) and getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING) \
+            and not field.localize and not field.normalize_output and field.decimal_places is not None:
+        quantum = decimal.Decimal('.1') ** field.decimal_places
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+        rounding = field.rounding
+
+        def convert(row, request):
+            value = row[column]
+            if value is None:
+                return None
+            if not isinstance(value, decimal.Decimal):
+                value = decimal.Decimal(str(value).strip())
+            return f'{value.quantize(quantum, rounding=rounding, context=context):f}'
+        return column, convert
+
+    # Strings and integers come back from the database already in their serialized form
+    if type(field) in (serializers.CharField, serializers.EmailField, serializers.IntegerField):
+        return column, None
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return column, None
+    if isinstance(field, serializers.RelatedField):
+        raise ValueError(f"{field.field_name} cannot be read from values()")
+
+    def convert(row, request):
+        value = row[column]
+        return None if value is None else field.to_representation(value)
+    return column, convert
+
+
+def thumbnail_url_converter(model, image_field, thumbnail_field):
+    image_storage = model._meta.get_field(image_field).storage
+    thumbnail_storage = model._meta.get_field(thumbnail_field).storage
+
+    def convert(row, request):
+        name, storage = row[thumbnail_field], thumbnail_storage
+        if not name:
+            name, storage = row[image_field], image_storage
+        if not name:
+            return None
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+    return None, convert
+
+
+ITEM_LIST_SERIALIZER = ValuesSerializer(ItemSerializer)
+CUSTOMER_LIST_SERIALIZER = ValuesSerializer(CustomerSerializer)
+VENDOR_LIST_SERIALIZER = ValuesSerializer(VendorSerializer)
+
+
+
+def resolve_line_items(orders):
+    # Items named by the orders' lines, fetched in one query; lines hold a plain item_id, not a foreign key
+    item_ids = {line.item_id for order in orders for line in order.items.all()}
+    if not item_ids:
+        return {}
+    return Item.objects.filter(user_id=orders[0].user_id, item_id__in=item_ids).only(
+        'item_id', 'name', 'image', 'thumbnail'
+    ).in_bulk()
+
+
+class OrderListSerializer(serializers.ListSerializer):
+    # Resolves the items of every line on the page up front, instead of once per line
+    def to_representation(self, data):
+        orders = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.context['line_items'] = resolve_line_items(orders)
+        return super().to_representation(orders)
+
+
+class OrderSerializer(TimedModelSerializer):
+    def to_representation(self, instance):
+        if 'line_items' not in self.context:
+            self.context['line_items'] = resolve_line_items([instance])
+        return super().to_representation(instance)
+
+
+class OrderLineSerializer(TimedModelSerializer):
+    # Name and picture of the line's item, so clients need no extra lookups to show an order
+    item_name = serializers.SerializerMethodField()
+    item_thumbnail_url = serializers.SerializerMethodField()
+
+    def line_item(self, line):
+        return self.context.get('line_items', {}).get(line.item_id)
+
+    def get_item_name(self, line):
+        item = self.line_item(line)
+        return item.name if item is not None else None
+
+    def get_item_thumbnail_url(self, line):
+        item = self.line_item(line)
+        return thumbnail_url(item.image, item.thumbnail, self.context.get('request')) if item is not None else None
+
+
+class SaleOrderItemSerializer(OrderLineSerializer):
     class Meta:
         model = SaleOrderItem
-        fields = ['item_id', 'quantity', 'rate', 'user']
+        fields = ['item_id', 'item_name', 'item_thumbnail_url', 'quantity', 'rate', 'user']
+        # Lines always belong to the order's user, so skip a user lookup per line
+        read_only_fields = ['user']
 
-class SaleOrderSerializer(serializers.ModelSerializer):
+class SaleOrderSerializer(OrderSerializer):
     items = SaleOrderItemSerializer(many=True)
 
     class Meta:
         model = SaleOrder
+        list_serializer_class = OrderListSerializer
         fields = ['sale_order_id', 'date', 'customer_id', 'customer_name', 'customer_email',
                   'customer_address', 'customer_state', 'customer_city', 'customer_pincode',
                   'mode_of_delivery', 'carrier', 'payment_received', 'items', 'discount',
-                  'total_amount', 'invoice_pdf', 'user']
-        read_only_fields = ['sale_order_id', 'date', 'invoice_pdf']
+                  'total_amount', 'invoice_pdf', 'invoice_status', 'user']
+        read_only_fields = ['sale_order_id', 'date', 'invoice_pdf', 'invoice_status']
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        sale_order = SaleOrder.objects.create(**validated_data)
-        for item_data in items_data:
-            item_data['user'] = validated_data['user']
-            SaleOrderItem.objects.create(sale_order=sale_order, **item_data)
+        with transaction.atomic():
+            sale_order = SaleOrder.objects.create(**validated_data)
+            SaleOrderItem.objects.bulk_create(
+                [SaleOrderItem(sale_order=sale_order, user=sale_order.user, **item_data) for item_data in items_data],
+                batch_size=BULK_BATCH_SIZE
+            )
         return sale_order
 
 
 
-class PurchaseOrderItemSerializer(serializers.ModelSerializer):
+class PurchaseOrderItemSerializer(OrderLineSerializer):
     class Meta:
         model = PurchaseOrderItem
-        fields = ['item_id', 'quantity', 'rate', 'user']
+        fields = ['item_id', 'item_name', 'item_thumbnail_url', 'quantity', 'rate', 'user']
+        # Lines always belong to the order's user, so skip a user lookup per line
+        read_only_fields = ['user']
 
-class PurchaseOrderSerializer(serializers.ModelSerializer):
+class PurchaseOrderSerializer(OrderSerializer):
     items = PurchaseOrderItemSerializer(many=True)
 
     class Meta:
         model = PurchaseOrder
+        list_serializer_class = OrderListSerializer
         fields = ['purchase_order_id', 'date', 'vendor_id', 'vendor_name', 'vendor_address', 'payment_status', 'items', 'total_amount', 'user']
         read_only_fields = ['purchase_order_id', 'date']
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        purchase_order = PurchaseOrder.objects.create(**validated_data)
-        for item_data in items_data:
-            item_data['user'] = validated_data['user']
-            PurchaseOrderItem.objects.create(purchase_order=purchase_order, **item_data)
+        with transaction.atomic():
+            purchase_order = PurchaseOrder.objects.create(**validated_data)
+            PurchaseOrderItem.objects.bulk_create(
+                [PurchaseOrderItem(purchase_order=purchase_order, user=purchase_order.user, **item_data) for item_data in items_data],
+                batch_size=BULK_BATCH_SIZE
+            )
         return purchase_order
 
 
 
-class ShipmentSerializer(serializers.ModelSerializer):
+class ShipmentSerializer(TimedModelSerializer):
     class Meta:
         model = Shipment
         fields = ['shipment_id', 'date', 'order_id', 'customer_name', 'carrier', 'tracking_id', 'status', 'user']
@@ -141,8 +344,18 @@ class ShipmentSerializer(serializers.ModelSerializer):
 
 
    
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedModelSerializer):
+    thumbnail_url = ThumbnailUrlField('image', 'thumbnail')
+
     class Meta:
         model = Category
-        fields = ['id', 'name', 'image', 'user']
-        read_only_fields = ['id']
\ No newline at end of file
+        fields = ['id', 'name', 'image', 'thumbnail_url', 'user']
+        read_only_fields = ['id']
+
+
+
+class StockMovementSerializer(TimedModelSerializer):
+    class Meta:
+        model = StockMovement
+        fields = ['movement_id', 'item_id', 'quantity_change', 'reason', 'reference_id', 'created_at']
+        read_only_fields = fields
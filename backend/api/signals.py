@@ -0,0 +1,161 @@
+from django.db import connections
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+from .authentication import invalidate_cached_user
+from .jobs import enqueue_job
+from .models import (
+    Category, Company, CustomUser, Customer, Item, PurchaseOrder, SaleOrder, SaleOrderItem, Shipment, Vendor,
+)
+from .search import ensure_sqlite_triggers
+from .summary import adjust_summary, record_new_customer, stock_delta
+from .thumbnails import THUMBNAIL_SOURCES, delete_thumbnail_on_commit, needs_thumbnail
+from .versions import bump_version, record_changes
+
+
+@receiver(post_save, sender=SaleOrder)
+def sale_order_saved(sender, instance, created, **kwargs):
+    record_changes(instance.user_id, 'sale_orders', [instance.pk])
+    if created:
+        adjust_summary(instance.user_id, total_revenue=instance.total_amount, total_orders=1)
+
+
+@receiver(pre_delete, sender=SaleOrder)
+def sale_order_deleting(sender, instance, **kwargs):
+    # Takes the order's units back off its items' running totals while its lines still exist. Item rows are
+    # locked before the collection versions and the summary, in the order every write takes them
+    sold = SaleOrderItem.objects.filter(sale_order=instance, item_id=OuterRef('item_id'))\
+        .values('item_id')\
+        .annotate(total_quantity=Sum('quantity'))\
+        .values('total_quantity')
+    item_ids = SaleOrderItem.objects.filter(sale_order=instance).values('item_id')
+    Item.objects.filter(user_id=instance.user_id, item_id__in=item_ids)\
+        .update(units_sold=Greatest(F('units_sold') - Coalesce(Subquery(sold), 0), 0))
+
+
+@receiver(post_delete, sender=SaleOrder)
+def sale_order_deleted(sender, instance, **kwargs):
+    record_changes(instance.user_id, 'sale_orders', [instance.pk], deleted=True)
+    adjust_summary(instance.user_id, total_revenue=-instance.total_amount, total_orders=-1)
+
+
+@receiver(post_save, sender=PurchaseOrder)
+def purchase_order_saved(sender, instance, **kwargs):
+    record_changes(instance.user_id, 'purchase_orders', [instance.pk])
+
+
+@receiver(post_delete, sender=PurchaseOrder)
+def purchase_order_deleted(sender, instance, **kwargs):
+    record_changes(instance.user_id, 'purchase_orders', [instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, **kwargs):
+    bump_version(instance.user_id, 'categories')
+
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    # Items of the category are set to no category with a plain UPDATE, which sends no signals
+    instance._item_ids = list(Item.objects.filter(category=instance).values_list('item_id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    bump_version(instance.user_id, 'categories')
+    record_changes(instance.user_id, 'items', getattr(instance, '_item_ids', []))
+
+
+@receiver(post_save, sender=Shipment)
+def shipment_saved(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_values', {})
+    if created:
+        was_pending = False
+    elif 'status' in loaded:
+        was_pending = loaded['status'] == 'IN_TRANSIT'
+    else:
+        return
+    adjust_summary(instance.user_id, pending_shipments=int(instance.status == 'IN_TRANSIT') - int(was_pending))
+    instance.remember_loaded_values('status')
+
+
+@receiver(post_delete, sender=Shipment)
+def shipment_deleted(sender, instance, **kwargs):
+    if instance.status == 'IN_TRANSIT':
+        adjust_summary(instance.user_id, pending_shipments=-1)
+
+
+@receiver(post_save, sender=Customer)
+def customer_saved(sender, instance, created, **kwargs):
+    record_changes(instance.user_id, 'customers', [instance.pk])
+    if created:
+        record_new_customer(instance.user_id, instance.created_at)
+
+
+@receiver(post_delete, sender=Customer)
+def customer_deleted(sender, instance, **kwargs):
+    record_changes(instance.user_id, 'customers', [instance.pk], deleted=True)
+    record_new_customer(instance.user_id, instance.created_at, count=-1)
+
+
+@receiver(post_save, sender=Vendor)
+@receiver(post_delete, sender=Vendor)
+def vendor_changed(sender, instance, **kwargs):
+    bump_version(instance.user_id, 'vendors')
+
+
+@receiver(post_save, sender=Item)
+def item_saved(sender, instance, created, **kwargs):
+    record_changes(instance.user_id, 'items', [instance.pk])
+    loaded = getattr(instance, '_loaded_values', {})
+    if created:
+        old = None
+    elif 'quantity' in loaded and 'reorder_point' in loaded:
+        old = (loaded['quantity'], loaded['reorder_point'])
+    else:
+        return
+    adjust_summary(instance.user_id, **stock_delta(old, (instance.quantity, instance.reorder_point)))
+    instance.remember_loaded_values('quantity', 'reorder_point')
+
+
+@receiver(post_delete, sender=Item)
+def item_deleted(sender, instance, **kwargs):
+    record_changes(instance.user_id, 'items', [instance.pk], deleted=True)
+    adjust_summary(instance.user_id, **stock_delta((instance.quantity, instance.reorder_point), None))
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def user_changed(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def company_changed(sender, instance, **kwargs):
+    invalidate_cached_user(instance.user_id)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == 'api' and connections[using].vendor == 'sqlite':
+        ensure_sqlite_triggers(connections[using])
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Company)
+def image_saved(sender, instance, **kwargs):
+    # Resized derivatives are rendered by the job workers, not on the request
+    model_name = sender._meta.model_name
+    _, source_field, thumbnail_field = THUMBNAIL_SOURCES[model_name]
+    loaded = getattr(instance, '_loaded_values', {})
+    # Only a new or replaced image is queued; other saves of a row whose job has not run yet would queue it again
+    changed = source_field not in loaded or loaded[source_field] != instance.stored_value(source_field)
+    instance.remember_loaded_values(source_field)
+    if changed and needs_thumbnail(instance, source_field, thumbnail_field):
+        enqueue_job('process_thumbnail', model=model_name, pk=instance.pk)
+    elif not getattr(instance, source_field) and getattr(instance, thumbnail_field):
+        sender.objects.filter(pk=instance.pk).update(**{thumbnail_field: None})
+        delete_thumbnail_on_commit(getattr(instance, thumbnail_field))
@@ -0,0 +1,88 @@
+from itertools import chain
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Sum
+from django.utils import timezone
+from .models import CustomUser, StockMovement, StockSnapshot
+from .versions import lock_version
+
+
+def record_movements(user, changes, reason, reference_id=None):
+    # changes maps item_id -> signed quantity change; written with a single INSERT.
+    # Callers bump the user's items version first in the same transaction (record_changes or the Item save
+    # signal), so the row lock take_snapshots waits on is held while the movements are uncommitted
+    now = timezone.now()
+    StockMovement.objects.bulk_create([
+        StockMovement(
+            item_id=item_id,
+            user=user,
+            quantity_change=change,
+            reason=reason,
+            reference_id=reference_id,
+            created_at=now,
+        )
+        for item_id, change in changes.items() if change
+    ])
+
+
+def stock_at(item_id, at=None):
+    # Start from the latest snapshot taken at or before `at` and replay only the movements after it
+    at = at or timezone.now()
+    snapshot = StockSnapshot.objects.filter(item_id=item_id, created_at__lte=at).order_by('-created_at', '-snapshot_id').first()
+    movements = StockMovement.objects.filter(item_id=item_id, created_at__lte=at)
+    quantity = 0
+    if snapshot is not None:
+        movements = movements.filter(movement_id__gt=snapshot.last_movement_id)
+        quantity = snapshot.quantity
+    return quantity + (movements.aggregate(total=Sum('quantity_change'))['total'] or 0)
+
+
+def take_snapshots(user_id=None):
+    if user_id is not None:
+        return snapshot_user(user_id)
+    user_ids = CustomUser.objects.filter(Exists(StockMovement.objects.filter(user=OuterRef('pk')))).values_list('pk', flat=True)
+    return sum(snapshot_user(user_id) for user_id in list(user_ids))
+
+
+@transaction.atomic
+def snapshot_user(user_id):
+    # The cutoff is only safe once no lower movement id can still commit. On Postgres ids are handed out
+    # before commit, so wait for the user's in-flight stock writes (which hold the items version lock, see
+    # record_movements) and keep new ones, whose ids will be higher, waiting until the snapshots are written
+    lock_version(user_id, 'items')
+    movements = StockMovement.objects.filter(user_id=user_id)
+    snapshots = StockSnapshot.objects.filter(user_id=user_id)
+
+    upto = movements.aggregate(last=Max('movement_id'))['last']
+    if upto is None:
+        return 0
+
+    # Latest snapshot per item
+    latest_ids = snapshots.values('item_id').annotate(latest=Max('snapshot_id')).values('latest')
+    latest = {snapshot.item_id: snapshot for snapshot in StockSnapshot.objects.filter(snapshot_id__in=latest_ids)}
+
+    # Replay movements newer than each item's snapshot. Snapshotted items are read from the oldest cutoff
+    # among them; items without a snapshot yet from the start
+    since = min((snapshot.last_movement_id for snapshot in latest.values()), default=0)
+    snapshotted = snapshots.values('item_id')
+    balances = {}
+    rows = chain.from_iterable(
+        queryset.values_list('item_id', 'movement_id', 'quantity_change').order_by().iterator(chunk_size=5000)
+        for queryset in (
+            movements.filter(item_id__in=snapshotted, movement_id__gt=since, movement_id__lte=upto),
+            movements.exclude(item_id__in=snapshotted).filter(movement_id__lte=upto),
+        )
+    )
+    for item_id, movement_id, change in rows:
+        snapshot = latest.get(item_id)
+        if snapshot is not None and movement_id <= snapshot.last_movement_id:
+            continue
+        if item_id not in balances:
+            balances[item_id] = snapshot.quantity if snapshot is not None else 0
+        balances[item_id] += change
+
+    now = timezone.now()
+    StockSnapshot.objects.bulk_create([
+        StockSnapshot(item_id=item_id, user_id=user_id, quantity=quantity, last_movement_id=upto, created_at=now)
+        for item_id, quantity in balances.items()
+    ], batch_size=1000)
+    return len(balances)
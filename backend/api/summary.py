@@ -0,0 +1,115 @@
+from datetime import datetime, time
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Customer, DashboardSummary, Item, SaleOrder, SaleOrderItem, Shipment
+
+
+def current_month():
+    return timezone.localdate().replace(day=1)
+
+
+def stock_counts(quantity, reorder_point):
+    # Same buckets the dashboard has always used: low stock also includes out of stock items
+    return {
+        'total_stock': quantity,
+        'item_count': 1,
+        'low_stock_count': int(quantity <= reorder_point),
+        'out_of_stock_count': int(quantity == 0),
+    }
+
+
+def stock_delta(old, new):
+    # old and new are (quantity, reorder_point) pairs, or None when the item did not / no longer exists
+    delta = {}
+    for state, sign in ((old, -1), (new, 1)):
+        if state is not None:
+            for field, value in stock_counts(*state).items():
+                delta[field] = delta.get(field, 0) + sign * value
+    return delta
+
+
+def item_stock_delta(items):
+    # Combined delta for items loaded from the database and changed in memory, e.g. before a bulk_update
+    delta = {}
+    for item in items:
+        loaded = item._loaded_values
+        change = stock_delta((loaded['quantity'], loaded['reorder_point']), (item.quantity, item.reorder_point))
+        for field, value in change.items():
+            delta[field] = delta.get(field, 0) + value
+    return delta
+
+
+def adjust_summary(user_id, **deltas):
+    # Missing summaries are left alone; they are built from scratch on first read. Locks the summary row, so it
+    # comes after any record_changes/bump_version in the same transaction
+    changes = {field: F(field) + value for field, value in deltas.items() if value}
+    if changes:
+        DashboardSummary.objects.filter(user_id=user_id).update(**changes)
+
+
+def record_new_customer(user_id, created_at, count=1):
+    month = current_month()
+    if timezone.localdate(created_at).replace(day=1) != month:
+        return
+    updated = DashboardSummary.objects.filter(user_id=user_id, new_customers_month=month).update(
+        new_customers=F('new_customers') + count
+    )
+    if not updated and count > 0:
+        # First new customer since the month rolled over
+        DashboardSummary.objects.filter(user_id=user_id).update(new_customers=count, new_customers_month=month)
+
+
+def rebuild_summary(user_id):
+    month = current_month()
+    # Range filter rather than __month/__year so the (user, created_at) index is used
+    month_start = timezone.make_aware(datetime.combine(month, time.min))
+    # Commit the row before counting, so writes from here on apply their deltas to it instead of skipping it
+    DashboardSummary.objects.get_or_create(user_id=user_id)
+    with transaction.atomic(using='default'):
+        # Lock the user's items, then the summary row. Every write takes its locks in one order: item rows, then
+        # collection versions (record_changes, bump_version, lock_version), then the summary row last, so two
+        # writes, or a write and this rebuild, never wait on each other in a cycle. Writes that already touched the
+        # row have committed once the lock is granted and are counted below; later ones wait and apply their
+        # deltas on top of the rebuilt totals. Everything is read from the primary: replica totals may lag, and
+        # they become the baseline for every later delta
+        items = Item.objects.using('default').filter(user_id=user_id)
+        list(items.select_for_update().values_list('item_id', flat=True))
+        summary = DashboardSummary.objects.using('default').select_for_update().get(user_id=user_id)
+
+        orders = SaleOrder.objects.using('default').filter(user_id=user_id).aggregate(
+            total_revenue=Sum('total_amount'),
+            total_orders=Count('sale_order_id'),
+        )
+        stock = items.aggregate(
+            total_stock=Sum('quantity'),
+            item_count=Count('item_id'),
+            low_stock_count=Count('item_id', filter=Q(quantity__lte=F('reorder_point'))),
+            out_of_stock_count=Count('item_id', filter=Q(quantity=0)),
+        )
+        summary.total_revenue = orders['total_revenue'] or 0
+        summary.total_orders = orders['total_orders']
+        summary.pending_shipments = Shipment.objects.using('default').filter(user_id=user_id, status='IN_TRANSIT').count()
+        summary.new_customers = Customer.objects.using('default').filter(user_id=user_id, created_at__gte=month_start).count()
+        summary.new_customers_month = month
+        summary.total_stock = stock['total_stock'] or 0
+        summary.item_count = stock['item_count']
+        summary.low_stock_count = stock['low_stock_count']
+        summary.out_of_stock_count = stock['out_of_stock_count']
+        summary.save(using='default')
+
+        # Per-item running totals used for the top selling products
+        sold = SaleOrderItem.objects.filter(sale_order__user_id=user_id, item_id=OuterRef('item_id'))\
+            .values('item_id')\
+            .annotate(total_quantity=Sum('quantity'))\
+            .values('total_quantity')
+        items.update(units_sold=Coalesce(Subquery(sold), 0))
+    return summary
+
+
+def get_summary(user_id):
+    summary = DashboardSummary.objects.filter(user_id=user_id).first()
+    if summary is None:
+        summary = rebuild_summary(user_id)
+    return summary
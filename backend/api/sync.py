@@ -0,0 +1,40 @@
+from .models import ChangeLogEntry, Customer, Item, PurchaseOrder, SaleOrder
+from .serializers import CustomerSerializer, ItemSerializer, PurchaseOrderSerializer, SaleOrderSerializer
+
+# collection -> (model, serializer, related lines to prefetch)
+SYNC_SOURCES = {
+    'items': (Item, ItemSerializer, None),
+    'customers': (Customer, CustomerSerializer, None),
+    'sale_orders': (SaleOrder, SaleOrderSerializer, 'items'),
+    'purchase_orders': (PurchaseOrder, PurchaseOrderSerializer, 'items'),
+}
+
+SYNC_PAGE_SIZE = 500
+
+
+def changes_since(user, collection, since, limit=SYNC_PAGE_SIZE):
+    # Change ids of a user's collection are committed in order (see record_changes), so the cursor never skips one
+    entries = list(
+        ChangeLogEntry.objects.filter(user=user, collection=collection, change_id__gt=since)
+        .order_by('change_id')
+        .values_list('change_id', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # Latest change per row wins
+    deleted_by_id = {}
+    for _, object_id, deleted in entries:
+        deleted_by_id[object_id] = deleted
+
+    model, serializer_class, prefetch = SYNC_SOURCES[collection]
+    rows = model.objects.filter(user=user, pk__in=[pk for pk, deleted in deleted_by_id.items() if not deleted]).order_by('pk')
+    if prefetch:
+        rows = rows.prefetch_related(prefetch)
+
+    return {
+        'cursor': entries[-1][0] if entries else since,
+        'has_more': has_more,
+        'updated': serializer_class(rows, many=True).data,
+        'deleted': [pk for pk, deleted in deleted_by_id.items() if deleted],
+    }
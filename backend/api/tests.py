@@ -1,3 +1,1731 @@
-from django.test import TestCase
+import csv
+import json
+import logging
+import math
+import os
+import re
+import runpy
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from django.apps import apps as django_apps
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F, Sum
+from django.db.models.signals import post_migrate
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver
+from django.utils import timezone
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+from backend import settings as settings_module
+from .exports import SALE_ORDER_EXPORT_FIELDS
+from .invoices import generate_invoice_pdf, get_invoice_template
+from .bulk import update_rows
+from .authentication import get_cached_user, user_cache_key
+from .checks import check_replica_pin_cache
+from .jobs import RETRY_BASE_SECONDS, claim_job, enqueue_job, run_pending_jobs
+from .serializers import (
+    BULK_BATCH_SIZE, CUSTOMER_LIST_SERIALIZER, ITEM_LIST_SERIALIZER, VENDOR_LIST_SERIALIZER, CustomerSerializer,
+    ItemSerializer, PurchaseOrderSerializer, SaleOrderSerializer, VendorSerializer,
+)
+from .models import (
+    BackgroundJob, Category, ChangeLogEntry, CollectionVersion, Company, CustomUser, Customer, DashboardSummary, Item, PurchaseOrder,
+    PurchaseOrderItem, SaleOrder, SaleOrderItem, Shipment, StockMovement, StockSnapshot, Vendor,
+)
+from .routers import ReplicaRouter, begin_request, end_request, pin_key, set_request_user
+from .search import SQLITE_TRIGGERS_SQL, ensure_sqlite_triggers, search_item_ids
+from .seeding import seed_tenant
+from .stock import record_movements, stock_at, take_snapshots
+from .thumbnails import THUMBNAIL_SIZE, thumbnail_name
+from .summary import rebuild_summary
+from .sync import changes_since
+from .versions import compact_change_log, get_version
 
-# Create your tests here.
+# Password hashing alone puts login and password changes over the production latency budget, so the suite runs
+# with budgets no request reaches; ServerTimingTests lowers them to check the over-budget warning
+_suite_budgets = override_settings(PERFORMANCE_QUERY_BUDGET=10 ** 6, PERFORMANCE_LATENCY_BUDGET_MS=10 ** 9)
+
+
+def setUpModule():
+    _suite_budgets.enable()
+
+
+def tearDownModule():
+    _suite_budgets.disable()
+
+
+class AuthenticatedAPITestCase(TestCase):
+    # A user named user_name, and an API client logged in as them. INFO logs, one per request, are silenced
+    user_name = 'Test'
+
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.user = CustomUser.objects.create_user(
+            email=f'{self.user_name.lower()}@example.com', password='secret-pass-1', name=self.user_name
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked against SQLite')
+class HotQueryIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(email='owner@example.com', password='secret', name='Owner')
+
+    def assertUsesIndex(self, queryset, ordered=False):
+        plan = queryset.explain()
+        for line in plan.splitlines():
+            if ' SCAN ' in f' {line} ' and 'INDEX' not in line:
+                self.fail(f"Table scan for:\n{queryset.query}\n\nPlan:\n{plan}")
+            if ordered and 'TEMP B-TREE FOR ORDER BY' in line:
+                self.fail(f"Sort not served by an index for:\n{queryset.query}\n\nPlan:\n{plan}")
+
+    def test_item_pages(self):
+        self.assertUsesIndex(Item.objects.filter(user=self.user).order_by('item_id')[:50], ordered=True)
+
+    def test_item_filters(self):
+        self.assertUsesIndex(Item.objects.filter(user=self.user, quantity__lte=F('reorder_point')))
+        self.assertUsesIndex(Item.objects.filter(user=self.user, quantity=0))
+        self.assertUsesIndex(Item.objects.filter(user=self.user, brand='Acme'))
+
+    def test_top_selling_items(self):
+        top_items = Item.objects.filter(user=self.user, units_sold__gt=0).order_by('-units_sold')[:5]
+        self.assertUsesIndex(top_items, ordered=True)
+
+    def test_pending_shipments(self):
+        self.assertUsesIndex(Shipment.objects.filter(user=self.user, status='IN_TRANSIT'))
+
+    def test_shipment_pages(self):
+        shipments = Shipment.objects.filter(user=self.user)
+        self.assertUsesIndex(shipments.order_by('-shipment_id')[:50], ordered=True)
+        self.assertUsesIndex(shipments.filter(status='IN_TRANSIT').order_by('-shipment_id')[:50], ordered=True)
+        self.assertUsesIndex(shipments.filter(carrier='UPS').order_by('-shipment_id')[:50], ordered=True)
+        self.assertUsesIndex(shipments.filter(date__gte=timezone.now() - timedelta(days=7)))
+
+    def test_new_customers(self):
+        since = timezone.now() - timedelta(days=30)
+        self.assertUsesIndex(Customer.objects.filter(user=self.user, created_at__gte=since))
+
+    def test_item_sales_totals(self):
+        totals = SaleOrderItem.objects.filter(sale_order__user=self.user)\
+            .values('item_id')\
+            .annotate(total_quantity=Sum('quantity'))
+        self.assertUsesIndex(totals)
+
+
+class SeedDataTests(TestCase):
+    def test_seeded_tenant_is_consistent(self):
+        user = CustomUser.objects.create_user(email='seed@example.com', password='secret', name='Seed')
+        counts = seed_tenant(user, items=50, customers=10, vendors=3, sale_orders=80, purchase_orders=20, seed=7)
+        self.assertEqual(counts, {'items': 50, 'customers': 10, 'vendors': 3, 'sale_orders': 80, 'purchase_orders': 20})
+        for model, count in ((Item, 50), (Customer, 10), (Vendor, 3), (SaleOrder, 80), (PurchaseOrder, 20), (Category, 8)):
+            self.assertEqual(model.objects.filter(user=user).count(), count, model.__name__)
+
+        items = {item.item_id: item for item in Item.objects.filter(user=user)}
+        customers = {customer.customer_id: customer for customer in Customer.objects.filter(user=user)}
+        vendors = {vendor.vendor_id: vendor for vendor in Vendor.objects.filter(user=user)}
+        shipments = {shipment.order_id: shipment for shipment in Shipment.objects.filter(user=user)}
+        history_start = timezone.now() - timedelta(days=366)
+
+        # Sale orders: lines priced at the items' selling prices, totals, customers and one shipment per delivery
+        units_sold = Counter()
+        for order in SaleOrder.objects.filter(user=user).prefetch_related('items'):
+            lines = list(order.items.all())
+            self.assertTrue(lines)
+            for line in lines:
+                self.assertEqual(line.user_id, user.id)
+                self.assertEqual(line.rate, items[line.item_id].selling_price)
+                units_sold[line.item_id] += line.quantity
+            self.assertEqual(order.total_amount, sum(line.quantity * line.rate for line in lines) - order.discount)
+            customer = customers[order.customer_id]
+            self.assertEqual((order.customer_name, order.customer_email), (customer.name, customer.email))
+            self.assertGreater(order.date, history_start)
+            shipment = shipments.pop(order.sale_order_id, None)
+            if order.mode_of_delivery == 'DELIVERY':
+                self.assertEqual((shipment.carrier, shipment.customer_name, shipment.date), (order.carrier, order.customer_name, order.date))
+            else:
+                self.assertIsNone(shipment)
+        self.assertEqual(shipments, {})
+
+        for order in PurchaseOrder.objects.filter(user=user).prefetch_related('items'):
+            lines = list(order.items.all())
+            self.assertTrue(lines)
+            self.assertTrue(all(line.rate == items[line.item_id].purchase_price for line in lines))
+            self.assertEqual(order.total_amount, sum(line.quantity * line.rate for line in lines))
+            self.assertEqual(order.vendor_name, vendors[order.vendor_id].name)
+
+        # Orders are spread over the history rather than all stamped with the seeding time
+        self.assertGreater(len(set(SaleOrder.objects.filter(user=user).values_list('date__date', flat=True))), 20)
+
+        # Derived data, recomputed here from the rows rather than by the code under test
+        sale_orders = list(SaleOrder.objects.filter(user=user))
+        summary = DashboardSummary.objects.get(user=user)
+        self.assertEqual(summary.total_revenue, sum(order.total_amount for order in sale_orders))
+        self.assertEqual(summary.total_orders, len(sale_orders))
+        self.assertEqual(summary.total_stock, sum(item.quantity for item in items.values()))
+        self.assertEqual(summary.item_count, len(items))
+        self.assertEqual(summary.low_stock_count, sum(item.quantity <= item.reorder_point for item in items.values()))
+        self.assertEqual(summary.out_of_stock_count, sum(item.quantity == 0 for item in items.values()))
+        self.assertEqual(summary.pending_shipments, Shipment.objects.filter(user=user).filter(status='IN_TRANSIT').count())
+        self.assertEqual({item_id: item.units_sold for item_id, item in items.items() if item.units_sold}, dict(units_sold))
+
+        # Opening stock is on the ledger, and every item is in the sync log
+        opening = dict(StockMovement.objects.filter(user=user, reason='OPENING').values_list('item_id', 'quantity_change'))
+        self.assertEqual(opening, {item_id: item.quantity for item_id, item in items.items() if item.quantity})
+        self.assertEqual(set(ChangeLogEntry.objects.filter(user=user, collection='items').values_list('object_id', flat=True)), set(items))
+
+    def test_same_seed_same_data(self):
+        names = []
+        for email in ('seed-a@example.com', 'seed-b@example.com'):
+            user = CustomUser.objects.create_user(email=email, password='secret', name='Seed')
+            seed_tenant(user, items=20, sale_orders=10, seed=3)
+            names.append(list(Item.objects.filter(user=user).order_by('item_id').values_list('name', 'quantity', 'selling_price')))
+        self.assertEqual(names[0], names[1])
+
+
+def make_tenant(size):
+    password = 'secret-pass-1'
+    user = CustomUser.objects.create_user(email=f'tenant{size}@example.com', password=password, name=f'Tenant {size}')
+    Company.objects.create(user=user)
+    seed_tenant(user, items=size, customers=size, vendors=size, sale_orders=size, purchase_orders=size, seed=size)
+    items = list(Item.objects.filter(user=user).order_by('item_id').values_list('item_id', 'selling_price'))
+    return SimpleNamespace(
+        size=size,
+        user=user,
+        password=password,
+        refresh=str(RefreshToken.for_user(user)),
+        item_id=items[0][0],
+        lines=[{'item_id': item_id, 'quantity': 1, 'rate': str(rate)} for item_id, rate in items[:2]],
+        customer_id=Customer.objects.filter(user=user).values_list('customer_id', flat=True).first(),
+        sale_order_id=SaleOrder.objects.filter(user=user).values_list('sale_order_id', flat=True).first(),
+        purchase_order_id=PurchaseOrder.objects.filter(user=user).values_list('purchase_order_id', flat=True).first(),
+        shipment_id=Shipment.objects.filter(user=user).values_list('shipment_id', flat=True).first(),
+        # A category with items in it, so deleting it has items to move
+        category_id=Item.objects.filter(user=user).values_list('category_id', flat=True).first(),
+    )
+
+
+# url name -> requests made against it, as (method, path, body, body format) built from a tenant.
+# Every named URL must be listed, so new endpoints get covered too.
+ENDPOINT_REQUESTS = {
+    'home': lambda t: [('get', '/', None, None)],
+    'register': lambda t: [('post', '/register/', {
+        'email': f'new{t.size}@example.com', 'password': 'secret-pass-2', 'name': 'New', 'phone_number': '123',
+    }, 'json')],
+    'login': lambda t: [('post', '/token/', {'email': t.user.email, 'password': t.password}, 'json')],
+    'token_refresh': lambda t: [('post', '/token/refresh/', {'refresh': t.refresh}, 'json')],
+    'user_details': lambda t: [
+        ('get', '/token/user/', None, None),
+        ('put', '/token/user/', {'password': t.password, 'name': 'Renamed', 'phone_number': '456'}, 'json'),
+    ],
+    'items': lambda t: [
+        ('get', '/token/items/', None, None),
+        ('get', '/token/items/?page_size=5', None, None),
+        ('post', '/token/items/', {
+            'name': 'New item', 'description': 'd', 'selling_price': '10.00', 'purchase_price': '5.00', 'quantity': 3,
+        }, 'json'),
+        ('put', '/token/items/', {'item_id': t.item_id, 'quantity': 7}, 'json'),
+    ],
+    'delete_item': lambda t: [('delete', f'/token/items/delete/{t.item_id}/', None, None)],
+    'item-search': lambda t: [('get', '/token/items/search/?q=item', None, None)],
+    'item-stock': lambda t: [('get', f'/token/items/{t.item_id}/stock/', None, None)],
+    'item-movements': lambda t: [('get', f'/token/items/{t.item_id}/movements/', None, None)],
+    'customer-list': lambda t: [
+        ('get', '/customers/', None, None),
+        ('post', '/customers/', {
+            'name': 'New', 'email': f'new-customer{t.size}@example.com', 'phone_number': '1', 'address': 'a',
+            'state': 's', 'city': 'c', 'pincode': '123456',
+        }, 'json'),
+        ('put', '/customers/', {'customer_id': t.customer_id, 'name': 'Renamed'}, 'json'),
+    ],
+    'customer-autocomplete': lambda t: [('get', '/customers/autocomplete/?q=cus', None, None)],
+    'vendors': lambda t: [
+        ('get', '/token/vendors/', None, None),
+        ('post', '/token/vendors/', {
+            'name': 'New', 'email': f'new-vendor{t.size}@example.com', 'phone_number': '1', 'address': 'a',
+        }, 'json'),
+    ],
+    'vendor-autocomplete': lambda t: [('get', '/token/vendors/autocomplete/?q=ven', None, None)],
+    'sale-orders': lambda t: [
+        ('get', '/token/saleorders/', None, None),
+        ('get', '/token/saleorders/?page_size=5', None, None),
+        ('post', '/token/saleorders/', {
+            'customer_id': t.customer_id, 'customer_name': 'Buyer', 'mode_of_delivery': 'DELIVERY', 'carrier': 'UPS',
+            'items': t.lines, 'total_amount': '100.00',
+        }, 'json'),
+    ],
+    'sale-order-export': lambda t: [
+        ('get', '/token/saleorders/export/', None, None),
+        ('get', '/token/saleorders/export/?file_format=ndjson', None, None),
+    ],
+    'update-sale-order': lambda t: [
+        ('put', f'/token/saleorders/{t.sale_order_id}/', {'payment_received': True}, 'json'),
+    ],
+    'purchase-orders': lambda t: [
+        ('get', '/token/purchaseorders/', None, None),
+        ('get', '/token/purchaseorders/?page_size=5', None, None),
+        ('post', '/token/purchaseorders/', {'vendor_name': 'Supplier', 'items': t.lines, 'total_amount': '50.00'}, 'json'),
+    ],
+    'purchase-order-export': lambda t: [('get', '/token/purchaseorders/export/', None, None)],
+    'update-purchase-order': lambda t: [
+        ('put', f'/token/purchaseorders/{t.purchase_order_id}/', {'payment_status': 'PAID'}, 'json'),
+    ],
+    'shipments': lambda t: [
+        ('get', '/token/shipments/', None, None),
+        ('get', '/token/shipments/?page_size=5', None, None),
+    ],
+    'update-shipment': lambda t: [('put', f'/token/shipments/{t.shipment_id}/', {'status': 'DELIVERED'}, 'json')],
+    'categories': lambda t: [
+        ('get', '/token/categories/', None, None),
+        ('post', '/token/categories/', {'name': f'New category {t.size}', 'item_ids': [t.item_id]}, 'json'),
+    ],
+    'category-detail': lambda t: [
+        ('put', f'/token/categories/{t.category_id}/', {'name': f'Renamed {t.size}'}, 'json'),
+        ('delete', f'/token/categories/{t.category_id}/', None, None),
+    ],
+    'company-details': lambda t: [
+        ('get', '/company/', None, None),
+        ('put', '/company/', {'password': t.password, 'company_name': 'Renamed'}, 'json'),
+    ],
+    'dashboard': lambda t: [('get', '/token/dashboard/', None, None)],
+    'import': lambda t: [('post', '/token/import/items/', {
+        'file': SimpleUploadedFile('items.csv', b'name,description,selling_price,purchase_price\nA,d,1,1\nB,d,2,2\n'),
+    }, 'multipart')],
+    'sync': lambda t: [
+        ('get', f'/token/sync/{collection}/', None, None)
+        for collection in ('items', 'customers', 'sale_orders', 'purchase_orders')
+    ],
+}
+
+# (url name, method) pairs whose query count is known to grow with the data; fix them, then drop them here
+KNOWN_QUERY_GROWTH = set()
+
+
+def normalize_sql(sql):
+    # Same statement with different literals counts as one shape
+    return re.sub(r"'[^']*'|\b\d+\b", '?', sql)
+
+
+class QueryCountRegressionTests(TestCase):
+    # Each request runs against a small and a larger tenant; the number of queries must not depend on the data size
+    SMALL = 3
+    LARGE = 15
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.small = make_tenant(cls.SMALL)
+        cls.large = make_tenant(cls.LARGE)
+
+    def setUp(self):
+        # The per-request performance log lines would flood the test output
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def capture(self, tenant, method, path, body, body_format):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(tenant.user).access_token}')
+        if isinstance(body, dict) and 'file' in body:
+            body['file'].seek(0)
+        # Cold caches for both tenants, and every request rolled back so the next one sees the seeded data
+        cache.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as captured:
+                response = getattr(client, method)(path, body, format=body_format)
+                content = b''.join(response.streaming_content) if response.streaming else response.content
+            transaction.set_rollback(True)
+        self.assertLess(response.status_code, 400, f"{method.upper()} {path}: {content[:300]!r}")
+        return [query['sql'] for query in captured.captured_queries]
+
+    def assertQueryCountStable(self, label, small_queries, large_queries):
+        if len(large_queries) <= len(small_queries):
+            return
+        small_shapes = Counter(map(normalize_sql, small_queries))
+        large_shapes = Counter(map(normalize_sql, large_queries))
+        grown = [
+            f"  {small_shapes[shape]} -> {count} x {shape}"
+            for shape, count in large_shapes.items() if count > small_shapes[shape]
+        ]
+        self.fail(
+            f"{label}: {len(small_queries)} queries with {self.SMALL} rows per table, "
+            f"{len(large_queries)} with {self.LARGE}. Statements that grew:\n" + "\n".join(grown)
+        )
+
+    def test_every_url_is_exercised(self):
+        names = {
+            pattern.name for pattern in get_resolver().url_patterns
+            if isinstance(pattern, URLPattern) and pattern.name
+        }
+        self.assertEqual(names - ENDPOINT_REQUESTS.keys(), set(), "Add these URLs to ENDPOINT_REQUESTS")
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for name, build_requests in ENDPOINT_REQUESTS.items():
+            for (method, path, body, body_format), (_, large_path, large_body, _) in zip(
+                build_requests(self.small), build_requests(self.large)
+            ):
+                label = f"{method.upper()} {path} ({name})"
+                with self.subTest(label):
+                    if (name, method) in KNOWN_QUERY_GROWTH:
+                        self.skipTest('known to grow with the data')
+                    small_queries = self.capture(self.small, method, path, body, body_format)
+                    large_queries = self.capture(self.large, method, large_path, large_body, body_format)
+                    self.assertQueryCountStable(label, small_queries, large_queries)
+
+    def test_invoice_query_count_does_not_grow_with_lines(self):
+        counts = {}
+        for tenant in (self.small, self.large):
+            items = list(Item.objects.filter(user=tenant.user).values_list('item_id', 'selling_price'))
+            sale_order = SaleOrder.objects.create(customer_name='Buyer', mode_of_delivery='PICKUP', carrier='UPS', total_amount=1, user=tenant.user)
+            SaleOrderItem.objects.bulk_create([
+                SaleOrderItem(sale_order=sale_order, item_id=item_id, quantity=1, rate=rate, user=tenant.user)
+                for item_id, rate in items
+            ])
+            with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+                with CaptureQueriesContext(connection) as captured:
+                    generate_invoice_pdf(SaleOrder.objects.get(pk=sale_order.pk))
+            counts[tenant.size] = [query['sql'] for query in captured.captured_queries]
+        self.assertQueryCountStable('generate_invoice_pdf', counts[self.SMALL], counts[self.LARGE])
+
+
+class OrderListTests(AuthenticatedAPITestCase):
+    user_name = 'Orders'
+
+    def setUp(self):
+        super().setUp()
+        Company.objects.create(user=self.user)
+        seed_tenant(self.user, items=5, customers=2, vendors=2, sale_orders=20, purchase_orders=20, seed=4)
+
+    def test_lines_embed_item_details(self):
+        names = dict(Item.objects.filter(user=self.user).values_list('item_id', 'name'))
+        for path in ('/token/saleorders/', '/token/purchaseorders/'):
+            # Orders, their lines and the lines' items: one query each, on top of the request's own
+            with CaptureQueriesContext(connection) as captured:
+                orders = self.client.get(path).json()
+            self.assertEqual(len(orders), 20)
+            self.assertEqual(sum('"api_item"' in query['sql'] for query in captured.captured_queries), 1)
+            for line in (line for order in orders for line in order['items']):
+                self.assertEqual(line['item_name'], names[line['item_id']])
+                self.assertIsNone(line['item_thumbnail_url'])
+
+            page = self.client.get(path, {'page_size': 5}).json()
+            self.assertEqual(len(page['results']), 5)
+            self.assertEqual(page['results'][0]['items'][0]['item_name'], names[page['results'][0]['items'][0]['item_id']])
+
+
+class ValuesSerializerTests(TestCase):
+    def test_output_matches_model_serializers(self):
+        user = CustomUser.objects.create_user(email='values@example.com', password='secret-pass-1', name='Values')
+        seed_tenant(user, items=30, customers=10, vendors=10, seed=7)
+        Item.objects.filter(item_id__in=Item.objects.filter(user=user).values('item_id')[:3]).update(image='item_images/a b.png')
+        Item.objects.filter(item_id__in=Item.objects.filter(user=user).values('item_id')[:1]).update(thumbnail='item_images/thumbs/a.jpg')
+        Item.objects.filter(item_id__in=Item.objects.filter(user=user).values('item_id')[3:5]).update(category=None)
+        request = APIRequestFactory().get('/')
+        renderer = JSONRenderer()
+
+        for model, serializer_class, fast in (
+            (Item, ItemSerializer, ITEM_LIST_SERIALIZER),
+            (Customer, CustomerSerializer, CUSTOMER_LIST_SERIALIZER),
+            (Vendor, VendorSerializer, VENDOR_LIST_SERIALIZER),
+        ):
+            queryset = model.objects.filter(user=user).order_by('pk')
+            # Relative URLs as the list views return them, and absolute ones when a request is given
+            for context in ({}, {'request': request}):
+                expected = renderer.render(serializer_class(queryset, many=True, context=context).data)
+                actual = renderer.render(fast.serialize(fast.values(queryset), context.get('request')))
+                self.assertEqual(actual, expected)
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        self.owner = CustomUser.objects.create_user(email='ledger-a@example.com', password='secret-pass-1', name='A')
+        self.other = CustomUser.objects.create_user(email='ledger-b@example.com', password='secret-pass-1', name='B')
+
+    def create_item(self, user, quantity):
+        item = Item.objects.create(name='Widget', description='d', selling_price=2, purchase_price=1, quantity=quantity, user=user)
+        record_movements(user, {item.item_id: quantity}, 'OPENING')
+        return item
+
+    def test_stock_at_replays_from_the_latest_snapshot(self):
+        item = self.create_item(self.owner, 10)
+        record_movements(self.owner, {item.item_id: -3}, 'SALE')
+        take_snapshots()
+        record_movements(self.owner, {item.item_id: 5}, 'PURCHASE')
+        self.assertEqual(StockSnapshot.objects.get(item_id=item.item_id).quantity, 7)
+        self.assertEqual(stock_at(item.item_id), 12)
+
+        # Before anything was recorded
+        self.assertEqual(stock_at(item.item_id, timezone.now() - timedelta(days=1)), 0)
+
+    def test_global_snapshot_after_a_scoped_one(self):
+        # The other user's movement comes first, below the scoped snapshot's cutoff
+        other_item = self.create_item(self.other, 8)
+        owner_item = self.create_item(self.owner, 4)
+        take_snapshots(self.owner.id)
+        record_movements(self.owner, {owner_item.item_id: 1}, 'PURCHASE')
+        take_snapshots()
+
+        # The other user's item had no snapshot yet, so its whole history is replayed
+        self.assertEqual(StockSnapshot.objects.filter(item_id=other_item.item_id).get().quantity, 8)
+        self.assertEqual(StockSnapshot.objects.filter(item_id=owner_item.item_id).latest('snapshot_id').quantity, 5)
+        self.assertEqual(stock_at(other_item.item_id), 8)
+        self.assertEqual(stock_at(owner_item.item_id), 5)
+
+    def first_write(self, queries, table):
+        return next(index for index, query in enumerate(queries)
+                    if query['sql'].startswith(('INSERT', 'UPDATE')) and f'"{table}"' in query['sql'])
+
+    def assertLockedBeforeInsert(self, captured, label):
+        queries = captured.captured_queries
+        self.assertLess(self.first_write(queries, 'api_collectionversion'), self.first_write(queries, 'api_stockmovement'), label)
+
+    def test_snapshot_cutoff_is_read_under_the_items_lock(self):
+        # On Postgres a lower movement id can commit after a higher one. Writers hold the user's items version
+        # row from before inserting movements until commit, and the snapshot reads its cutoff under that lock
+        owner_item = self.create_item(self.owner, 4)
+        self.create_item(self.other, 2)
+        CollectionVersion.objects.filter(user=self.other).delete()
+        version = get_version(self.owner.id, 'items')
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(take_snapshots(), 2)
+        queries = captured.captured_queries
+        for user in (self.owner, self.other):
+            for_user = [(index, query['sql']) for index, query in enumerate(queries) if re.search(rf'= {user.id}\b', query['sql'])]
+            lock = next(index for index, sql in for_user if '"api_collectionversion"' in sql)
+            cutoff = next(index for index, sql in for_user if 'MAX("api_stockmovement"."movement_id")' in sql)
+            self.assertLess(lock, cutoff)
+        # Taking the lock leaves ETags alone
+        self.assertEqual(get_version(self.owner.id, 'items'), version)
+        self.assertEqual(get_version(self.other.id, 'items'), 0)
+        self.assertEqual(stock_at(owner_item.item_id), 4)
+
+    def test_movement_writers_lock_before_inserting(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        item = self.create_item(self.owner, 5)
+        requests = [
+            lambda: client.post('/token/items/', {
+                'name': 'Desk', 'description': 'd', 'selling_price': '9.00', 'purchase_price': '4.00', 'quantity': 2,
+            }, format='json'),
+            lambda: client.put('/token/items/', {'item_id': item.item_id, 'quantity': 9}, format='json'),
+            lambda: client.post('/token/saleorders/', {
+                'customer_name': 'Buyer', 'mode_of_delivery': 'PICKUP', 'carrier': 'UPS', 'total_amount': '2.00',
+                'items': [{'item_id': item.item_id, 'quantity': 1, 'rate': '2.00'}],
+            }, format='json'),
+            lambda: client.post('/token/purchaseorders/', {
+                'vendor_name': 'Supplier', 'total_amount': '2.00',
+                'items': [{'item_id': item.item_id, 'quantity': 1, 'rate': '2.00'}],
+            }, format='json'),
+            lambda: client.post('/token/import/items/', {'file': SimpleUploadedFile(
+                'items.csv', b'name,description,selling_price,purchase_price,quantity\nRug,d,3,1,4\nWidget,d,2,1,1\n',
+            )}),
+        ]
+        for index, request in enumerate(requests):
+            with CaptureQueriesContext(connection) as captured:
+                response = request()
+            self.assertLess(response.status_code, 300, response.content)
+            self.assertLockedBeforeInsert(captured, index)
+
+        with CaptureQueriesContext(connection) as captured:
+            seed_tenant(self.owner, items=2, seed=10)
+        self.assertLockedBeforeInsert(captured, 'seed')
+
+    def test_stock_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        empty_item = self.create_item(self.owner, 0)
+        self.assertFalse(StockMovement.objects.filter(item_id=empty_item.item_id).exists())
+
+        response = client.get(f'/token/items/{empty_item.item_id}/stock/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['quantity'], 0)
+
+        other_item = self.create_item(self.other, 3)
+        self.assertEqual(client.get(f'/token/items/{other_item.item_id}/stock/').status_code, 404)
+        self.assertEqual(client.get(f'/token/items/{empty_item.item_id}/stock/?at=nonsense').status_code, 400)
+
+
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.user = CustomUser.objects.create_user(email='thumbs@example.com', password='secret-pass-1', name='Thumbs')
+
+    def create_item(self, filename, image_format, color):
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 800), color).save(buffer, image_format)
+        item = Item(name=filename, description='d', selling_price=2, purchase_price=1, user=self.user)
+        item.image.save(filename, ContentFile(buffer.getvalue()), save=False)
+        item.save()
+        return item
+
+    def test_job_renders_thumbnail(self):
+        item = self.create_item('phone.png', 'PNG', 'red')
+        self.assertFalse(item.thumbnail)
+        self.assertEqual(run_pending_jobs(), 1)
+
+        item.refresh_from_db()
+        self.assertEqual(item.thumbnail.name, thumbnail_name(item.image.name))
+        with item.thumbnail.open('rb') as thumbnail_file, Image.open(thumbnail_file) as thumbnail:
+            self.assertEqual(max(thumbnail.size), THUMBNAIL_SIZE)
+
+        # Already up to date, so saving again queues nothing
+        item.save()
+        self.assertEqual(run_pending_jobs(), 0)
+
+    def test_only_new_uploads_are_queued(self):
+        item = self.create_item('phone.png', 'PNG', 'red')
+        # Saves that leave the image alone, before the job has run, add no more jobs, whether the item is
+        # loaded again or saved twice
+        item.save()
+        stored = Item.objects.get(pk=item.pk)
+        stored.quantity = 9
+        stored.save()
+        self.assertEqual(BackgroundJob.objects.filter(name='process_thumbnail').count(), 1)
+
+        stored.image.save('phone.jpg', ContentFile(stored.image.read()))
+        self.assertEqual(BackgroundJob.objects.filter(name='process_thumbnail').count(), 2)
+
+    def test_replaced_or_cleared_image_drops_its_thumbnail(self):
+        item = self.create_item('phone.png', 'PNG', 'red')
+        run_pending_jobs()
+        item.refresh_from_db()
+        first = item.thumbnail.name
+
+        buffer = BytesIO()
+        Image.new('RGB', (600, 600), 'green').save(buffer, 'JPEG')
+        item.image.save('phone.jpg', ContentFile(buffer.getvalue()))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(run_pending_jobs(), 1)
+        item.refresh_from_db()
+        second = item.thumbnail.name
+        self.assertNotEqual(first, second)
+        self.assertFalse(item.thumbnail.storage.exists(first))
+        self.assertTrue(item.thumbnail.storage.exists(second))
+
+        item.image = None
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        item.refresh_from_db()
+        self.assertFalse(item.thumbnail)
+        self.assertFalse(item.image.storage.exists(second))
+
+    def test_same_stem_different_extension(self):
+        png_item = self.create_item('phone.png', 'PNG', 'red')
+        jpg_item = self.create_item('phone.jpg', 'JPEG', 'blue')
+        self.assertEqual(run_pending_jobs(), 2)
+
+        png_item.refresh_from_db()
+        jpg_item.refresh_from_db()
+        self.assertNotEqual(png_item.thumbnail.name, jpg_item.thumbnail.name)
+        for item, color in ((png_item, (255, 0, 0)), (jpg_item, (0, 0, 255))):
+            with item.thumbnail.open('rb') as thumbnail_file, Image.open(thumbnail_file) as thumbnail:
+                pixel = thumbnail.convert('RGB').getpixel((10, 10))
+            self.assertTrue(all(abs(a - b) < 16 for a, b in zip(pixel, color)), (item.image.name, pixel))
+
+
+@override_settings(REPLICA_DATABASES=['replica_0'], REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+
+    def request(self, read_only, user_id=1):
+        begin_request(read_only)
+        self.addCleanup(end_request)
+        set_request_user(user_id)
+
+    def test_reads_of_safe_requests_use_the_replica(self):
+        self.request(read_only=True)
+        self.assertEqual(self.router.db_for_read(Item), 'replica_0')
+        self.assertEqual(self.router.db_for_write(Item), 'default')
+        # Once the request has written, it reads its own writes from the primary
+        self.assertEqual(self.router.db_for_read(Item), 'default')
+
+    def test_unsafe_requests_and_code_outside_requests_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Item), 'default')
+        self.request(read_only=False)
+        self.assertEqual(self.router.db_for_read(Item), 'default')
+        self.assertEqual(self.router.db_for_write(Item), 'default')
+
+    def test_writer_is_pinned_until_the_pin_expires(self):
+        self.request(read_only=False)
+        self.router.db_for_write(Item)
+        end_request()
+        self.assertTrue(cache.get(pin_key(1)))
+
+        self.request(read_only=True)
+        self.assertEqual(self.router.db_for_read(Item), 'default')
+        end_request()
+        # Other users are not affected
+        self.request(read_only=True, user_id=2)
+        self.assertEqual(self.router.db_for_read(Item), 'replica_0')
+        end_request()
+
+        later = timezone.now().timestamp() + 10
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.request(read_only=True)
+            self.assertEqual(self.router.db_for_read(Item), 'replica_0')
+
+    def test_replicas_need_a_shared_cache(self):
+        self.assertEqual([error.id for error in check_replica_pin_cache(None)], ['api.E001'])
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with self.settings(CACHES=shared):
+            self.assertEqual(check_replica_pin_cache(None), [])
+        with self.settings(REPLICA_DATABASES=[]):
+            self.assertEqual(check_replica_pin_cache(None), [])
+
+
+class DatabaseProfileTests(SimpleTestCase):
+    def load_settings(self, **environ):
+        # settings.py as it would be loaded with this environment
+        with mock.patch.dict(os.environ, environ):
+            for name in ('DATABASE_ENGINE', 'DATABASE_POOL', 'DATABASE_NAME', 'DATABASE_REPLICA_HOSTS', 'DATABASE_REPLICA_NAMES'):
+                if name not in environ:
+                    os.environ.pop(name, None)
+            return runpy.run_path(settings_module.__file__)
+
+    def connection_to(self, alias, settings_dict):
+        # An alias of its own, so the test runner's guards on the real connections don't apply
+        return ConnectionHandler({'default': settings_dict, alias: settings_dict})[alias]
+
+    def test_sqlite_file_database_gets_the_pragmas(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        profile = self.load_settings(DATABASE_NAME=os.path.join(directory, 'db.sqlite3'))
+        self.assertEqual(profile['REPLICA_DATABASES'], [])
+        database = self.connection_to('profile', profile['DATABASES']['default'])
+        self.addCleanup(database.close)
+        with database.cursor() as cursor:
+            pragmas = {}
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size'):
+                cursor.execute(f'PRAGMA {pragma}')
+                pragmas[pragma] = cursor.fetchone()[0]
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'mmap_size': 268435456})
+
+    def test_postgres_profiles(self):
+        profile = self.load_settings(DATABASE_ENGINE='postgres', DATABASE_REPLICA_HOSTS='replica-a,replica-b')
+        default = profile['DATABASES']['default']
+        self.assertEqual((default['ENGINE'], default['CONN_MAX_AGE'], default['OPTIONS']), ('django.db.backends.postgresql', 60, {}))
+        self.assertEqual(profile['REPLICA_DATABASES'], ['replica_0', 'replica_1'])
+        self.assertEqual(profile['DATABASES']['replica_1']['HOST'], 'replica-b')
+
+        profile = self.load_settings(DATABASE_ENGINE='postgres', DATABASE_POOL='pgbouncer')
+        self.assertTrue(profile['DATABASES']['default']['DISABLE_SERVER_SIDE_CURSORS'])
+
+        # The pool is created without connecting, which needs psycopg 3 and psycopg_pool
+        profile = self.load_settings(DATABASE_ENGINE='postgres', DATABASE_POOL='psycopg')
+        database = self.connection_to('pooled', profile['DATABASES']['default'])
+        self.assertEqual(database.settings_dict['CONN_MAX_AGE'], 0)
+        self.assertEqual((database.pool.min_size, database.pool.max_size), (2, 10))
+        database.close_pool()
+
+
+@override_settings(AUTH_USER_CACHE_SECONDS=60)
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='auth@example.com', password='secret-pass-1', name='Auth')
+        Company.objects.create(user=self.user, company_name='Before')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_warm_requests_need_no_user_query(self):
+        self.assertEqual(self.client.get('/company/').status_code, 200)
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get('/company/').json()['company_name'], 'Before')
+        self.assertEqual(len(captured), 0)
+
+    def test_saves_invalidate_after_commit(self):
+        get_cached_user(CustomUser, self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.user.company.company_name = 'After'
+                self.user.company.save()
+                # A concurrent request caching the row as it was before the commit
+                get_cached_user(CustomUser, self.user.id)
+            self.assertIsNotNone(cache.get(user_cache_key(self.user.id)))
+        self.assertIsNone(cache.get(user_cache_key(self.user.id)))
+        self.assertEqual(self.client.get('/company/').json()['company_name'], 'After')
+
+    def test_inactive_and_deleted_users_are_rejected(self):
+        self.assertEqual(self.client.get('/company/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/company/').status_code, 401)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        response = self.client.get('/company/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'user_not_found')
+
+    @override_settings(AUTH_USER_CACHE_SECONDS=0)
+    def test_cache_can_be_turned_off(self):
+        get_cached_user(CustomUser, self.user.id)
+        self.assertIsNone(cache.get(user_cache_key(self.user.id)))
+
+
+class DeltaSyncTests(AuthenticatedAPITestCase):
+    user_name = 'Sync'
+
+    def create_item(self, name):
+        return Item.objects.create(name=name, description='d', selling_price=2, purchase_price=1, user=self.user)
+
+    def sync(self, since=0):
+        response = self.client.get('/token/sync/items/', {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changes_since_cursor(self):
+        first, second = self.create_item('First'), self.create_item('Second')
+        changes = self.sync()
+        self.assertEqual([row['item_id'] for row in changes['updated']], [first.item_id, second.item_id])
+        self.assertEqual(changes['deleted'], [])
+        self.assertFalse(changes['has_more'])
+
+        # Nothing new past the cursor, then only what changed after it
+        cursor = changes['cursor']
+        self.assertEqual(self.sync(cursor)['updated'], [])
+        first.name = 'Renamed'
+        first.save()
+        second_id = second.item_id
+        second.delete()
+        changes = self.sync(cursor)
+        self.assertEqual([row['name'] for row in changes['updated']], ['Renamed'])
+        self.assertEqual(changes['deleted'], [second_id])
+
+        # Changes of other users never show up
+        other = CustomUser.objects.create_user(email='sync-other@example.com', password='secret-pass-1', name='Other')
+        Item.objects.create(name='Theirs', description='d', selling_price=2, purchase_price=1, user=other)
+        self.assertEqual(self.sync(changes['cursor'])['updated'], [])
+
+    def test_pages_and_bad_requests(self):
+        for index in range(3):
+            self.create_item(f'Item {index}')
+        page = changes_since(self.user, 'items', 0, limit=2)
+        self.assertTrue(page['has_more'])
+        self.assertEqual(len(page['updated']), 2)
+        page = changes_since(self.user, 'items', page['cursor'], limit=2)
+        self.assertFalse(page['has_more'])
+        self.assertEqual(len(page['updated']), 1)
+
+        self.assertEqual(self.client.get('/token/sync/items/', {'since': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/token/sync/unknown/').status_code, 404)
+
+    def test_compaction_keeps_answers_the_same(self):
+        kept, removed = self.create_item('Kept'), self.create_item('Removed')
+        cursor = self.sync()['cursor']
+        for name in ('A', 'B', 'C'):
+            kept.name = name
+            kept.save()
+        removed.delete()
+        before = [self.sync(since) for since in (0, cursor)]
+
+        self.assertEqual(compact_change_log(), 4)
+        self.assertEqual(ChangeLogEntry.objects.filter(user=self.user).count(), 2)
+        after = [self.sync(since) for since in (0, cursor)]
+        for old, new in zip(before, after):
+            self.assertEqual((old['updated'], old['deleted'], old['cursor']), (new['updated'], new['deleted'], new['cursor']))
+
+
+class CsvImportTests(AuthenticatedAPITestCase):
+    user_name = 'Import'
+
+    def upload(self, collection, text):
+        response = self.client.post(
+            f'/token/import/{collection}/', {'file': SimpleUploadedFile('rows.csv', text.encode())}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_rows_are_validated_and_reported(self):
+        Category.objects.create(name='Tools', user=self.user)
+        report = self.upload('items', (
+            'name,category,description,selling_price,purchase_price,quantity\n'
+            'Hammer,Tools,Steel,10.50,6,4\n'
+            'Hammer,Tools,Again,11,6,4\n'
+            'Saw,,Sharp,abc,6,1\n'
+            ',,No name,1,1,1\n'
+            'Drill,Garden,Unknown category,1,1,1\n'
+            'Level,,Missing prices,,,\n'
+        ))
+        self.assertEqual((report['created'], report['updated'], report['error_count']), (1, 0, 5))
+        errors = {error['row']: error['errors'] for error in report['errors']}
+        self.assertEqual(sorted(errors), [3, 4, 5, 6, 7])
+        self.assertEqual(errors[3], {'name': ['Duplicate of row 2.']})
+        self.assertIn('selling_price', errors[4])
+        self.assertEqual(errors[5], {'name': ['This field is required.']})
+        self.assertEqual(errors[6], {'category': ["Unknown category 'Garden'."]})
+        self.assertEqual(set(errors[7]), {'selling_price', 'purchase_price'})
+
+        hammer = Item.objects.get(user=self.user, name='Hammer')
+        self.assertEqual((hammer.category.name, hammer.selling_price, hammer.quantity), ('Tools', Decimal('10.50'), 4))
+        self.assertEqual(stock_at(hammer.item_id), 4)
+
+    def test_reimport_updates_existing_rows(self):
+        self.upload('items', 'name,description,selling_price,purchase_price,quantity,reorder_point\nHammer,Steel,10,6,4,2\n')
+        hammer = Item.objects.get(user=self.user, name='Hammer')
+        rebuild_summary(self.user.id)
+
+        # Blank cells keep the current value
+        report = self.upload('items', 'name,description,selling_price,purchase_price,quantity\nHammer,,12.25,,9\nSaw,Sharp,5,3,1\n')
+        self.assertEqual((report['created'], report['updated'], report['error_count']), (1, 1, 0))
+        hammer.refresh_from_db()
+        self.assertEqual((hammer.description, hammer.selling_price, hammer.purchase_price, hammer.quantity, hammer.reorder_point),
+                         ('Steel', Decimal('12.25'), Decimal('6.00'), 9, 2))
+        self.assertEqual(
+            list(StockMovement.objects.filter(item_id=hammer.item_id).order_by('movement_id').values_list('reason', 'quantity_change')),
+            [('OPENING', 4), ('ADJUSTMENT', 5)],
+        )
+        # The incrementally maintained stock counts agree with a rebuild
+        stock_fields = ('total_stock', 'item_count', 'low_stock_count', 'out_of_stock_count')
+        summary = DashboardSummary.objects.values(*stock_fields).get(user=self.user)
+        rebuild_summary(self.user.id)
+        self.assertEqual(summary, DashboardSummary.objects.values(*stock_fields).get(user=self.user))
+        self.assertEqual(summary, {'total_stock': 10, 'item_count': 2, 'low_stock_count': 0, 'out_of_stock_count': 0})
+
+    def test_customers_owned_by_another_user(self):
+        other = CustomUser.objects.create_user(email='import-other@example.com', password='secret-pass-1', name='Other')
+        Customer.objects.create(name='Taken', email='taken@example.com', phone_number='1', address='a', state='s',
+                                city='c', pincode='123456', user=other)
+        report = self.upload('customers', (
+            'name,email,phone_number,address,state,city,pincode\n'
+            'Taken,taken@example.com,1,a,s,c,123456\n'
+            'New,new@example.com,1,a,s,c,123456\n'
+            'Bad,not-an-email,1,a,s,c,123456\n'
+        ))
+        self.assertEqual((report['created'], report['error_count']), (1, 2))
+        self.assertEqual(report['errors'][0], {'row': 2, 'errors': {'email': ['Customer with this email already exists.']}})
+        self.assertEqual(Customer.objects.get(email='taken@example.com').user, other)
+
+    def test_error_report_is_capped_but_counted(self):
+        with mock.patch('api.imports.MAX_REPORTED_ERRORS', 2):
+            report = self.upload('vendors', 'name,email\n' + ''.join(f'Vendor {index},bad\n' for index in range(5)))
+        self.assertEqual(report['error_count'], 5)
+        self.assertEqual(len(report['errors']), 2)
+
+    def test_file_malformed_partway_is_a_partial_import(self):
+        rows = 'name,email,phone_number,address\n' + ''.join(f'Vendor {index},v{index}@example.com,1,a\n' for index in range(3))
+        text = f'{rows}Huge,{"x" * (csv.field_size_limit() + 1)},1,a\nAfter,after@example.com,1,a\n'
+        with mock.patch('api.imports.IMPORT_BATCH_SIZE', 2):
+            report = self.upload('vendors', text)
+        # The batches read before the bad line are kept and counted, the rest of the file is not imported
+        self.assertEqual((report['created'], report['error_count']), (3, 0))
+        self.assertEqual(report['stopped']['row'], 5)
+        self.assertIn('field larger than field limit', report['stopped']['error'])
+        self.assertEqual(Vendor.objects.filter(user=self.user).count(), 3)
+        self.assertIsNone(self.upload('vendors', rows)['stopped'])
+
+    def test_missing_key_column_and_unknown_collection(self):
+        response = self.client.post('/token/import/items/', {'file': SimpleUploadedFile('rows.csv', b'description\nx\n')}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/token/import/orders/', {'file': SimpleUploadedFile('rows.csv', b'name\nx\n')}, format='multipart')
+        self.assertEqual(response.status_code, 404)
+
+    def test_update_rows_prepares_values_like_save(self):
+        item = Item.objects.create(name='Hammer', description='d', selling_price=1, purchase_price=1, user=self.user)
+        item.selling_price = Decimal('19.99')
+        item.created_at = timezone.now() - timedelta(days=3)
+        update_rows(Item, [item], ['selling_price', 'created_at'])
+        stored = Item.objects.get(pk=item.pk)
+        self.assertEqual((stored.selling_price, stored.created_at), (Decimal('19.99'), item.created_at))
+
+
+class ItemSearchTests(AuthenticatedAPITestCase):
+    user_name = 'Search'
+
+    def create_item(self, name, brand='None', description='', user=None):
+        return Item.objects.create(
+            name=name, brand=brand, description=description, selling_price=2, purchase_price=1, user=user or self.user
+        )
+
+    def search(self, query, **params):
+        response = self.client.get('/token/items/search/', {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def names(self, query):
+        return [item['name'] for item in self.search(query)['results']]
+
+    def test_prefix_match_and_ranking(self):
+        self.create_item('Cordless Drill', brand='Acme')
+        self.create_item('Hammer', description='Pairs well with a drill')
+        self.create_item('Drill Bits', brand='Globex')
+        self.create_item('Saw')
+        other = CustomUser.objects.create_user(email='search-other@example.com', password='secret-pass-1', name='Other')
+        self.create_item('Drill', user=other)
+
+        # Name hits rank above description hits; other users' items never show up
+        self.assertEqual(self.names('dri'), ['Cordless Drill', 'Drill Bits', 'Hammer'])
+        self.assertEqual(self.names('drill acme'), ['Cordless Drill'])
+        self.assertEqual(self.names('glob'), ['Drill Bits'])
+        self.assertEqual(self.names('!!'), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        item = self.create_item('Kettle')
+        item.name = 'Teapot'
+        item.save()
+        self.assertEqual(self.names('kettle'), [])
+        self.assertEqual(self.names('teap'), ['Teapot'])
+
+        # Bulk writes bypass signals but not the triggers
+        Item.objects.filter(pk=item.pk).update(brand='Wonka')
+        self.assertEqual(self.names('wonka'), ['Teapot'])
+        item.delete()
+        self.assertEqual(self.names('teap'), [])
+
+    def test_pages(self):
+        for index in range(5):
+            self.create_item(f'Lamp {index}')
+        first = self.search('lamp', page_size=2)
+        self.assertEqual(len(first['results']), 2)
+        self.assertIsNone(first['previous'])
+        last = self.search('lamp', page_size=2, page=3)
+        self.assertEqual(len(last['results']), 1)
+        self.assertIsNone(last['next'])
+        self.assertIsNotNone(last['previous'])
+        self.assertEqual(self.client.get('/token/items/search/', {'q': 'lamp', 'page': 'x'}).status_code, 400)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Only SQLite drops triggers when a table is remade')
+class SearchTriggerRestoreTests(TransactionTestCase):
+    def test_triggers_restored_after_table_remake(self):
+        user = CustomUser.objects.create_user(email='remake@example.com', password='secret-pass-1', name='Remake')
+        item = Item.objects.create(name='Kettle', description='d', selling_price=2, purchase_price=1, user=user)
+
+        # What an AlterField on api_item does under SQLite
+        with connection.schema_editor() as editor:
+            editor._remake_table(Item)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'api_item'")
+            self.assertEqual(cursor.fetchall(), [])
+
+        Item.objects.filter(pk=item.pk).update(name='Teapot')
+        # As run after every migrate
+        post_migrate.send(
+            sender=django_apps.get_app_config('api'), app_config=django_apps.get_app_config('api'), verbosity=0,
+            interactive=False, using='default', apps=django_apps, plan=[],
+        )
+        self.assertFalse(ensure_sqlite_triggers(connection))
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'api_item'")
+            self.assertEqual(sorted(name for name, in cursor.fetchall()), sorted(SQLITE_TRIGGERS_SQL))
+
+        # The rebuild picked up the rename made while the triggers were missing, and upkeep works again
+        self.assertEqual(search_item_ids(user, 'teapot', 10), [item.pk])
+        Item.objects.filter(pk=item.pk).update(name='Samovar')
+        self.assertEqual(search_item_ids(user, 'teapot', 10), [])
+        self.assertEqual(search_item_ids(user, 'samovar', 10), [item.pk])
+
+
+class ListFilterTests(AuthenticatedAPITestCase):
+    user_name = 'Filters'
+
+    def get(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def walk_pages(self, path, key, **params):
+        # Follows next links until the end, returning the keys of every row
+        seen, url = [], f'{path}?' + '&'.join(f'{name}={value}' for name, value in params.items())
+        while url:
+            page = self.get(url)
+            seen += [row[key] for row in page['results']]
+            url = page['next']
+        return seen
+
+    def test_item_filters(self):
+        tools = Category.objects.create(name='Tools', user=self.user)
+        for name, brand, category, quantity, reorder_point in (
+            ('Hammer', 'Acme', tools, 10, 2),
+            ('Hacksaw', 'Globex', tools, 1, 5),
+            ('Kettle', 'Acme', None, 0, 0),
+        ):
+            Item.objects.create(name=name, brand=brand, category=category, quantity=quantity, reorder_point=reorder_point,
+                                description='d', selling_price=2, purchase_price=1, user=self.user)
+
+        def names(**params):
+            return sorted(item['name'] for item in self.get('/token/items/', **params))
+
+        self.assertEqual(names(category=tools.id), ['Hacksaw', 'Hammer'])
+        self.assertEqual(names(brand='Acme'), ['Hammer', 'Kettle'])
+        self.assertEqual(names(name='ha'), ['Hacksaw', 'Hammer'])
+        self.assertEqual(names(low_stock='true'), ['Hacksaw', 'Kettle'])
+        self.assertEqual(names(brand='Acme', low_stock='1'), ['Kettle'])
+        for bad in ('abc', '-1', '0', '1.5'):
+            response = self.client.get('/token/items/', {'category': bad})
+            self.assertEqual(response.status_code, 400, bad)
+
+    def test_item_pages(self):
+        item_ids = [
+            Item.objects.create(name=f'Item {index}', description='d', selling_price=2, purchase_price=1, user=self.user).item_id
+            for index in range(7)
+        ]
+        # Without pagination parameters the plain list is unchanged
+        self.assertEqual([item['item_id'] for item in self.get('/token/items/')], item_ids)
+        self.assertEqual(self.walk_pages('/token/items/', 'item_id', page_size=3), item_ids)
+        self.assertEqual(self.walk_pages('/token/items/', 'item_id', page_size=3, name='Item'), item_ids)
+        self.assertEqual(self.client.get('/token/items/', {'cursor': 'garbage'}).status_code, 404)
+
+    def test_shipment_filters_and_pages(self):
+        now = timezone.now()
+        for status_, carrier, days_ago in (
+            ('IN_TRANSIT', 'UPS', 0), ('DELIVERED', 'UPS', 3), ('DELIVERED', 'FedEx', 10), ('IN_TRANSIT', 'FedEx', 40),
+        ):
+            shipment = Shipment.objects.create(order_id=1, customer_name='C', carrier=carrier, status=status_, user=self.user)
+            Shipment.objects.filter(pk=shipment.pk).update(date=now - timedelta(days=days_ago))
+
+        def count(**params):
+            return len(self.get('/token/shipments/', **params))
+
+        self.assertEqual(count(status='IN_TRANSIT'), 2)
+        self.assertEqual(count(carrier='FedEx', status='DELIVERED'), 1)
+        self.assertEqual(count(date_from=(now - timedelta(days=5)).date().isoformat()), 2)
+        self.assertEqual(count(date_to=(now - timedelta(days=5)).date().isoformat()), 2)
+        self.assertEqual(self.client.get('/token/shipments/', {'date_from': 'yesterday'}).status_code, 400)
+
+        shipment_ids = list(Shipment.objects.filter(user=self.user).order_by('-shipment_id').values_list('shipment_id', flat=True))
+        self.assertEqual(self.walk_pages('/token/shipments/', 'shipment_id', page_size=3), shipment_ids)
+
+
+class DashboardSummaryTests(AuthenticatedAPITestCase):
+    user_name = 'Summary'
+
+    FIELDS = [
+        'total_revenue', 'total_orders', 'pending_shipments', 'new_customers', 'total_stock', 'item_count',
+        'low_stock_count', 'out_of_stock_count',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        seed_tenant(self.user, items=6, customers=3, vendors=2, sale_orders=5, purchase_orders=3, seed=6)
+        self.assertEqual(self.client.get('/token/dashboard/').status_code, 200)
+
+    def assertMatchesRebuild(self, step):
+        # The incrementally maintained row must equal a recompute from scratch
+        kept = DashboardSummary.objects.filter(user=self.user).values(*self.FIELDS).get()
+        kept_sold = dict(Item.objects.filter(user=self.user).values_list('item_id', 'units_sold'))
+        rebuild_summary(self.user.id)
+        rebuilt = DashboardSummary.objects.filter(user=self.user).values(*self.FIELDS).get()
+        self.assertEqual(kept, rebuilt, step)
+        self.assertEqual(kept_sold, dict(Item.objects.filter(user=self.user).values_list('item_id', 'units_sold')), step)
+
+    def post(self, path, data):
+        response = self.client.post(path, data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def test_summary_row_is_locked_after_the_collection_versions(self):
+        # One lock order for every write (see rebuild_summary), so concurrent writes can't deadlock on Postgres
+        item = Item.objects.filter(user=self.user).first()
+        requests = [
+            ('put', '/token/items/', {'item_id': item.item_id, 'quantity': 7}, 'json'),
+            ('post', '/token/saleorders/', {
+                'customer_name': 'Buyer', 'mode_of_delivery': 'PICKUP', 'carrier': 'UPS', 'total_amount': '10.00',
+                'items': [{'item_id': item.item_id, 'quantity': 1, 'rate': '10.00'}],
+            }, 'json'),
+            ('post', '/token/purchaseorders/', {
+                'vendor_name': 'Supplier', 'total_amount': '10.00',
+                'items': [{'item_id': item.item_id, 'quantity': 1, 'rate': '10.00'}],
+            }, 'json'),
+            ('post', '/token/import/items/', {'file': SimpleUploadedFile('rows.csv', f'name,quantity\n{item.name},3\n'.encode())}, 'multipart'),
+        ]
+        for method, path, body, body_format in requests:
+            with CaptureQueriesContext(connection) as captured:
+                response = getattr(self.client, method)(path, body, format=body_format)
+            self.assertLess(response.status_code, 300, response.content)
+            writes = [query['sql'] for query in captured if not query['sql'].startswith('SELECT')]
+            versions = [index for index, sql in enumerate(writes) if 'api_collectionversion' in sql]
+            summary = [index for index, sql in enumerate(writes) if 'api_dashboardsummary' in sql]
+            self.assertTrue(versions and summary, path)
+            self.assertLess(max(versions), min(summary), path)
+
+    def test_incremental_updates_match_rebuild(self):
+        item = self.post('/token/items/', {
+            'name': 'Lamp', 'description': 'd', 'selling_price': '30.00', 'purchase_price': '10.00', 'quantity': 4,
+            'reorder_point': 2,
+        })
+        self.assertMatchesRebuild('item create')
+
+        for change in ({'quantity': 1}, {'reorder_point': 0}, {'quantity': 0}):
+            response = self.client.put('/token/items/', {'item_id': item['item_id'], **change}, format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertMatchesRebuild(f'item update {change}')
+
+        self.post('/customers/', {
+            'name': 'New', 'email': 'summary-customer@example.com', 'phone_number': '1', 'address': 'a', 'state': 's',
+            'city': 'c', 'pincode': '123456',
+        })
+        self.assertMatchesRebuild('customer create')
+
+        self.post('/token/purchaseorders/', {
+            'vendor_name': 'Supplier', 'total_amount': '50.00',
+            'items': [{'item_id': item['item_id'], 'quantity': 5, 'rate': '10.00'}],
+        })
+        self.assertMatchesRebuild('purchase order')
+
+        sale_order = self.post('/token/saleorders/', {
+            'customer_name': 'Buyer', 'mode_of_delivery': 'DELIVERY', 'carrier': 'UPS', 'total_amount': '90.00',
+            'items': [{'item_id': item['item_id'], 'quantity': 3, 'rate': '30.00'}],
+        })
+        self.assertMatchesRebuild('sale order')
+
+        shipment = Shipment.objects.get(user=self.user, order_id=sale_order['sale_order_id'])
+        response = self.client.put(f'/token/shipments/{shipment.shipment_id}/', {'status': 'DELIVERED'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertMatchesRebuild('shipment delivered')
+
+        shipment.refresh_from_db()
+        shipment.delete()
+        Shipment.objects.create(order_id=0, customer_name='C', carrier='UPS', user=self.user).delete()
+        Customer.objects.filter(user=self.user).order_by('-customer_id').first().delete()
+        self.assertMatchesRebuild('shipment and customer delete')
+
+        self.assertEqual(self.client.delete(f'/token/items/delete/{item["item_id"]}/').status_code, 204)
+        self.assertMatchesRebuild('item delete')
+
+        # Deleting an order takes back its revenue and its items' units sold
+        order = SaleOrder.objects.filter(user=self.user, items__isnull=False).first()
+        sold_before = dict(Item.objects.filter(user=self.user).values_list('item_id', 'units_sold'))
+        lines = Counter()
+        for item_id, quantity in order.items.values_list('item_id', 'quantity'):
+            lines[item_id] += quantity
+        self.assertTrue(lines)
+        order.delete()
+        self.assertEqual(
+            dict(Item.objects.filter(user=self.user).values_list('item_id', 'units_sold')),
+            {item_id: sold - lines[item_id] for item_id, sold in sold_before.items()},
+        )
+        self.assertMatchesRebuild('sale order delete')
+
+
+@override_settings(REPLICA_DATABASES=['replica_0'])
+class DashboardSummaryReplicaTests(TransactionTestCase):
+    # A second connection to the test database, standing in for the mirrors settings.py adds for replicas.
+    # Registered after the runner's checks and the test case's database guards have run
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        default = connections['default'].settings_dict
+        connections.settings['replica_0'] = {**default, 'TEST': {**default['TEST'], 'MIRROR': 'default'}}
+        cls.databases = cls.databases | {'replica_0'}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica_0'].close()
+        del connections['replica_0']
+        del connections.settings['replica_0']
+        cls.databases = cls.databases - {'replica_0'}
+        super().tearDownClass()
+
+    def test_rebuild_in_a_read_only_request_reads_the_primary(self):
+        logging.disable(logging.INFO)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        user = CustomUser.objects.create_user(email='replica@example.com', password='secret-pass-1', name='Replica')
+        seed_tenant(user, items=6, customers=3, vendors=2, sale_orders=5, purchase_orders=3, seed=9)
+        expected = DashboardSummary.objects.filter(user=user).values(*DashboardSummaryTests.FIELDS).get()
+        DashboardSummary.objects.filter(user=user).delete()
+
+        with CaptureQueriesContext(connections['replica_0']) as replica:
+            begin_request(read_only=True)
+            try:
+                set_request_user(user.id)
+                self.assertTrue(Item.objects.filter(user=user).exists())
+                rebuild_summary(user.id)
+            finally:
+                end_request()
+        # Only the read made before the rebuild went to the replica
+        self.assertEqual(len(replica.captured_queries), 1, replica.captured_queries)
+        self.assertEqual(DashboardSummary.objects.filter(user=user).values(*DashboardSummaryTests.FIELDS).get(), expected)
+
+
+class OrderCreateTests(AuthenticatedAPITestCase):
+    user_name = 'Create'
+
+    def setUp(self):
+        super().setUp()
+        self.item = Item.objects.create(name='Chair', description='d', selling_price=20, purchase_price=8, quantity=5, user=self.user)
+        self.other = Item.objects.create(name='Table', description='d', selling_price=90, purchase_price=40, quantity=2, user=self.user)
+
+    def sell(self, *lines):
+        return self.client.post('/token/saleorders/', {
+            'customer_name': 'Buyer', 'mode_of_delivery': 'PICKUP', 'carrier': 'UPS', 'total_amount': '10.00',
+            'items': [{'item_id': item.item_id, 'quantity': quantity, 'rate': '1.00'} for item, quantity in lines],
+        }, format='json')
+
+    def assertNothingWritten(self):
+        self.assertEqual(Item.objects.get(pk=self.item.pk).quantity, 5)
+        self.assertEqual(Item.objects.get(pk=self.other.pk).quantity, 2)
+        self.assertFalse(SaleOrder.objects.filter(user=self.user).exists())
+        self.assertFalse(PurchaseOrder.objects.filter(user=self.user).exists())
+        self.assertFalse(StockMovement.objects.filter(user=self.user).exists())
+
+    def test_repeated_lines_are_checked_together(self):
+        # Each line fits the stock on its own, together they oversell
+        response = self.sell((self.item, 3), (self.other, 1), (self.item, 3))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Chair', response.json()['error'])
+        self.assertNothingWritten()
+
+        self.assertEqual(self.sell((self.item, 2), (self.item, 3)).status_code, 201)
+        self.assertEqual(Item.objects.get(pk=self.item.pk).quantity, 0)
+        self.assertEqual(Item.objects.get(pk=self.item.pk).units_sold, 5)
+        self.assertEqual(StockMovement.objects.get(user=self.user).quantity_change, -5)
+
+    def test_missing_item_writes_nothing(self):
+        stranger = CustomUser.objects.create_user(email='stranger@example.com', password='secret-pass-1', name='Stranger')
+        foreign = Item.objects.create(name='Foreign', description='d', selling_price=1, purchase_price=1, quantity=9, user=stranger)
+        self.assertEqual(self.sell((self.item, 1), (foreign, 1)).status_code, 400)
+        response = self.client.post('/token/purchaseorders/', {
+            'vendor_name': 'Supplier', 'total_amount': '10.00',
+            'items': [{'item_id': self.item.item_id, 'quantity': 1, 'rate': '1.00'},
+                      {'item_id': foreign.item_id, 'quantity': 1, 'rate': '1.00'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertNothingWritten()
+        self.assertEqual(Item.objects.get(pk=foreign.pk).quantity, 9)
+
+    def test_failure_after_stock_update_rolls_back(self):
+        # Stock is already decremented when recording the movements fails
+        with mock.patch('api.views.record_movements', side_effect=RuntimeError('ledger down')):
+            with self.assertRaises(RuntimeError):
+                self.sell((self.item, 2), (self.other, 1))
+            with self.assertRaises(RuntimeError):
+                self.client.post('/token/purchaseorders/', {
+                    'vendor_name': 'Supplier', 'total_amount': '10.00',
+                    'items': [{'item_id': self.item.item_id, 'quantity': 4, 'rate': '1.00'}],
+                }, format='json')
+        self.assertNothingWritten()
+
+
+class ConditionalGetTests(AuthenticatedAPITestCase):
+    user_name = 'ETags'
+
+    def setUp(self):
+        super().setUp()
+        seed_tenant(self.user, items=3, customers=2, vendors=2, sale_orders=2, purchase_orders=2, seed=13)
+
+    def revalidate(self, path):
+        first = self.client.get(path)
+        self.assertEqual(first.status_code, 200)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=first['ETag'])
+        return first, response, captured
+
+    def test_not_modified_until_a_write(self):
+        item = Item.objects.filter(user=self.user).first()
+        for path, table, write in (
+            ('/token/items/', 'api_item', lambda: self.client.put('/token/items/', {'item_id': item.item_id, 'quantity': 4}, format='json')),
+            ('/customers/', 'api_customer', lambda: Customer.objects.filter(user=self.user).first().save()),
+            ('/token/vendors/', 'api_vendor', lambda: Vendor.objects.filter(user=self.user).first().save()),
+            ('/token/categories/', 'api_category', lambda: Category.objects.create(name='Fresh', user=self.user)),
+            # Order lines embed item details, so an item edit changes the orders too
+            ('/token/saleorders/', 'api_saleorder', lambda: Item.objects.filter(pk=item.pk).first().save()),
+            ('/token/purchaseorders/', 'api_purchaseorder', lambda: Item.objects.filter(pk=item.pk).first().save()),
+        ):
+            first, response, captured = self.revalidate(path)
+            self.assertEqual(response.status_code, 304, path)
+            self.assertEqual(response['ETag'], first['ETag'])
+            self.assertFalse(response.content)
+            # Only the versions are read, never the rows
+            self.assertFalse([query for query in captured.captured_queries if f'"{table}"' in query['sql']], path)
+
+            write()
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 200, path)
+            self.assertNotEqual(response['ETag'], first['ETag'])
+            self.assertEqual(self.client.get(path, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304, path)
+
+    def test_etag_depends_on_query_and_user(self):
+        etag = self.client.get('/token/items/')['ETag']
+        self.assertEqual(self.client.get('/token/items/?page_size=2', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get('/token/items/', HTTP_IF_NONE_MATCH=f'"other", {etag}').status_code, 304)
+
+        other = CustomUser.objects.create_user(email='etags-b@example.com', password='secret-pass-1', name='Other')
+        client = APIClient()
+        client.force_authenticate(other)
+        self.assertEqual(client.get('/token/items/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class BackgroundJobTests(TestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media_settings = self.settings(MEDIA_ROOT=media_root.name)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        self.user = CustomUser.objects.create_user(email='jobs@example.com', password='secret-pass-1', name='Jobs')
+        Company.objects.create(user=self.user, company_name='Jobs Inc')
+        item = Item.objects.create(name='Lamp', description='d', selling_price=5, purchase_price=2, user=self.user)
+        self.sale_order = SaleOrder.objects.create(
+            customer_name='Buyer', customer_email='buyer@example.com', mode_of_delivery='PICKUP', carrier='UPS',
+            total_amount=5, user=self.user,
+        )
+        SaleOrderItem.objects.create(sale_order=self.sale_order, item_id=item.item_id, quantity=1, rate=5, user=self.user)
+
+    def make_due(self, job):
+        BackgroundJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+
+    def test_unknown_job_is_rejected(self):
+        with self.assertRaises(ValueError):
+            enqueue_job('no_such_job')
+
+    def test_invoice_job_renders_and_sends(self):
+        job = enqueue_job('process_invoice', sale_order_id=self.sale_order.sale_order_id)
+        self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.sale_order.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('DONE', 1))
+        self.assertEqual(self.sale_order.invoice_status, 'SENT')
+        self.assertEqual(mail.outbox[0].to, ['buyer@example.com'])
+        self.assertEqual(mail.outbox[0].attachments[0][2], 'application/pdf')
+        self.assertEqual(run_pending_jobs(), 0)
+
+    def test_retry_backs_off_and_reuses_the_pdf(self):
+        job = enqueue_job('process_invoice', max_attempts=3, sale_order_id=self.sale_order.sale_order_id)
+        with mock.patch('api.invoices.send_invoice_email', side_effect=ConnectionError('smtp down')):
+            before = timezone.now()
+            self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), ('PENDING', 1, 'ConnectionError: smtp down'))
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=RETRY_BASE_SECONDS))
+        # Not due again until the backoff has passed
+        self.assertEqual(run_pending_jobs(), 0)
+
+        self.make_due(job)
+        with mock.patch('api.invoices.generate_invoice_pdf') as generate:
+            self.assertEqual(run_pending_jobs(), 1)
+        generate.assert_not_called()
+        job.refresh_from_db()
+        self.sale_order.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('DONE', 2))
+        self.assertEqual(self.sale_order.invoice_status, 'SENT')
+
+    def test_last_failed_attempt_marks_job_and_invoice_failed(self):
+        job = enqueue_job('process_invoice', max_attempts=2, sale_order_id=self.sale_order.sale_order_id)
+        with mock.patch('api.invoices.send_invoice_email', side_effect=ConnectionError('smtp down')):
+            self.assertEqual(run_pending_jobs(), 1)
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'PENDING')
+            self.make_due(job)
+            self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.sale_order.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('FAILED', 2))
+        self.assertEqual(self.sale_order.invoice_status, 'FAILED')
+        self.make_due(job)
+        self.assertEqual(run_pending_jobs(), 0)
+
+    def test_expired_lease_is_claimed_again(self):
+        job = enqueue_job('process_invoice', sale_order_id=self.sale_order.sale_order_id)
+        self.assertEqual(claim_job().pk, job.pk)
+        # Held by the first worker until the lease runs out
+        self.assertIsNone(claim_job())
+        self.make_due(job)
+        reclaimed = claim_job()
+        self.assertEqual((reclaimed.pk, reclaimed.status, reclaimed.attempts), (job.pk, 'RUNNING', 2))
+
+
+class RunJobsCommandTests(TransactionTestCase):
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        # An exception escaping a worker thread fails the test instead of being printed
+        self.thread_errors = self.enterContext(mock.patch('threading.excepthook'))
+        self.addCleanup(lambda: self.assertFalse(self.thread_errors.called, self.thread_errors.call_args_list))
+
+    def test_once_drains_the_queue(self):
+        # One worker, so the drain does not depend on how threads contend for the test database
+        jobs = [enqueue_job('process_invoice', sale_order_id=index) for index in range(5)]
+        with mock.patch('api.invoices.process_invoice') as handler:
+            call_command('run_jobs', '--once', '--workers', '1', stdout=StringIO())
+        self.assertEqual(handler.call_count, 5)
+        self.assertEqual(
+            sorted(BackgroundJob.objects.values_list('job_id', 'status', 'attempts')),
+            [(job.job_id, 'DONE', 1) for job in jobs],
+        )
+
+    def test_workers_survive_database_errors(self):
+        calls = Counter()
+
+        def run_pending_jobs(limit):
+            name = threading.current_thread().name
+            calls[name] += 1
+            if calls[name] == 1:
+                raise OperationalError('database table is locked: api_backgroundjob')
+            return 3 if calls[name] == 2 else 0
+
+        stdout = StringIO()
+        with mock.patch('api.management.commands.run_jobs.run_pending_jobs', run_pending_jobs):
+            call_command('run_jobs', '--once', '--workers', '2', '--poll-interval', '0', stdout=stdout)
+        # Each worker failed once, went on to process its jobs and stopped on the empty queue
+        self.assertEqual(sorted(calls.values()), [3, 3])
+        self.assertEqual(stdout.getvalue().count('Processed 3 jobs'), 2)
+
+
+class InvoiceTemplateCacheTests(TestCase):
+    def setUp(self):
+        self.companies = []
+        for index in range(3):
+            user = CustomUser.objects.create_user(email=f'template{index}@example.com', password='secret-pass-1', name='T')
+            self.companies.append(Company.objects.create(user=user, company_name=f'Company {index}'))
+
+    @mock.patch('api.invoices.MAX_CACHED_TEMPLATES', 2)
+    def test_least_recently_used_template_is_dropped(self):
+        first, second, third = self.companies
+        with mock.patch('api.invoices._invoice_templates', OrderedDict()) as templates:
+            kept = get_invoice_template(first, first.user)
+            get_invoice_template(second, second.user)
+            self.assertIs(get_invoice_template(first, first.user), kept)
+            get_invoice_template(third, third.user)
+            self.assertEqual(list(templates), [first.user_id, third.user_id])
+
+            # An edit made elsewhere changes the key, so the template is rebuilt
+            first.company_name = 'Renamed'
+            self.assertIsNot(get_invoice_template(first, first.user), kept)
+            self.assertEqual(len(templates), 2)
+
+
+class ServerTimingTests(AuthenticatedAPITestCase):
+    user_name = 'Timing'
+
+    def setUp(self):
+        super().setUp()
+        seed_tenant(self.user, items=20, customers=2, vendors=2, sale_orders=20, purchase_orders=2, seed=21)
+
+    def server_timing(self, path):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        metrics = {
+            name: (float(duration), desc)
+            for name, duration, desc in re.findall(r'(\w+);dur=([\d.]+)(?:;desc="([^"]*)")?', response['Server-Timing'])
+        }
+        self.assertEqual(list(metrics), ['db', 'serialize', 'view', 'total'])
+        self.assertEqual(metrics['db'][1], f'{len(captured)} queries')
+        # The phases do not overlap; each is rounded to 0.1ms
+        phases = metrics['db'][0] + metrics['serialize'][0] + metrics['view'][0]
+        self.assertLessEqual(phases, metrics['total'][0] + 0.2)
+        return {name: duration for name, (duration, _) in metrics.items()}
+
+    def test_phases_add_up_to_at_most_the_total(self):
+        with mock.patch('api.serializers.timed') as timed:
+            self.server_timing('/token/saleorders/')
+        # Per-instance serializer timing is off unless asked for
+        timed.assert_not_called()
+
+        with self.settings(PERFORMANCE_TIME_SERIALIZERS=True):
+            timings = self.server_timing('/token/saleorders/')
+        self.assertGreater(timings['serialize'], 0)
+
+        self.server_timing('/token/items/')
+        self.server_timing('/')
+
+    def test_requests_over_budget_are_logged_as_warnings(self):
+        with self.settings(PERFORMANCE_QUERY_BUDGET=1), self.assertLogs('api.middleware', logging.WARNING) as logs:
+            self.server_timing('/token/saleorders/')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['path'], record['over_budget']), ('/token/saleorders/', ['queries']))
+
+
+class AutocompleteTests(AuthenticatedAPITestCase):
+    user_name = 'Complete'
+
+    def setUp(self):
+        # Ids and versions restart after each test's rollback, so indexes from earlier tests must not be reused
+        indexes = mock.patch('api.autocomplete._indexes', OrderedDict())
+        indexes.start()
+        self.addCleanup(indexes.stop)
+        super().setUp()
+        for name, email, phone_number in (
+            ('John Smith', 'john@example.com', '5550101'),
+            ('Smithers Ltd', 'accounts@smithers.example', '5550202'),
+            ('Ann Lee', 'ann@smith.example', '7770303'),
+            ('Smith', 'plain@example.com', '8880404'),
+        ):
+            self.create_customer(self.user, name, email, phone_number)
+
+    def create_customer(self, user, name, email, phone_number='1'):
+        return Customer.objects.create(name=name, email=email, phone_number=phone_number, address='a', state='s',
+                                       city='c', pincode='123456', user=user)
+
+    def names(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['name'] for row in response.json()]
+
+    def test_ranked_word_start_matches(self):
+        # Exact match, then fields starting with the prefix, then later words starting with it
+        self.assertEqual(self.names('/customers/autocomplete/', q='smith'), ['Smith', 'Smithers Ltd', 'John Smith'])
+        self.assertEqual(self.names('/customers/autocomplete/', q='SMITHERS'), ['Smithers Ltd'])
+        self.assertEqual(self.names('/customers/autocomplete/', q='ltd'), ['Smithers Ltd'])
+        self.assertEqual(self.names('/customers/autocomplete/', q='ann@'), ['Ann Lee'])
+        self.assertEqual(self.names('/customers/autocomplete/', q='777'), ['Ann Lee'])
+        # Inside a word is not a word start
+        self.assertEqual(self.names('/customers/autocomplete/', q='mith'), [])
+
+    def test_limit_blank_query_and_tenants(self):
+        self.assertEqual(self.names('/customers/autocomplete/', q='s', limit=2), ['Smith', 'Smithers Ltd'])
+        self.assertEqual(len(self.names('/customers/autocomplete/', q='5', limit=0)), 1)
+        for index in range(60):
+            self.create_customer(self.user, f'Bulk {index}', f'bulk{index}@example.com')
+        self.assertEqual(len(self.names('/customers/autocomplete/', q='bulk', limit=500)), 50)
+        self.assertEqual(len(self.names('/customers/autocomplete/', q='bulk')), 10)
+        self.assertEqual(self.client.get('/customers/autocomplete/', {'q': 'bulk', 'limit': 'many'}).status_code, 400)
+        self.assertEqual(self.names('/customers/autocomplete/', q='   '), [])
+        self.assertEqual(self.names('/customers/autocomplete/'), [])
+
+        other = CustomUser.objects.create_user(email='complete-b@example.com', password='secret-pass-1', name='Other')
+        self.create_customer(other, 'Smith Other', 'other@example.com')
+        Vendor.objects.create(name='Smith Supplies', email='supplies@example.com', phone_number='1', user=other)
+        self.assertNotIn('Smith Other', self.names('/customers/autocomplete/', q='smith'))
+        self.assertEqual(self.names('/token/vendors/autocomplete/', q='smith'), [])
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.names('/customers/autocomplete/', q='zed'), [])
+        customer = self.create_customer(self.user, 'Zed Adams', 'zed@example.com')
+        self.assertEqual(self.names('/customers/autocomplete/', q='zed'), ['Zed Adams'])
+        customer.name = 'Zoe Adams'
+        customer.save()
+        self.assertEqual(self.names('/customers/autocomplete/', q='zoe'), ['Zoe Adams'])
+        customer.delete()
+        self.assertEqual(self.names('/customers/autocomplete/', q='adams'), [])
+
+        self.assertEqual(self.names('/token/vendors/autocomplete/', q='acme'), [])
+        vendor = Vendor.objects.create(name='Acme', email='acme@example.com', phone_number='1', user=self.user)
+        self.assertEqual(self.names('/token/vendors/autocomplete/', q='acme'), ['Acme'])
+        vendor.name = 'Globex'
+        vendor.save()
+        self.assertEqual(self.names('/token/vendors/autocomplete/', q='glo'), ['Globex'])
+        vendor.delete()
+        self.assertEqual(self.names('/token/vendors/autocomplete/', q='glo'), [])
+
+        for path, collection, body in (
+            ('/customers/autocomplete/', 'customers',
+             b'name,email,phone_number,address,state,city,pincode\nQuinn Imported,quinn@example.com,1,a,s,c,123456\n'),
+            ('/token/vendors/autocomplete/', 'vendors', b'name,email,phone_number,address\nQuarry Imported,quarry@example.com,1,a\n'),
+        ):
+            self.assertEqual(self.names(path, q='imported'), [])
+            response = self.client.post(f'/token/import/{collection}/', {'file': SimpleUploadedFile('rows.csv', body)})
+            self.assertEqual(response.json()['created'], 1, response.content)
+            self.assertEqual(len(self.names(path, q='imported')), 1)
+
+
+class OrderExportTests(AuthenticatedAPITestCase):
+    user_name = 'Export'
+
+    def setUp(self):
+        super().setUp()
+        self.now = timezone.now().replace(microsecond=123456)
+        self.lines_order = self.create_order(self.user, 'Lines', days_ago=1, lines=[(11, 2, '3.50'), (12, 1, '10.00')])
+        self.empty_order = self.create_order(self.user, 'Empty', days_ago=10, lines=[])
+        other = CustomUser.objects.create_user(email='export-b@example.com', password='secret-pass-1', name='Other')
+        self.create_order(other, 'Other', days_ago=1, lines=[(13, 1, '1.00')])
+
+    def create_order(self, user, customer_name, days_ago, lines):
+        order = SaleOrder.objects.create(customer_name=customer_name, mode_of_delivery='PICKUP', carrier='UPS',
+                                         total_amount=Decimal('17.00'), user=user)
+        SaleOrder.objects.filter(pk=order.pk).update(date=self.now - timedelta(days=days_ago))
+        SaleOrderItem.objects.bulk_create([
+            SaleOrderItem(sale_order=order, item_id=item_id, quantity=quantity, rate=Decimal(rate), user=user)
+            for item_id, quantity, rate in lines
+        ])
+        return SaleOrder.objects.get(pk=order.pk)
+
+    def export(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def csv_rows(self, **params):
+        return list(csv.DictReader(StringIO(self.export('/token/saleorders/export/', **params))))
+
+    def ndjson_rows(self, **params):
+        return [json.loads(line) for line in self.export('/token/saleorders/export/', file_format='ndjson', **params).splitlines()]
+
+    def test_csv_has_one_row_per_line(self):
+        content = self.export('/token/saleorders/export/')
+        self.assertEqual(content.splitlines()[0].split(','), SALE_ORDER_EXPORT_FIELDS + ['line_item_id', 'line_quantity', 'line_rate'])
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual(
+            [(row['customer_name'], row['line_item_id'], row['line_quantity'], row['line_rate']) for row in rows],
+            [('Lines', '11', '2', '3.50'), ('Lines', '12', '1', '10.00'), ('Empty', '', '', '')],
+        )
+        self.assertEqual(rows[0]['sale_order_id'], str(self.lines_order.sale_order_id))
+        self.assertEqual(rows[0]['total_amount'], '17.00')
+
+    def test_ndjson_nests_lines(self):
+        rows = self.ndjson_rows()
+        self.assertEqual([row['customer_name'] for row in rows], ['Lines', 'Empty'])
+        self.assertEqual(rows[0]['items'], [
+            {'item_id': 11, 'quantity': 2, 'rate': '3.50'}, {'item_id': 12, 'quantity': 1, 'rate': '10.00'},
+        ])
+        self.assertEqual(rows[1]['items'], [])
+        # Both formats write dates and amounts the same way
+        self.assertEqual([row['date'] for row in self.csv_rows() if row['line_item_id'] != '12'], [row['date'] for row in rows])
+        self.assertTrue(rows[0]['date'].endswith('.123Z'), rows[0]['date'])
+        self.assertEqual(rows[0]['total_amount'], self.csv_rows()[0]['total_amount'])
+
+    def test_date_range_and_format(self):
+        week_ago = (self.now - timedelta(days=7)).date().isoformat()
+        self.assertEqual({row['customer_name'] for row in self.csv_rows(date_from=week_ago)}, {'Lines'})
+        self.assertEqual([row['customer_name'] for row in self.ndjson_rows(date_to=week_ago)], ['Empty'])
+        self.assertEqual(self.client.get('/token/saleorders/export/', {'date_to': 'soon'}).status_code, 400)
+        self.assertEqual(self.client.get('/token/saleorders/export/', {'file_format': 'xlsx'}).status_code, 400)
+
+        PurchaseOrder.objects.create(vendor_name='Supplier', total_amount=5, user=self.user)
+        rows = list(csv.DictReader(StringIO(self.export('/token/purchaseorders/export/'))))
+        self.assertEqual([(row['vendor_name'], row['line_item_id']) for row in rows], [('Supplier', '')])
+
+
+class OrderLineInsertTests(TestCase):
+    LINES = 2 * BULK_BATCH_SIZE + 1
+
+    def test_lines_are_inserted_in_batches(self):
+        user = CustomUser.objects.create_user(email='lines@example.com', password='secret-pass-1', name='Lines')
+        lines = [{'item_id': index, 'quantity': 1, 'rate': '2.00', 'user': user.id} for index in range(self.LINES)]
+        for serializer_class, line_model, order_field, data in (
+            (SaleOrderSerializer, SaleOrderItem, 'sale_order', {
+                'customer_name': 'Buyer', 'mode_of_delivery': 'PICKUP', 'carrier': 'UPS', 'total_amount': '1.00',
+            }),
+            (PurchaseOrderSerializer, PurchaseOrderItem, 'purchase_order', {'vendor_name': 'Supplier', 'total_amount': '1.00'}),
+        ):
+            serializer = serializer_class(data={**data, 'user': user.id, 'items': lines})
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            with CaptureQueriesContext(connection) as captured:
+                order = serializer.save()
+            table = line_model._meta.db_table
+            inserts = [query for query in captured.captured_queries if query['sql'].startswith(f'INSERT INTO "{table}"')]
+            # One statement per batch of lines, not one per line; SQLite caps the parameters per statement lower
+            fields = [field for field in line_model._meta.concrete_fields if not field.primary_key]
+            batch_size = min(BULK_BATCH_SIZE, connection.ops.bulk_batch_size(fields, [None] * self.LINES))
+            self.assertEqual(len(inserts), math.ceil(self.LINES / batch_size))
+
+            saved = line_model.objects.filter(**{order_field: order})
+            self.assertEqual(saved.count(), self.LINES)
+            self.assertEqual(saved.filter(user=user).count(), self.LINES)
+            self.assertEqual(sorted(saved.values_list('item_id', flat=True)), list(range(self.LINES)))
@@ -0,0 +1,81 @@
+import posixpath
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, features
+from .authentication import invalidate_cached_user
+from .models import Category, Company, Item
+from .versions import bump_version, record_changes
+
+# Longest side of generated thumbnails, in pixels
+THUMBNAIL_SIZE = 320
+THUMBNAIL_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+
+# model name -> (model, source image field, thumbnail field)
+THUMBNAIL_SOURCES = {
+    'item': (Item, 'image', 'thumbnail'),
+    'category': (Category, 'image', 'thumbnail'),
+    'company': (Company, 'company_logo', 'logo_thumbnail'),
+}
+
+
+def thumbnail_name(source_name):
+    # Stored next to the original, e.g. item_images/thumbs/phone.png.webp. The source's own extension is kept,
+    # since phone.png and phone.jpg are different uploads and must not share a derivative
+    directory, filename = posixpath.split(source_name)
+    extension = 'webp' if THUMBNAIL_FORMAT == 'WEBP' else 'jpg'
+    return posixpath.join(directory, 'thumbs', f'{filename}.{extension}')
+
+
+def needs_thumbnail(instance, source_field, thumbnail_field):
+    source = getattr(instance, source_field)
+    return bool(source) and getattr(instance, thumbnail_field).name != thumbnail_name(source.name)
+
+
+def delete_thumbnail_on_commit(thumbnail):
+    # Once the row no longer pointing at it is committed; a rollback keeps the file the row still uses
+    name, storage = thumbnail.name, thumbnail.storage
+    if name:
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+def create_thumbnail(source):
+    with source.open('rb') as source_file:
+        with Image.open(source_file) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            if THUMBNAIL_FORMAT == 'JPEG':
+                image = image.convert('RGB')
+            buffer = BytesIO()
+            image.save(buffer, THUMBNAIL_FORMAT, quality=80)
+
+    name = thumbnail_name(source.name)
+    if source.storage.exists(name):
+        source.storage.delete(name)
+    return source.storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def generate_thumbnail(model_name, pk):
+    model, source_field, thumbnail_field = THUMBNAIL_SOURCES[model_name]
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None or not needs_thumbnail(instance, source_field, thumbnail_field):
+        return
+
+    source = getattr(instance, source_field)
+    previous = getattr(instance, thumbnail_field)
+    name = create_thumbnail(source)
+    # Plain UPDATE, guarded against the image having been replaced meanwhile, so no save signals fire again
+    updated = model.objects.filter(pk=pk, **{source_field: source.name}).update(**{thumbnail_field: name})
+    if updated and previous.name != name:
+        # The derivative of the image this one replaced
+        delete_thumbnail_on_commit(previous)
+    if updated and model is Item:
+        record_changes(instance.user_id, 'items', [pk])
+    elif updated and model is Category:
+        bump_version(instance.user_id, 'categories')
+    elif updated and model is Company:
+        invalidate_cached_user(instance.user_id)
+
+
+def process_thumbnail(job):
+    generate_thumbnail(job.payload['model'], job.payload['pk'])
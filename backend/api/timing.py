@@ -0,0 +1,64 @@
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from django.db import connections
+
+# Timings of the request or job being run in this thread, if any
+_current = ContextVar('timings', default=None)
+
+
+class Timings:
+    def __init__(self, time_serializers=False):
+        # Timing every serialized instance has a cost of its own, so model serializers are only timed on request
+        self.time_serializers = time_serializers
+        self.queries = 0
+        self.db = 0.0
+        # Named spans in seconds, not counting database time spent inside them
+        self.spans = {}
+        self._open = set()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - start
+
+    def add(self, name, seconds):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+
+@contextmanager
+def collect_timings(time_serializers=False):
+    timings = Timings(time_serializers)
+    token = _current.set(timings)
+    try:
+        with ExitStack() as stack:
+            # Replicas included, so routed reads are counted too
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(timings.execute_wrapper))
+            yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(name):
+    timings = _current.get()
+    # Nested spans of the same name (e.g. nested serializers) are counted once, by the outermost
+    if timings is None or name in timings._open:
+        yield
+        return
+    timings._open.add(name)
+    start = time.perf_counter()
+    db_start = timings.db
+    try:
+        yield
+    finally:
+        timings._open.discard(name)
+        timings.add(name, time.perf_counter() - start - (timings.db - db_start))
+
+
+def current_timings():
+    return _current.get()
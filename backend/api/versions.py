@@ -0,0 +1,97 @@
+import hashlib
+from functools import wraps
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from .models import ChangeLogEntry, CollectionVersion
+
+def bump_version(user_id, collection):
+    # Called on every write to a user's collection so caches keyed on the version go stale
+    updated = CollectionVersion.objects.filter(user_id=user_id, collection=collection).update(version=F('version') + 1)
+    if not updated:
+        try:
+            with transaction.atomic():
+                CollectionVersion.objects.create(user_id=user_id, collection=collection, version=1)
+        except IntegrityError:
+            CollectionVersion.objects.filter(user_id=user_id, collection=collection).update(version=F('version') + 1)
+
+
+def lock_version(user_id, collection):
+    # Takes the row lock bump_version takes, without moving the version, so ETags stay valid. Must run in a
+    # transaction: it waits for the user's in-flight writes to the collection and holds new ones off until it ends
+    locked = CollectionVersion.objects.select_for_update().filter(user_id=user_id, collection=collection)
+    if locked.first() is None:
+        try:
+            with transaction.atomic():
+                CollectionVersion.objects.create(user_id=user_id, collection=collection)
+        except IntegrityError:
+            locked.first()
+
+
+def record_changes(user_id, collection, object_ids, deleted=False):
+    # Bumps the collection version and appends the changed rows to the delta sync log.
+    # The version bump locks the user's collection row until the transaction commits, and the change ids are
+    # taken while holding it, so within a user's collection change ids are handed out in commit order: a
+    # client that has seen change N can never later find a committed change below N
+    with transaction.atomic():
+        bump_version(user_id, collection)
+        ChangeLogEntry.objects.bulk_create([
+            ChangeLogEntry(user_id=user_id, collection=collection, object_id=object_id, deleted=deleted)
+            for object_id in object_ids
+        ], batch_size=1000)
+
+
+def compact_change_log():
+    # Drops entries superseded by a later change of the same row. Sync only reports the latest change per row,
+    # so every cursor gets the same answer as before, and the log keeps one entry per row
+    newer = ChangeLogEntry.objects.filter(
+        user=OuterRef('user'), collection=OuterRef('collection'), object_id=OuterRef('object_id'),
+        change_id__gt=OuterRef('change_id'),
+    )
+    deleted, _ = ChangeLogEntry.objects.filter(Exists(newer)).delete()
+    return deleted
+
+
+def get_version(user_id, collection):
+    version = CollectionVersion.objects.filter(user_id=user_id, collection=collection)\
+        .values_list('version', flat=True)\
+        .first()
+    return version or 0
+
+
+def get_versions(user_id, collections):
+    versions = dict(
+        CollectionVersion.objects.filter(user_id=user_id, collection__in=collections)
+        .values_list('collection', 'version')
+    )
+    return [versions.get(collection, 0) for collection in collections]
+
+
+def collection_etag(request, collections):
+    # Changes whenever one of the collections is written to, or the query string differs
+    versions = '.'.join(str(version) for version in get_versions(request.user.id, collections))
+    query = hashlib.md5(request.META.get('QUERY_STRING', '').encode()).hexdigest()[:12]
+    return f'W/"{"+".join(collections)}-{request.user.id}-{versions}-{query}"'
+
+
+def conditional_on(*collections):
+    # Answers GETs with 304 Not Modified, before any query or serialization runs,
+    # when the client's If-None-Match still matches the collections' versions
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            etag = collection_etag(request, collections)
+            if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+            if if_none_match:
+                client_etags = [tag.removeprefix('W/') for tag in parse_etags(if_none_match)]
+                if '*' in client_etags or etag.removeprefix('W/') in client_etags:
+                    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
@@ -1,30 +1,40 @@
+import csv
 from django.contrib.auth import get_user_model, authenticate
-from django.core.files.base import ContentFile
-from django.core.mail import EmailMessage
-from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import generics, status
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from io import BytesIO
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
-from reportlab.lib.units import inch
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import Paragraph, Spacer
-from num2words import num2words
 from .models import (
-    Company, SaleOrderItem, Item, Customer, Vendor, SaleOrder, 
-    PurchaseOrder, Shipment, Category
+    Company, Item, Customer, Vendor, SaleOrder, 
+    PurchaseOrder, Shipment, Category, StockMovement
+)
+from .invoices import invalidate_invoice_template
+from .jobs import enqueue_job
+from .autocomplete import autocomplete
+from .exports import PURCHASE_ORDER_EXPORT_FIELDS, SALE_ORDER_EXPORT_FIELDS, stream_csv, stream_ndjson
+from .imports import IMPORT_SOURCES, import_csv
+from .filters import filter_date_range, parse_datetime_param, parse_id_param
+from .pagination import (
+    ItemCursorPagination, PurchaseOrderCursorPagination, SaleOrderCursorPagination, ShipmentCursorPagination,
+    StockMovementCursorPagination,
 )
+from .search import search_item_ids
+from .stock import record_movements, stock_at
+from .sync import SYNC_SOURCES, changes_since
+from .versions import conditional_on, record_changes
+from .summary import adjust_summary, current_month, get_summary, item_stock_delta
 from .serializers import (
     CustomUserSerializer, CustomTokenObtainPairSerializer, ShipmentSerializer, 
     CompanySerializer, ItemSerializer, CustomerSerializer, VendorSerializer, 
-    SaleOrderSerializer, PurchaseOrderSerializer, CategorySerializer
+    SaleOrderSerializer, PurchaseOrderSerializer, CategorySerializer, StockMovementSerializer,
+    CUSTOMER_LIST_SERIALIZER, ITEM_LIST_SERIALIZER, VENDOR_LIST_SERIALIZER,
 )
 
 User = get_user_model()
@@ -34,7 +44,8 @@ class CompanyDetailsView(APIView):
 
     def get(self, request):
         try:
-            company = Company.objects.get(user=request.user)
+            # Joined in by the authentication class
+            company = request.user.company
             serializer = CompanySerializer(company)
             return Response(serializer.data)
         except Company.DoesNotExist:
@@ -45,7 +56,7 @@ class CompanyDetailsView(APIView):
         if not password:
             return Response({"error": "Password is required for verification"}, status=status.HTTP_400_BAD_REQUEST)
 
-        user = authenticate(username=request.user.username, password=password)
+        user = authenticate(username=request.user.email, password=password)
         if user is None:
             return Response({"error": "Invalid password"}, status=status.HTTP_401_UNAUTHORIZED)
 
@@ -54,12 +65,14 @@ class CompanyDetailsView(APIView):
             serializer = CompanySerializer(company, data=request.data, partial=True)
             if serializer.is_valid():
                 serializer.save()
+                invalidate_invoice_template(request.user.id)
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         except Company.DoesNotExist:
             serializer = CompanySerializer(data=request.data)
             if serializer.is_valid():
                 serializer.save(user=request.user)
+                invalidate_invoice_template(request.user.id)
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -87,7 +100,7 @@ class UserDetailsAPIView(generics.GenericAPIView):
 
         # Fetch company details
         try:
-            company = Company.objects.get(user=user)
+            company = user.company
             company_serializer = CompanySerializer(company)
             company_data = company_serializer.data
         except Company.DoesNotExist:
@@ -110,7 +123,8 @@ class UserDetailsAPIView(generics.GenericAPIView):
         return Response(response_data, status=status.HTTP_200_OK)
 
     def put(self, request):
-        user = request.user
+        # Reload rather than save the cached request.user over newer changes
+        user = User.objects.get(pk=request.user.pk)
         password = request.data.get('password')
 
         # Authenticate the user
@@ -125,6 +139,8 @@ class UserDetailsAPIView(generics.GenericAPIView):
 
         if serializer.is_valid():
             serializer.save()
+            # The invoice header shows the user's contact details
+            invalidate_invoice_template(user.id)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -137,10 +153,32 @@ class CustomTokenRefreshView(TokenRefreshView):
 class ItemListView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @conditional_on('items')
     def get(self, request):
         items = Item.objects.filter(user=request.user)
-        serializer = ItemSerializer(items, many=True)
-        return Response(serializer.data)
+
+        # Optional server-side filters
+        params = request.query_params
+        if params.get('category'):
+            try:
+                items = items.filter(category_id=parse_id_param(params['category'], 'category'))
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        if params.get('brand'):
+            items = items.filter(brand=params['brand'])
+        if params.get('name'):
+            items = items.filter(name__istartswith=params['name'])
+        if params.get('low_stock') in ('1', 'true', 'True'):
+            items = items.filter(quantity__lte=F('reorder_point'))
+
+        # Rows go straight from values() to JSON, without building model instances
+        rows = ITEM_LIST_SERIALIZER.values(items)
+        paginator = ItemCursorPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(rows, request, view=self)
+            return paginator.get_paginated_response(ITEM_LIST_SERIALIZER.serialize(page))
+
+        return Response(ITEM_LIST_SERIALIZER.serialize(rows))
 
     def post(self, request):
         mutable_data = request.data.copy()
@@ -148,7 +186,9 @@ class ItemListView(APIView):
 
         serializer = ItemSerializer(data=mutable_data)
         if serializer.is_valid():
-            item = serializer.save()
+            with transaction.atomic():
+                item = serializer.save()
+                record_movements(request.user, {item.item_id: item.quantity}, 'OPENING')
             return Response(ItemSerializer(item).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -159,15 +199,93 @@ class ItemListView(APIView):
         if not item_id:
             return Response({"error": "item_id is required for updating an item"}, status=status.HTTP_400_BAD_REQUEST)
 
-        item = get_object_or_404(Item, item_id=item_id, user=request.user)
         mutable_data['user'] = request.user.id
 
-        serializer = ItemSerializer(item, data=mutable_data, partial=True)
-        if serializer.is_valid():
-            updated_item = serializer.save()
-            return Response(ItemSerializer(updated_item).data, status=status.HTTP_200_OK)
+        with transaction.atomic():
+            item = get_object_or_404(Item.objects.select_for_update(), item_id=item_id, user=request.user)
+            previous_quantity = item.quantity
+
+            serializer = ItemSerializer(item, data=mutable_data, partial=True)
+            if serializer.is_valid():
+                updated_item = serializer.save()
+                # Manual stock corrections go to the ledger as adjustments
+                record_movements(request.user, {updated_item.item_id: updated_item.quantity - previous_quantity}, 'ADJUSTMENT')
+                return Response(ItemSerializer(updated_item).data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class ImportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, collection):
+        if collection not in IMPORT_SOURCES:
+            return Response({"error": f"Unknown collection: {collection}"}, status=status.HTTP_404_NOT_FOUND)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "A CSV file is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            report = import_csv(request.user, collection, upload.file)
+        except (ValueError, csv.Error) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report, status=status.HTTP_200_OK)
+
+class ItemSearchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            page = max(int(request.query_params.get('page', 1)), 1)
+            page_size = min(max(int(request.query_params.get('page_size', 20)), 1), 100)
+        except ValueError:
+            return Response({"error": "page and page_size must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Fetch one extra hit to know whether there is a next page
+        item_ids = search_item_ids(request.user, request.query_params.get('q', ''), page_size + 1, (page - 1) * page_size)
+        has_next = len(item_ids) > page_size
+        item_ids = item_ids[:page_size]
+
+        items = Item.objects.in_bulk(item_ids)
+        serializer = ItemSerializer([items[item_id] for item_id in item_ids if item_id in items], many=True)
+
+        url = request.build_absolute_uri()
+        return Response({
+            'next': replace_query_param(url, 'page', page + 1) if has_next else None,
+            'previous': replace_query_param(url, 'page', page - 1) if page > 1 else None,
+            'results': serializer.data,
+        })
+
+class ItemStockView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, item_id):
+        # Stock of an item at a point in time (default now), replayed from the ledger
+        at = timezone.now()
+        if request.query_params.get('at'):
+            try:
+                at = parse_datetime_param(request.query_params['at'], 'at')
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # An item created with no stock has no ledger rows, so check the item itself
+        if not Item.objects.filter(item_id=item_id, user=request.user).exists():
+            return Response({"error": "Item not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'item_id': item_id, 'at': at, 'quantity': stock_at(item_id, at)})
+
+class StockMovementListView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, item_id):
+        movements = StockMovement.objects.filter(item_id=item_id, user=request.user)
+        try:
+            movements = filter_date_range(movements, 'created_at', request.query_params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = StockMovementCursorPagination()
+        page = paginator.paginate_queryset(movements, request, view=self)
+        serializer = StockMovementSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
 class DeleteItemView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -179,10 +297,10 @@ class DeleteItemView(APIView):
 class CustomerListView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @conditional_on('customers')
     def get(self, request):
         customers = Customer.objects.filter(user=request.user)
-        serializer = CustomerSerializer(customers, many=True)
-        return Response(serializer.data)
+        return Response(CUSTOMER_LIST_SERIALIZER.serialize(CUSTOMER_LIST_SERIALIZER.values(customers)))
 
     def post(self, request):
         request.data['user'] = request.user.id
@@ -207,10 +325,10 @@ class CustomerListView(APIView):
 class VendorListView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @conditional_on('vendors')
     def get(self, request):
         vendors = Vendor.objects.filter(user=request.user)
-        serializer = VendorSerializer(vendors, many=True)
-        return Response(serializer.data)
+        return Response(VENDOR_LIST_SERIALIZER.serialize(VENDOR_LIST_SERIALIZER.values(vendors)))
 
     def post(self, request):
        vendor_id = request.data.get('vendor_id')
@@ -221,6 +339,35 @@ class VendorListView(APIView):
            return Response(serializer.data, status=status.HTTP_201_CREATED)
        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class SyncView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, collection):
+        if collection not in SYNC_SOURCES:
+            return Response({"error": f"Unknown collection: {collection}"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            since = max(int(request.query_params.get('since', 0)), 0)
+        except ValueError:
+            return Response({"error": "since must be an integer cursor"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(changes_since(request.user, collection, since))
+
+class AutocompleteView(APIView):
+    permission_classes = [IsAuthenticated]
+    collection = None
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+        except ValueError:
+            return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(autocomplete(request.user.id, self.collection, request.query_params.get('q', ''), limit))
+
+class CustomerAutocompleteView(AutocompleteView):
+    collection = 'customers'
+
+class VendorAutocompleteView(AutocompleteView):
+    collection = 'vendors'
+
 class SaleOrderView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -245,22 +392,38 @@ class SaleOrderView(APIView):
 
         serializer = SaleOrderSerializer(data=data)
         if serializer.is_valid():
-            # Create the sale order
-            sale_order = serializer.save()
-
-            # Update item quantities
-            for item_data in data['items']:
-                item = Item.objects.get(item_id=item_data['item_id'])
-                if item.quantity >= item_data['quantity']:
-                    item.quantity -= item_data['quantity']
-                    item.save()
-                else:
-                    # If there's not enough stock, delete the created sale order and return an error
-                    sale_order.delete()
-                    return Response({"error": f"Not enough stock for item {item.name}"}, status=status.HTTP_400_BAD_REQUEST)
-
-            # Generate and save invoice PDF
-            self.generate_invoice_pdf(sale_order)
+            # Total quantity requested per item, so repeated lines are checked together
+            requested = {}
+            for item_data in serializer.validated_data['items']:
+                requested[item_data['item_id']] = requested.get(item_data['item_id'], 0) + item_data['quantity']
+
+            with transaction.atomic():
+                # Lock all referenced items in one query and check stock before writing anything
+                items = Item.objects.select_for_update().filter(user=request.user, item_id__in=requested).in_bulk()
+                for item_id, quantity in requested.items():
+                    item = items.get(item_id)
+                    if item is None:
+                        return Response({"error": f"Item {item_id} not found"}, status=status.HTTP_400_BAD_REQUEST)
+                    if item.quantity < quantity:
+                        return Response({"error": f"Not enough stock for item {item.name}"}, status=status.HTTP_400_BAD_REQUEST)
+                    item.quantity -= quantity
+                    item.units_sold += quantity
+
+                # Update item quantities and create the sale order
+                Item.objects.bulk_update(items.values(), ['quantity', 'units_sold'])
+                record_changes(request.user.id, 'items', items.keys())
+                sale_order = serializer.save()
+                record_movements(
+                    request.user,
+                    {item_id: -quantity for item_id, quantity in requested.items()},
+                    'SALE',
+                    sale_order.sale_order_id
+                )
+                # Last, after the collection versions; see rebuild_summary for the lock order
+                adjust_summary(request.user.id, **item_stock_delta(items.values()))
+
+            # Render and email the invoice in the background
+            enqueue_job('process_invoice', sale_order_id=sale_order.sale_order_id)
 
             # Create shipment if mode_of_delivery is 'DELIVERY'
             if data['mode_of_delivery'] == 'DELIVERY':
@@ -280,144 +443,18 @@ class SaleOrderView(APIView):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-   
-    def generate_invoice_pdf(self, sale_order):
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
+    # Lines embed item names and images, so item edits change the response too
+    @conditional_on('sale_orders', 'items')
+    def get(self, request):
+        # Lines for all orders in one query, their items in one more, however many orders there are
+        sale_orders = SaleOrder.objects.filter(user=request.user).prefetch_related('items')
 
-        # Set up the PDF
-        company = Company.objects.get(user=sale_order.user)
-        
-        # Logo placement on the right side
-        logo_width = 100  # Adjust as needed
-        logo_height = 60  # Adjust as needed
-        if company.company_logo:
-            logo_path = company.company_logo.path
-            p.drawImage(logo_path, width - logo_width - 50, height - 110, width=logo_width, height=logo_height)
-
-        # Start company details on the left side, shifted upwards
-        y_position = height - 60  # Adjusted from height - 100 to height - 80
-
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, y_position, company.company_name)
-        y_position -= 25  # Move down for next line
-
-        # Add company details
-        p.setFont("Helvetica", 10)
-        
-        # Split address into two lines if it's too long
-        address = company.address
-        if len(address) > 40:  # Adjust this value based on your needs
-            split_index = address.rfind(' ', 0, 40)
-            address_line1 = address[:split_index]
-            address_line2 = address[split_index+1:]
-            p.drawString(50, y_position, address_line1)
-            y_position -= 15
-            p.drawString(50, y_position, address_line2)
-            y_position -= 15
-        else:
-            p.drawString(50, y_position, address)
-            y_position -= 15
-
-        p.drawString(50, y_position, f"GSTIN/UIN: {company.gst_number}")
-        y_position -= 15
-        p.drawString(50, y_position, f"State Name: {company.state}, Code: {company.pincode}")
-        y_position -= 15
-        p.drawString(50, y_position, f"Contact: {sale_order.user.phone_number}")
-        y_position -= 15
-        p.drawString(50, y_position, f"E-Mail: {sale_order.user.email}")
-
-        # Add customer details
-        p.setFont("Helvetica-Bold", 12)
-        p.drawString(50, height - 210, "Dispatch To")
-        
-        p.setFont("Helvetica", 10)
-        p.drawString(50, height - 225, f"{sale_order.customer_name}")
-        p.drawString(50, height - 240, f"{sale_order.customer_address}")
-        p.drawString(50, height - 255, f"{sale_order.customer_city}, {sale_order.customer_state} - {sale_order.customer_pincode}")
-        p.drawString(50, height - 270, f"GSTIN/UIN: {company.gst_number}")
-        p.drawString(50, height - 285, f"State Name: {sale_order.customer_state}, Code: 29")
-
-        # Create table for order items
-        data = [["SI No", "Item Name", "Due on", "Quantity", "Rate", "per", "Amount"]]
-        for index, sale_order_item in enumerate(sale_order.items.all(), start=1):
-            # Fetch the item from the Item model
-            item = get_object_or_404(Item, item_id=sale_order_item.item_id)
-            data.append([
-                str(index),
-                item.name,  # Use the name from the Item model
-                "3 Days",
-                str(sale_order_item.quantity),
-                f"{sale_order_item.rate:.2f}",
-                "Nos",
-                f"{sale_order_item.quantity * sale_order_item.rate:.2f}"
-            ])
-
-        table = Table(data, colWidths=[0.5*inch, 2*inch, 1*inch, 0.8*inch, 0.8*inch, 0.8*inch, 1*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-
-        table.wrapOn(p, width - 100, height)
-        table.drawOn(p, 50, height - 500)
-
-        # Add total amount and taxes
-        p.setFont("Helvetica-Bold", 10)
-        p.drawString(410, height - 520, f"Subtotal: INR {sale_order.total_amount}")
-        p.drawString(410, height - 535, f"Central Tax: INR {sale_order.total_amount }")
-        p.drawString(410, height - 550, f"State Tax: INR {sale_order.total_amount }")
-        p.drawString(410, height - 565, f"Total: INR {sale_order.total_amount }")
-
-        # Add amount in words
-        p.setFont("Helvetica", 10)
-        p.drawString(50, height - 580, f"Amount Chargeable (in words)")
-        p.drawString(50, height - 595, f"INR {num2words(int(sale_order.total_amount )).title()} Only")
-
-        # Add company's bank details
-        p.setFont("Helvetica-Bold", 10)
-        p.drawString(50, height - 640, "Company's Bank Details")
-        p.setFont("Helvetica", 10)
-        p.drawString(50, height - 655, f"Bank Name: {company.bank_name}")
-        p.drawString(50, height - 670, f"A/c No.: {company.bank_account_number}")
-        p.drawString(50, height - 685, f"Branch & IFS Code: {company.ifsc_code}")
-
-        # Add footer
-        p.setFont("Helvetica", 8)
-        p.drawString(inch, 0.75 * inch, "This is a Computer Generated Document. No Signature Required.")
-
-        p.showPage()
-        p.save()
-
-        # Save the PDF to the sale_order model
-        pdf_file = ContentFile(buffer.getvalue())
-        sale_order.invoice_pdf.save(f'invoice_{sale_order.sale_order_id}.pdf', pdf_file)
-
-        # Send email with invoice
-        subject = 'Sale Order Invoice'
-        message = f'Please find attached the invoice for your order (ID: {sale_order.sale_order_id}).'
-        from_email = settings.EMAIL_HOST_USER
-        recipient_list = [sale_order.customer_email]
-        mail = EmailMessage(subject=subject, body=message, from_email=from_email, to=recipient_list)
-        mail.attach_file(f"{settings.BASE_DIR}/media/invoices/invoice_{sale_order.sale_order_id}.pdf")
-        mail.send()
+        paginator = SaleOrderCursorPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(sale_orders, request, view=self)
+            serializer = SaleOrderSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
 
-        
-    def get(self, request):
-        sale_orders = SaleOrder.objects.filter(user=request.user)
         serializer = SaleOrderSerializer(sale_orders, many=True)
         return Response(serializer.data)
 
@@ -432,6 +469,41 @@ class SaleOrderView(APIView):
         serializer = SaleOrderSerializer(sale_order)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+class OrderExportView(APIView):
+    permission_classes = [IsAuthenticated]
+    model = None
+    fields = None
+    filename = None
+
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in ('csv', 'ndjson'):
+            return Response({"error": "file_format must be csv or ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+
+        orders = self.model.objects.filter(user=request.user)
+        try:
+            orders = filter_date_range(orders, 'date', request.query_params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Rows are produced while the response is sent, so memory stays flat however many orders there are
+        if file_format == 'csv':
+            response = StreamingHttpResponse(stream_csv(orders, self.fields), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(stream_ndjson(orders, self.fields), content_type='application/x-ndjson')
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}.{file_format}"'
+        return response
+
+class SaleOrderExportView(OrderExportView):
+    model = SaleOrder
+    fields = SALE_ORDER_EXPORT_FIELDS
+    filename = 'sale_orders'
+
+class PurchaseOrderExportView(OrderExportView):
+    model = PurchaseOrder
+    fields = PURCHASE_ORDER_EXPORT_FIELDS
+    filename = 'purchase_orders'
+
 class PurchaseOrderView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -446,20 +518,40 @@ class PurchaseOrderView(APIView):
 
         serializer = PurchaseOrderSerializer(data=data)
         if serializer.is_valid():
-            # Create the purchase order
-            purchase_order = serializer.save()
-
-            # Update item quantities
-            for item_data in data['items']:
-                item = Item.objects.get(item_id=item_data['item_id'])
-                item.quantity += item_data['quantity']
-                item.save()
+            # Total quantity received per item, so repeated lines are applied together
+            received = {}
+            for item_data in serializer.validated_data['items']:
+                received[item_data['item_id']] = received.get(item_data['item_id'], 0) + item_data['quantity']
+
+            with transaction.atomic():
+                items = Item.objects.select_for_update().filter(user=request.user, item_id__in=received).in_bulk()
+                missing = received.keys() - items.keys()
+                if missing:
+                    return Response({"error": f"Item {min(missing)} not found"}, status=status.HTTP_400_BAD_REQUEST)
+                for item_id, quantity in received.items():
+                    items[item_id].quantity += quantity
+
+                # Update item quantities and create the purchase order
+                Item.objects.bulk_update(items.values(), ['quantity'])
+                record_changes(request.user.id, 'items', items.keys())
+                purchase_order = serializer.save()
+                record_movements(request.user, received, 'PURCHASE', purchase_order.purchase_order_id)
+                # Last, after the collection versions; see rebuild_summary for the lock order
+                adjust_summary(request.user.id, **item_stock_delta(items.values()))
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @conditional_on('purchase_orders', 'items')
     def get(self, request):
-        purchase_orders = PurchaseOrder.objects.filter(user=request.user)
+        purchase_orders = PurchaseOrder.objects.filter(user=request.user).prefetch_related('items')
+
+        paginator = PurchaseOrderCursorPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(purchase_orders, request, view=self)
+            serializer = PurchaseOrderSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
         serializer = PurchaseOrderSerializer(purchase_orders, many=True)
         return Response(serializer.data)
 
@@ -478,14 +570,32 @@ class ShipmentListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        # Fetch all shipments
-        shipments = Shipment.objects.all()
+        # Fetch the user's shipments
+        shipments = Shipment.objects.filter(user=request.user)
+
+        # Optional server-side filters
+        params = request.query_params
+        if params.get('status'):
+            shipments = shipments.filter(status=params['status'])
+        if params.get('carrier'):
+            shipments = shipments.filter(carrier=params['carrier'])
+        try:
+            shipments = filter_date_range(shipments, 'date', params)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        paginator = ShipmentCursorPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(shipments, request, view=self)
+            serializer = ShipmentSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
+
         serializer = ShipmentSerializer(shipments, many=True)
         return Response(serializer.data)
 
     def put(self, request, shipment_id):
         # Update shipment status
-        shipment = get_object_or_404(Shipment, shipment_id=shipment_id)
+        shipment = get_object_or_404(Shipment, shipment_id=shipment_id, user=request.user)
         data = request.data.copy()
         
         # Update only the status field
@@ -498,6 +608,7 @@ class ShipmentListView(APIView):
 class CategoryView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @conditional_on('categories')
     def get(self, request):
         categories = Category.objects.filter(user=request.user)
         serializer = CategorySerializer(categories, many=True)
@@ -513,7 +624,10 @@ class CategoryView(APIView):
             # Get the list of item IDs from the request data
             item_ids = request.data.get('item_ids', [])
             if item_ids:
-                Item.objects.filter(item_id__in=item_ids, user=request.user).update(category=category)
+                items = Item.objects.filter(item_id__in=item_ids, user=request.user)
+                changed_ids = list(items.values_list('item_id', flat=True))
+                items.update(category=category)
+                record_changes(request.user.id, 'items', changed_ids)
             
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -531,54 +645,18 @@ class CategoryView(APIView):
         category.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
-from django.db.models import Sum, F
-from django.utils import timezone
-from .models import SaleOrder, Item, Customer, Vendor, Shipment, SaleOrderItem
-from .serializers import SaleOrderSerializer, ItemSerializer, CustomerSerializer, VendorSerializer, ShipmentSerializer
-
-
-from django.db.models import Sum, F, OuterRef, Subquery
-from .models import SaleOrder, Item, Customer, Vendor, Shipment, SaleOrderItem
-
 class DashboardView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         user = request.user
 
-        # Fetch total revenue
-        total_revenue = SaleOrder.objects.filter(user=user).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-
-        # Fetch pending shipments
-        pending_shipments = Shipment.objects.filter(user=user, status='IN_TRANSIT').count()
-
-        # Fetch new customers
-        current_month = timezone.now().month
-        current_year = timezone.now().year
-        new_customers = Customer.objects.filter(
-            user=user,
-            created_at__month=current_month,
-            created_at__year=current_year
-        ).count()
+        # Totals and stock buckets come from the incrementally maintained summary row
+        summary = get_summary(user.id)
+        new_customers = summary.new_customers if summary.new_customers_month == current_month() else 0
 
-        # Fetch total order count
-        total_orders = SaleOrder.objects.filter(user=user).count()
-
-        # Fetch top selling products
-        top_selling_items = SaleOrderItem.objects.filter(sale_order__user=user)\
-            .values('item_id')\
-            .annotate(total_quantity=Sum('quantity'))\
-            .order_by('-total_quantity')[:5]
-
-        # Get the corresponding Item objects
-        item_ids = [item['item_id'] for item in top_selling_items]
-        top_items = Item.objects.filter(item_id__in=item_ids)
-
-        # Create a dictionary to map item_id to total_quantity
-        quantity_map = {item['item_id']: item['total_quantity'] for item in top_selling_items}
+        # Fetch top selling products from the per-item sales totals
+        top_items = Item.objects.filter(user=user, units_sold__gt=0).order_by('-units_sold')[:5]
 
         # Process top selling products
         top_selling_products_list = []
@@ -586,25 +664,21 @@ class DashboardView(APIView):
             product_data = {
                 'item_id': item.item_id,
                 'name': item.name,
-                'total_quantity': quantity_map[item.item_id],
-                'image': None
+                'total_quantity': item.units_sold,
+                'image': None,
+                'thumbnail_url': None
             }
             if item.image:
                 product_data['image'] = request.build_absolute_uri(item.image.url)
+                product_data['thumbnail_url'] = request.build_absolute_uri((item.thumbnail or item.image).url)
             top_selling_products_list.append(product_data)
 
-        # Sort the list by total_quantity
-        top_selling_products_list.sort(key=lambda x: x['total_quantity'], reverse=True)
-
-        # Fetch stock availability
-        total_stock = Item.objects.filter(user=user).aggregate(Sum('quantity'))['quantity__sum'] or 0
         low_stock_items = Item.objects.filter(user=user, quantity__lte=F('reorder_point'))
-        out_of_stock_items = Item.objects.filter(user=user, quantity=0)
 
         # Calculate percentages
-        low_stock_count = low_stock_items.count()
-        out_of_stock_count = out_of_stock_items.count()
-        available_count = Item.objects.filter(user=user).count() - low_stock_count - out_of_stock_count
+        low_stock_count = summary.low_stock_count
+        out_of_stock_count = summary.out_of_stock_count
+        available_count = summary.item_count - low_stock_count - out_of_stock_count
 
         total_items = available_count + low_stock_count + out_of_stock_count
         available_percentage = (available_count / total_items) * 100 if total_items > 0 else 0
@@ -612,12 +686,12 @@ class DashboardView(APIView):
         out_of_stock_percentage = (out_of_stock_count / total_items) * 100 if total_items > 0 else 0
 
         response_data = {
-            'total_revenue': total_revenue,
-            'pending_shipments': pending_shipments,
+            'total_revenue': summary.total_revenue,
+            'pending_shipments': summary.pending_shipments,
             'new_customers': new_customers,
-            'total_orders': total_orders,
+            'total_orders': summary.total_orders,
             'top_selling_products': top_selling_products_list,
-            'total_stock': total_stock,
+            'total_stock': summary.total_stock,
             'low_stock_items': ItemSerializer(low_stock_items, many=True).data,
             'stock_percentages': {
                 'available': round(available_percentage, 2),
@@ -626,4 +700,4 @@ class DashboardView(APIView):
             }
         }
 
-        return Response(response_data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(response_data, status=status.HTTP_200_OK)
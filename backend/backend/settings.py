@@ -5,6 +5,7 @@ Django settings for backend project.
 import os
 from pathlib import Path
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 
 # Base directory
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -37,6 +38,10 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# List endpoints answer conditional GETs (ETag / If-None-Match)
+CORS_ALLOW_HEADERS = (*default_headers, "if-none-match")
+CORS_EXPOSE_HEADERS = ["ETag", "Server-Timing"]
+
 # Application definition
 INSTALLED_APPS = [
     "django.contrib.admin",
@@ -51,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.PerformanceMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -59,6 +65,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "api.middleware.DatabaseRoutingMiddleware",
 ]
 
 ROOT_URLCONF = "backend.urls"
@@ -83,18 +90,108 @@ AUTH_USER_MODEL = "api.CustomUser"
 
 WSGI_APPLICATION = "backend.wsgi.application"
 
-# Database
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# Database: DATABASE_ENGINE selects the profile, "sqlite" (default, single node) or "postgres"
+DATABASE_ENGINE = os.environ.get("DATABASE_ENGINE", "sqlite")
+
+if DATABASE_ENGINE == "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("DATABASE_NAME", "supplysync"),
+            "USER": os.environ.get("DATABASE_USER", "supplysync"),
+            "PASSWORD": os.environ.get("DATABASE_PASSWORD", ""),
+            "HOST": os.environ.get("DATABASE_HOST", "localhost"),
+            "PORT": os.environ.get("DATABASE_PORT", "5432"),
+            # Keep connections open across requests, checking them before reuse
+            "CONN_MAX_AGE": int(os.environ.get("DATABASE_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {},
+        }
+    }
+    # DATABASE_POOL: "psycopg" for Django's built-in pool (psycopg 3 and psycopg_pool, both installed by
+    # requirements.txt), or "pgbouncer" when connecting through PgBouncer in transaction mode
+    DATABASE_POOL = os.environ.get("DATABASE_POOL", "")
+    if DATABASE_POOL == "psycopg":
+        DATABASES["default"]["CONN_MAX_AGE"] = 0  # The pool owns connection reuse
+        DATABASES["default"]["OPTIONS"]["pool"] = {
+            "min_size": int(os.environ.get("DATABASE_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("DATABASE_POOL_MAX_SIZE", "10")),
+        }
+    elif DATABASE_POOL == "pgbouncer":
+        # Server-side cursors (used by iterator() in exports) do not survive transaction pooling
+        DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+    replica_setting = "HOST"
+    replica_names = os.environ.get("DATABASE_REPLICA_HOSTS", "")
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("DATABASE_NAME", BASE_DIR / "db.sqlite3"),
+            "OPTIONS": {
+                # WAL lets readers run alongside the writer; IMMEDIATE takes the write lock when a
+                # transaction starts instead of failing to upgrade a read lock later
+                "init_command": (
+                    "PRAGMA journal_mode=WAL;"
+                    "PRAGMA synchronous=NORMAL;"
+                    "PRAGMA busy_timeout=5000;"
+                    "PRAGMA mmap_size=268435456;"
+                ),
+                "transaction_mode": "IMMEDIATE",
+            },
+        }
+    }
+    replica_setting = "NAME"
+    replica_names = os.environ.get("DATABASE_REPLICA_NAMES", "")
+
+# Read replicas, as a comma separated list of hosts (Postgres) or files (SQLite, e.g. kept in
+# sync by litestream) that otherwise share the default's settings. Reads of GET requests go to a replica.
+REPLICA_DATABASES = []
+for index, name in enumerate(filter(None, replica_names.split(","))):
+    alias = f"replica_{index}"
+    DATABASES[alias] = {**DATABASES["default"], replica_setting: name, "TEST": {"MIRROR": "default"}}
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ["api.routers.ReplicaRouter"]
+
+# Users who wrote within this many seconds keep reading from the primary
+REPLICA_PIN_SECONDS = 5
+
+# The pins above and the authenticated-user cache must be seen by every worker, so anything beyond a
+# single process needs a shared cache: CACHE_URL="redis://host:6379/0" (needs the redis package).
+# Replicas are refused at startup while the cache is process-local.
+if os.environ.get("CACHE_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["CACHE_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
     }
+
+# Requests running more queries or taking longer (ms) than this are logged as warnings
+PERFORMANCE_QUERY_BUDGET = int(os.environ.get("PERFORMANCE_QUERY_BUDGET", "30"))
+PERFORMANCE_LATENCY_BUDGET_MS = int(os.environ.get("PERFORMANCE_LATENCY_BUDGET_MS", "500"))
+# Time each serialized model instance separately from the view (adds overhead to every instance)
+PERFORMANCE_TIME_SERIALIZERS = os.environ.get("PERFORMANCE_TIME_SERIALIZERS", "") == "1"
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "api": {"handlers": ["console"], "level": os.environ.get("API_LOG_LEVEL", "INFO")},
+    },
 }
 
 # Authentication & Permissions
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
@@ -106,6 +203,12 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
 }
 
+# Authenticated users (with their company) are cached this long; saves clear the entry once they commit.
+# A process-local cache is only cleared in the saving worker, so a deactivated user or changed password would
+# still be accepted by the others. The cache is therefore off unless CACHE_URL is set; single-process
+# deployments may turn it on with AUTH_USER_CACHE_SECONDS.
+AUTH_USER_CACHE_SECONDS = int(os.environ.get("AUTH_USER_CACHE_SECONDS", "60" if os.environ.get("CACHE_URL") else "0"))
+
 # Email Configuration
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.hostinger.com"
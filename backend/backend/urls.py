@@ -4,9 +4,12 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.http import JsonResponse
 from api.views import (
-    CategoryView, DashboardView, DeleteItemView, CustomerListView, ItemListView, RegisterView,
+    CategoryView, DashboardView, DeleteItemView, CustomerListView, ItemListView, ItemSearchView, ItemStockView,
+    StockMovementListView, RegisterView,
     CustomTokenObtainPairView, CustomTokenRefreshView, SaleOrderView, ShipmentListView,
-    UserDetailsAPIView, VendorListView, PurchaseOrderView, CompanyDetailsView
+    UserDetailsAPIView, VendorListView, PurchaseOrderView, CompanyDetailsView,
+    CustomerAutocompleteView, VendorAutocompleteView, SyncView, SaleOrderExportView, PurchaseOrderExportView,
+    ImportView
 )
 
 def home_view(request):
@@ -21,11 +24,18 @@ urlpatterns = [
     path('token/user/', UserDetailsAPIView.as_view(), name='user_details'),
     path('token/items/', ItemListView.as_view(), name='items'),
     path('token/items/delete/<str:item_id>/', DeleteItemView.as_view(), name='delete_item'),
+    path('token/items/search/', ItemSearchView.as_view(), name='item-search'),
+    path('token/items/<int:item_id>/stock/', ItemStockView.as_view(), name='item-stock'),
+    path('token/items/<int:item_id>/movements/', StockMovementListView.as_view(), name='item-movements'),
     path('customers/', CustomerListView.as_view(), name='customer-list'),
+    path('customers/autocomplete/', CustomerAutocompleteView.as_view(), name='customer-autocomplete'),
     path('token/vendors/', VendorListView.as_view(), name='vendors'),
+    path('token/vendors/autocomplete/', VendorAutocompleteView.as_view(), name='vendor-autocomplete'),
     path('token/saleorders/', SaleOrderView.as_view(), name='sale-orders'),
+    path('token/saleorders/export/', SaleOrderExportView.as_view(), name='sale-order-export'),
     path('token/saleorders/<str:sale_order_id>/', SaleOrderView.as_view(), name='update-sale-order'),
     path('token/purchaseorders/', PurchaseOrderView.as_view(), name='purchase-orders'),
+    path('token/purchaseorders/export/', PurchaseOrderExportView.as_view(), name='purchase-order-export'),
     path('token/purchaseorders/<str:purchase_order_id>/', PurchaseOrderView.as_view(), name='update-purchase-order'),
     path('token/shipments/', ShipmentListView.as_view(), name='shipments'),
     path('token/shipments/<str:shipment_id>/', ShipmentListView.as_view(), name='update-shipment'),
@@ -33,4 +43,6 @@ urlpatterns = [
     path('token/categories/<int:category_id>/', CategoryView.as_view(), name='category-detail'),
     path('company/', CompanyDetailsView.as_view(), name='company-details'),
     path('token/dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('token/import/<str:collection>/', ImportView.as_view(), name='import'),
+    path('token/sync/<str:collection>/', SyncView.as_view(), name='sync'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)